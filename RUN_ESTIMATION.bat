@@ -9,8 +9,8 @@ echo 1. Lancement de l'environnement virtuel (si présent)...
 if exist .venv\Scripts\activate.bat call .venv\Scripts\activate.bat
 
 echo.
-echo 2. Lancement de l'estimation des projets (GPT-4o)...
-python src/estimate_projects.py
+echo 2. Lancement des estimations (tâches puis projets, un seul processus)...
+python src/martine.py all
 
 echo.
 echo ===================================
@@ -4,7 +4,7 @@ echo   MARTINE IA - Lancement du script...
 echo ============================================
 cd /d "%~dp0"
 cd src
-python main.py
+python martine.py tasks
 echo.
 echo ============================================
 echo   Fin du traitement.
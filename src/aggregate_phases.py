@@ -0,0 +1,91 @@
+"""
+MARTINE IA - Agrégation des budgets de la base PHASES
+Somme les estimations des tâches feuilles (🤖⏱️Temps est IA (h) ENFANT) de chaque
+phase via la relation "Tâches", et écrit "Budget temps (h)" des phases modifiées
+"""
+import os
+import sys
+
+# Import client
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import MartineConfig, create_notion_limiter
+from notion_client import NotionClient
+from task_graph import TaskGraph
+from write_queue import WriteQueue
+
+# Propriétés de la base Phases (cf. setup_phases.py)
+PROP_PHASE_NOM = "Nom"
+PROP_PHASE_BUDGET = "Budget temps (h)"
+PROP_PHASE_TACHES = "Tâches"
+
+def compute_phase_budgets(client: NotionClient, phases: list, graph: TaskGraph) -> dict:
+    """
+    Calcule le budget de chaque phase : somme des feuilles couvertes par ses tâches
+    (une tâche parente liée compte pour ses sous-tâches, sans double comptage).
+    Returns: {phase_id: (nom, budget_actuel, budget_calculé)}
+    """
+    budgets = {}
+    for phase in phases:
+        phase_id = phase.get("id")
+        task_ids = client.get_relation_ids(phase, PROP_PHASE_TACHES)
+        total = round(graph.leaves_total(task_ids), 2)
+        current = client.get_property_value(phase, PROP_PHASE_BUDGET)
+        nom = client.get_property_value(phase, PROP_PHASE_NOM) or "Sans nom"
+        budgets[phase_id] = (nom, current, total)
+    return budgets
+
+
+def aggregate_phases(config: MartineConfig = None):
+    """config: configuration à utiliser (sinon lue depuis le .env)"""
+    config = config or MartineConfig.from_env()
+    print("=" * 60)
+    print("🧠 MARTINE IA - Agrégation des budgets des Phases")
+    if config.debug_mode:
+        print("   ⚠️  MODE DEBUG ACTIVÉ (pas d'écriture)")
+    print("=" * 60)
+
+    db_phases_id = config.db_phases
+    db_taches_id = config.db_taches
+    if not config.notion_token or not db_phases_id or not db_taches_id:
+        print("❌ NOTION_TOKEN, DATABASE_PHASES et DATABASE_TACHES_IA sont requis dans .env")
+        return
+
+    client = NotionClient(config.notion_token, create_notion_limiter(config), config.notion_base_url)
+
+    # 1. Chargement unique des deux bases
+    print("\n📥 Chargement des Phases et des Tâches...")
+    phases = client.query_database(db_phases_id)
+    graph = TaskGraph.build(client.query_database(db_taches_id))
+    print(f"   {len(phases)} phases, {len(graph.pages)} tâches")
+
+    # 2. Agrégation en mémoire
+    budgets = compute_phase_budgets(client, phases, graph)
+    changed = {
+        phase_id: values for phase_id, values in budgets.items()
+        if values[1] is None or round(float(values[1]), 2) != values[2]
+    }
+    print(f"\n📊 {len(changed)} phases à mettre à jour ({len(budgets) - len(changed)} inchangées)")
+
+    # 3. Écriture concurrente limitée en débit
+    queue = WriteQueue(client)
+    for phase_id, (nom, current, total) in changed.items():
+        print(f"   {nom}: {current if current is not None else '∅'} → {total}h")
+        if not config.debug_mode:
+            queue.submit(phase_id, {PROP_PHASE_BUDGET: {"number": total}}, label=nom)
+
+    written, failed = queue.drain()
+    queue.close()
+
+    print("\n" + "=" * 60)
+    if config.debug_mode:
+        print(f"✅ [DEBUG] {len(changed)} budgets simulés")
+    else:
+        print(f"✅ {written} budgets écrits, {failed} échecs")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    # Forcer l'encodage UTF-8 pour Windows (pour les émojis)
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    aggregate_phases()
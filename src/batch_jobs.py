@@ -0,0 +1,139 @@
+"""
+Jobs batch d'estimation pour Martine IA (gros rattrapages de backlog)
+Les prompts des tâches à estimer sont rendus dans un fichier JSONL
+(cache/batch/<nom>_<horodatage>.jsonl) et soumis à l'API Batch du fournisseur
+(asynchrone, tarif réduit, résultats sous 24 h). Le job est mémorisé dans
+cache/batch_jobs_<nom>.json ; un run ultérieur relève les résultats et les
+consigne dans le journal de reprise, d'où ils sont écrits dans Notion par le
+chemin normal (hash vérifié : une tâche modifiée entre-temps est réestimée)
+"""
+import os
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import manifest
+
+# Statuts définitifs sans résultats exploitables
+FAILED_STATUSES = {"failed", "expired", "cancelled"}
+
+
+class BatchJobStore:
+    """Jobs batch soumis et pas encore relevés"""
+
+    def __init__(self, path: Path, name: str, database_id: str):
+        self.path = Path(path)
+        self.name = name
+        self.database_id = database_id
+        self.jobs: List[Dict] = []
+
+    @classmethod
+    def load(cls, name: str, database_id: str) -> "BatchJobStore":
+        """Relit cache/batch_jobs_<name>.json (jobs d'une autre database ignorés)"""
+        store = cls(manifest.CACHE_DIR / f"batch_jobs_{name}.json", name, database_id)
+        if not store.path.exists():
+            return store
+        try:
+            with open(store.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("database_id") == database_id:
+                store.jobs = data.get("jobs", [])
+        except Exception as e:
+            print(f"⚠️ Jobs batch illisibles, ignorés: {e}")
+        return store
+
+    def save(self):
+        """Écrit la liste des jobs (écriture atomique, fichier supprimé si vide)"""
+        try:
+            if not self.jobs:
+                if self.path.exists():
+                    self.path.unlink()
+                return
+            self.path.parent.mkdir(exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"database_id": self.database_id, "jobs": self.jobs}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Jobs batch non sauvegardés: {e}")
+
+    def pending_hashes(self) -> Dict[str, str]:
+        """Tâches déjà soumises {page_id: hash} (à ne pas resoumettre tant que le hash est le même)"""
+        pending = {}
+        for job in self.jobs:
+            for members in job["tasks"].values():
+                for page_id, source_hash in members:
+                    pending[page_id] = source_hash
+        return pending
+
+
+def collect_jobs(store: BatchJobStore, estimator, journal) -> Dict:
+    """
+    Relève les jobs soumis : les résultats des jobs terminés sont consignés dans le
+    journal (pour chaque tâche du groupe dédoublonné, avec le hash de la soumission).
+    Returns: {"completed", "ingested", "pending", "failed"}
+    """
+    stats = {"completed": 0, "ingested": 0, "pending": 0, "failed": 0}
+    for job in list(store.jobs):
+        batch = estimator.get_batch(job["batch_id"])
+        if batch is None:
+            stats["pending"] += 1
+            continue
+        status = batch.get("status")
+        if status == "completed":
+            results = estimator.batch_results(batch)
+            for rep_id, minutes in results.items():
+                for page_id, source_hash in job["tasks"].get(rep_id, []):
+                    journal.record_estimate(page_id, source_hash, minutes)
+                    stats["ingested"] += 1
+            missing = len(job["tasks"]) - len(results)
+            print(f"   📦 Job {job['batch_id']} terminé: {len(results)} estimations"
+                  + (f" ({missing} en échec, resoumises au prochain run)" if missing else ""))
+            store.jobs.remove(job)
+            stats["completed"] += 1
+        elif status in FAILED_STATUSES:
+            print(f"   ❌ Job {job['batch_id']} {status}: tâches resoumises au prochain run")
+            store.jobs.remove(job)
+            stats["failed"] += 1
+        else:
+            counts = batch.get("request_counts") or {}
+            print(f"   ⏳ Job {job['batch_id']} {status} "
+                  f"({counts.get('completed', 0)}/{counts.get('total', len(job['tasks']))})")
+            stats["pending"] += 1
+    store.save()
+    return stats
+
+
+def submit_job(store: BatchJobStore, estimator, groups: List[List[Dict]], all_tasks_history: List[Dict],
+               project_name: str) -> Optional[str]:
+    """
+    Rend les prompts des représentants des groupes dans un fichier JSONL et soumet le job.
+    Returns: id du batch, ou None si la soumission a échoué
+    """
+    representatives = [group[0] for group in groups]
+    lines = estimator.batch_request_lines(representatives, all_tasks_history, project_name)
+    jsonl = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines).encode("utf-8")
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    job_path = manifest.CACHE_DIR / "batch" / f"{store.name}_{stamp}.jsonl"
+    try:
+        job_path.parent.mkdir(parents=True, exist_ok=True)
+        job_path.write_bytes(jsonl)
+    except Exception as e:
+        print(f"⚠️ Fichier du job non conservé (non critique): {e}")
+
+    batch_id = estimator.submit_batch(jsonl)
+    if batch_id is None:
+        return None
+    store.jobs.append({
+        "batch_id": batch_id,
+        "input_file": str(job_path),
+        "submitted_at": datetime.now(timezone.utc).isoformat(),
+        "tasks": {
+            group[0]["id"]: [[member["id"], member.get("new_hash")] for member in group]
+            for group in groups
+        }
+    })
+    store.save()
+    return batch_id
@@ -0,0 +1,159 @@
+"""
+Configuration de Martine IA
+Lecture du .env à la demande (aucun effet de bord à l'import) et fabrique
+des estimateurs avec import différé du fournisseur (GPT ou Gemini)
+"""
+import os
+from pathlib import Path
+from typing import Optional
+
+_env_loaded = False
+
+
+def find_env_file(start: Optional[Path] = None) -> Optional[Path]:
+    """Cherche le fichier .env en remontant l'arborescence"""
+    current = Path(start or __file__).resolve().parent
+    for _ in range(5):
+        env_path = current / ".env"
+        if env_path.exists():
+            return env_path
+        current = current.parent
+    return None
+
+
+def load_env(required: bool = False) -> Optional[Path]:
+    """
+    Charge le .env une seule fois par processus.
+    required: lève FileNotFoundError si aucun .env n'est trouvé
+    """
+    global _env_loaded
+    env_path = find_env_file()
+    if _env_loaded:
+        return env_path
+    if env_path:
+        from dotenv import load_dotenv
+        load_dotenv(env_path, override=True)
+    elif required:
+        raise FileNotFoundError("❌ Fichier .env introuvable!")
+    _env_loaded = True
+    return env_path
+
+
+def env_number(name: str, default: float) -> float:
+    """Lit un nombre depuis le .env (valeur par défaut si absent ou invalide)"""
+    raw = os.getenv(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        print(f"⚠️ {name} invalide ({raw}), valeur par défaut {default}")
+        return default
+
+
+def _flag(name: str, default: str = "false") -> bool:
+    """Booléen depuis une variable d'environnement"""
+    return os.getenv(name, default).lower() == "true"
+
+
+class MartineConfig:
+    """Paramètres d'exécution des moteurs (construits depuis l'environnement ou à la main)"""
+
+    def __init__(
+        self,
+        notion_token: Optional[str] = None,
+        db_taches: Optional[str] = None,
+        db_projets: Optional[str] = None,
+        db_phases: Optional[str] = None,
+        estimator_engine: str = "gemini",
+        gemini_key: Optional[str] = None,
+        gemini_model: str = "gemini-2.0-flash-exp",
+        gemini_base_url: Optional[str] = None,
+        gpt_key: Optional[str] = None,
+        gpt_model: str = "gpt-4o",
+        gpt_base_url: Optional[str] = None,
+        debug_mode: bool = False,
+        write_parent_totals: bool = False,
+        notion_rate: Optional[float] = None,
+        notion_base_url: Optional[str] = None,
+        target: Optional[str] = None
+    ):
+        self.notion_token = notion_token
+        self.db_taches = db_taches
+        self.db_projets = db_projets
+        self.db_phases = db_phases
+        self.estimator_engine = (estimator_engine or "gemini").lower()
+        self.gemini_key = gemini_key
+        self.gemini_model = gemini_model
+        self.gemini_base_url = gemini_base_url  # API compatible Gemini (None = generativelanguage.googleapis.com)
+        self.gpt_key = gpt_key
+        self.gpt_model = gpt_model
+        self.gpt_base_url = gpt_base_url  # API compatible OpenAI (None = api.openai.com)
+        self.debug_mode = debug_mode
+        self.write_parent_totals = write_parent_totals
+        self.notion_rate = notion_rate  # requêtes Notion/s (None = sans limite)
+        self.notion_base_url = notion_base_url  # API compatible Notion (None = api.notion.com)
+        self.target = target  # nom de la cible (exécution multi-cibles)
+
+    @classmethod
+    def from_env(cls, load_file: bool = True) -> "MartineConfig":
+        """Construit la configuration depuis le .env / les variables d'environnement"""
+        if load_file:
+            load_env()
+        return cls(
+            notion_token=os.getenv("NOTION_TOKEN"),
+            db_taches=os.getenv("DATABASE_TACHES_IA", os.getenv("DATABASE_TACHES")),
+            db_projets=os.getenv("DATABASE_PROJETS_IA", os.getenv("DATABASE_PROJETS")),
+            db_phases=os.getenv("DATABASE_PHASES"),
+            estimator_engine=os.getenv("ESTIMATOR_ENGINE", "gemini"),
+            gemini_key=os.getenv("GEMINI_API_KEY"),
+            gemini_model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp"),
+            gemini_base_url=os.getenv("GEMINI_BASE_URL") or None,
+            gpt_key=os.getenv("GPT_API_KEY"),
+            gpt_model=os.getenv("GPT_MODEL", "gpt-4o"),
+            gpt_base_url=os.getenv("GPT_BASE_URL") or None,
+            debug_mode=_flag("DEBUG_MODE"),
+            write_parent_totals=_flag("WRITE_PARENT_TOTALS"),
+            notion_rate=env_number("NOTION_RATE", 0) or None,
+            notion_base_url=os.getenv("NOTION_BASE_URL") or None
+        )
+
+    def replace(self, **fields) -> "MartineConfig":
+        """Copie de la configuration avec certains champs remplacés (ValueError si champ inconnu)"""
+        values = dict(vars(self))
+        for name in fields:
+            if name not in values:
+                raise ValueError(f"❌ Paramètre de configuration inconnu: {name}")
+        values.update(fields)
+        return MartineConfig(**values)
+
+    def require(self, **fields):
+        """
+        Vérifie des champs obligatoires.
+        Usage: config.require(notion_token="NOTION_TOKEN", db_taches="DATABASE_TACHES_IA")
+        """
+        for attr, env_name in fields.items():
+            if not getattr(self, attr):
+                raise ValueError(f"❌ {env_name} manquant dans .env")
+
+
+def create_estimator(config: MartineConfig, engine: Optional[str] = None):
+    """
+    Instancie l'estimateur d'un moteur ("gemini" ou "gpt", défaut: config.estimator_engine).
+    Le module du fournisseur n'est importé qu'ici.
+    """
+    engine = (engine or config.estimator_engine).lower()
+    if engine == "gemini":
+        config.require(gemini_key="GEMINI_API_KEY")
+        from gemini_estimator import GeminiEstimator, DEFAULT_API_BASE
+        return GeminiEstimator(config.gemini_key, config.gemini_model, config.gemini_base_url or DEFAULT_API_BASE)
+
+    config.require(gpt_key="GPT_API_KEY")
+    from gpt_estimator import GPTEstimator, DEFAULT_API_BASE
+    return GPTEstimator(config.gpt_key, config.gpt_model, config.gpt_base_url or DEFAULT_API_BASE)
+
+
+def create_notion_limiter(config: MartineConfig):
+    """Seau à jetons des requêtes Notion (config.notion_rate), None si pas de limite"""
+    if not config.notion_rate:
+        return None
+    from write_queue import RateLimiter
+    return RateLimiter(config.notion_rate)
@@ -0,0 +1,167 @@
+"""
+Déduplication des tâches avant estimation pour Martine IA
+Regroupe les tâches clonées (même nom, description, contenu, projet) pour
+n'estimer qu'une fois par groupe, avec regroupement approché MinHash optionnel
+"""
+import os
+import re
+import hashlib
+from typing import Dict, List, Optional
+
+# Champs qui alimentent le prompt (et le filtre d'historique pour "projet")
+FINGERPRINT_FIELDS = ["nom", "description", "content", "projet"]
+
+# Paramètres MinHash (64 permutations, 16 bandes de 4 lignes pour le LSH)
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_text(value) -> str:
+    """Normalise une valeur (casse, espaces, listes triées) pour l'empreinte"""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ",".join(sorted(normalize_text(v) for v in value))
+    text = str(value).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def task_fingerprint(task: Dict) -> str:
+    """Empreinte exacte (SHA-256) des champs normalisés qui alimentent le prompt"""
+    parts = [normalize_text(task.get(field)) for field in FINGERPRINT_FIELDS]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _shingles(text: str) -> set:
+    """Ensemble des n-grammes de mots d'un texte"""
+    words = text.split()
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _permutations() -> List[tuple]:
+    """Coefficients (a, b) déterministes des permutations MinHash"""
+    coeffs = []
+    for i in range(MINHASH_PERMUTATIONS):
+        digest = hashlib.sha256(f"minhash-{i}".encode("utf-8")).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:16], "big") % _MERSENNE_PRIME
+        coeffs.append((a, b))
+    return coeffs
+
+
+_PERMUTATIONS = _permutations()
+
+
+def minhash_signature(task: Dict) -> List[int]:
+    """Signature MinHash du texte de la tâche (nom + description + contenu)"""
+    text = " ".join(normalize_text(task.get(f)) for f in ["nom", "description", "content"])
+    shingles = _shingles(text)
+    if not shingles:
+        return [0] * MINHASH_PERMUTATIONS
+
+    hashed = [int.from_bytes(hashlib.sha1(s.encode("utf-8")).digest()[:4], "big") for s in shingles]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def estimated_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimation de la similarité de Jaccard à partir de deux signatures"""
+    same = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return same / len(sig_a)
+
+
+def near_threshold_from_env() -> Optional[float]:
+    """Seuil de similarité MinHash depuis DEDUP_NEAR_THRESHOLD (.env), None = désactivé"""
+    raw = os.getenv("DEDUP_NEAR_THRESHOLD", "").strip()
+    if not raw:
+        return None
+    try:
+        threshold = float(raw)
+    except ValueError:
+        print(f"⚠️ DEDUP_NEAR_THRESHOLD invalide ({raw}), regroupement approché désactivé")
+        return None
+    return threshold if 0 < threshold <= 1 else None
+
+
+def group_tasks(tasks: List[Dict], near_threshold: Optional[float] = None) -> List[List[Dict]]:
+    """
+    Regroupe les tâches à estimer.
+    1. Groupes exacts par empreinte normalisée
+    2. (optionnel) Fusion des groupes quasi identiques d'un même projet via MinHash/LSH
+
+    L'ordre d'entrée est conservé : chaque groupe est placé à la position de son
+    premier membre, qui en est le représentant (celui qui sera estimé).
+    """
+    groups: Dict[str, List[Dict]] = {}
+    for task in tasks:
+        groups.setdefault(task_fingerprint(task), []).append(task)
+    ordered = list(groups.values())
+
+    if near_threshold is None or len(ordered) < 2:
+        return ordered
+
+    # Union-find sur les représentants
+    parent = list(range(len(ordered)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    signatures = [minhash_signature(g[0]) for g in ordered]
+    projets = [normalize_text(g[0].get("projet")) for g in ordered]
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+
+    # LSH : seuls les groupes partageant une bande sont comparés
+    buckets: Dict[tuple, List[int]] = {}
+    for idx, sig in enumerate(signatures):
+        for band in range(MINHASH_BANDS):
+            key = (projets[idx], band, tuple(sig[band * rows:(band + 1) * rows]))
+            buckets.setdefault(key, []).append(idx)
+
+    for members in buckets.values():
+        for pos, first in enumerate(members):
+            for other in members[pos + 1:]:
+                root_a, root_b = find(first), find(other)
+                if root_a == root_b:
+                    continue
+                if estimated_similarity(signatures[first], signatures[other]) >= near_threshold:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    merged: Dict[int, List[Dict]] = {}
+    for idx, group in enumerate(ordered):
+        merged.setdefault(find(idx), []).extend(group)
+    return [merged[root] for root in sorted(merged)]
+
+
+def fan_out(groups: List[List[Dict]], estimates: Dict[str, float]) -> Dict[str, float]:
+    """Recopie l'estimation du représentant sur chaque membre de son groupe"""
+    result = {}
+    for group in groups:
+        rep_id = group[0].get("id")
+        if rep_id not in estimates:
+            continue
+        for member in group:
+            result[member.get("id")] = estimates[rep_id]
+    return result
+
+
+def groups_log(groups: List[List[Dict]]) -> Dict[str, Dict]:
+    """Trace des regroupements (groupes de plus d'un membre) pour le journal des runs"""
+    return {
+        group[0].get("id"): {
+            "representative": group[0].get("nom", "Sans nom"),
+            "members": [member.get("id") for member in group[1:]]
+        }
+        for group in groups
+        if len(group) > 1
+    }
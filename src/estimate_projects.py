@@ -5,50 +5,26 @@ Mode "Senior PM": évalue la charge globale, pas la somme des tâches
 """
 import os
 import sys
-import json
 import time
-import hashlib
-from datetime import datetime
-from pathlib import Path
-
-# Forcer l'encodage UTF-8 pour Windows
-if sys.platform == 'win32':
-    sys.stdout.reconfigure(encoding='utf-8')
-
-
-def find_env_file():
-    """Cherche le fichier .env en remontant l'arborescence"""
-    current = Path(__file__).resolve().parent
-    for _ in range(5):
-        env_path = current / ".env"
-        if env_path.exists():
-            return env_path
-        current = current.parent
-    return None
-
-
-# Chargement robuste du .env
-env_path = find_env_file()
-if env_path:
-    from dotenv import load_dotenv
-    load_dotenv(env_path, override=True)
-else:
-    raise FileNotFoundError("❌ Fichier .env introuvable!")
+import threading
+from datetime import datetime, timezone
 
 # Ajouter src/ au path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from config import MartineConfig, create_estimator, create_notion_limiter, env_number, load_env
 from notion_client import NotionClient
-from gpt_estimator import GPTEstimator
-
-# Configuration depuis .env
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-GPT_API_KEY = os.getenv("GPT_API_KEY")
-GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4o")
-
-# Database IDs
-DB_PROJETS_IA = os.getenv("DATABASE_PROJETS_IA", os.getenv("DATABASE_PROJETS"))
-DB_TACHES_IA = os.getenv("DATABASE_TACHES_IA", os.getenv("DATABASE_TACHES"))
+from manifest import Manifest
+from source_hash import (
+    HASH_VERSION, PROPERTIES_CANONICALIZERS, hash_text, legacy_hash, task_leaf_hash, tasks_root_hash,
+    properties_component, project_root_hash, format_hash, parse_hash, changed_components
+)
+from scheduler import Deadline, max_items_from_env, read_choice, score_item
+from pipeline import DEFAULT_QUEUE_SIZE, Pipeline, Stage, Tally
+from leases import Shard
+from run_log import RunLog
+import metrics
+import profiling
 
 # Propriétés Notion
 PROP_NOM = "Projet"
@@ -57,192 +33,419 @@ PROP_DUREE_INIT = "🤖⏱️I Durée est IA INIT (sem)"  # Corrigé 'I'
 PROP_DUREE_ACTU = "🤖⏱️A Durée est IA ACTU (sem)"  # Corrigé 'A'
 PROP_TACHES = "Tâches IA"  # Corrigé 'IA'
 PROP_HASH = "🤖⏱️Hash Source IA"  # Nouvelle propriété pour détection de changements
+PROP_PRIORITE = "Priorité"  # Ordonnancement
+PROP_STATUT = "Statut"  # Ordonnancement
 
-# Mode DEBUG (ne modifie pas Notion)
-DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
+# Propriétés lues sur les tâches liées (résumé + hash feuille)
+PROP_TACHE_NOM = "Nom"
+PROP_TACHE_ESTIMATION = "🤖⏱️Temps est IA (h) ENFANT"
 
 # Valeurs autorisées pour la durée en semaines
 VALID_DURATIONS = [0.5, 1, 1.5, 2, 3, 4, 6, 8, 10, 12, 16, 20, 24]
 
-# Vérifications
-if not NOTION_TOKEN:
-    raise ValueError("❌ NOTION_TOKEN manquant dans .env")
-if not GPT_API_KEY:
-    raise ValueError("❌ GPT_API_KEY manquant dans .env")
-if not DB_PROJETS_IA:
-    raise ValueError("❌ DATABASE_PROJETS_IA manquant dans .env")
+# Configuration, client Notion et estimateur GPT : construits au premier usage
+# (l'import du module n'a aucun effet de bord)
+_config = None
+_notion = None
+_estimator = None
+
+
+def configure(config: MartineConfig = None, notion: NotionClient = None, estimator=None):
+    """
+    Injecte la configuration et/ou les dépendances du moteur (usage bibliothèque).
+    Changer la configuration oublie le client et l'estimateur construits avec l'ancienne.
+    """
+    global _config, _notion, _estimator
+    if config is not None:
+        _config = config
+        _notion = None
+        _estimator = None
+    if notion is not None:
+        _notion = notion
+    if estimator is not None:
+        _estimator = estimator
+
+
+def get_config() -> MartineConfig:
+    """Configuration du moteur (lue depuis le .env au premier appel)"""
+    global _config
+    if _config is None:
+        _config = MartineConfig.from_env()
+    return _config
+
+
+def get_notion() -> NotionClient:
+    """Client Notion (créé au premier appel)"""
+    global _notion
+    if _notion is None:
+        config = get_config()
+        config.require(notion_token="NOTION_TOKEN", db_projets="DATABASE_PROJETS_IA")
+        _notion = NotionClient(config.notion_token, create_notion_limiter(config), config.notion_base_url)
+    return _notion
+
+
+def get_estimator():
+    """Estimateur GPT des projets (fournisseur importé au premier appel)"""
+    global _estimator
+    if _estimator is None:
+        _estimator = create_estimator(get_config(), "gpt")
+    return _estimator
 
-# Initialiser clients
-notion = NotionClient(NOTION_TOKEN)
-# gemini = GeminiEstimator(GEMINI_KEY, GEMINI_MODEL) # Removed
 
 def get_property_value(page: dict, prop_name: str):
     """Récupère la valeur d'une propriété (wrapper pour gestion d'erreurs)"""
     try:
-        return notion.get_property_value(page, prop_name)
+        return get_notion().get_property_value(page, prop_name)
     except Exception:
         return None
 
 
-def calculate_project_hash(project_data: dict) -> str:
-    """Calcule un hash SHA-256 des données sources du projet"""
-    # On concatène les infos structurantes
-    input_str = (
-        f"{project_data.get('nom', '')}|"
-        f"{project_data.get('description', '')}|"
-        f"{project_data.get('content', '')}|"
-        f"{project_data.get('tasks_summary', '')}|"
-        f"{project_data.get('full_context', '')}"
+def calculate_project_hash(components: dict, version: str = HASH_VERSION) -> str:
+    """
+    Calcule le hash source hiérarchique du projet (valeur stockée dans Notion).
+    components: sous-hashs {"content", "properties", "tasks"}
+    """
+    return format_hash(project_root_hash(components), version)
+
+
+def record_task_leaf(task_store: Manifest, page: dict):
+    """Calcule et mémorise le hash feuille d'une tâche (avec nom et estimation pour le résumé)"""
+    nom = get_property_value(page, PROP_TACHE_NOM) or "Tâche"
+    estimation = get_property_value(page, PROP_TACHE_ESTIMATION)
+    task_store.record(
+        page.get("id"),
+        page.get("last_edited_time"),
+        task_leaf_hash(nom, estimation),
+        nom=nom,
+        estimation=estimation
     )
-    return hashlib.sha256(input_str.encode('utf-8')).hexdigest()
 
 
-def get_projects_to_estimate() -> list:
+def sync_task_leaves(task_store: Manifest):
     """
-    Récupère les projets à estimer depuis Notion.
-    Filtre: DUREE_INIT vide ou 0
+    Met à jour les hashs feuilles des tâches en une seule requête paginée :
+    toute la base au premier passage, puis seulement les tâches modifiées.
+    Retourne les ids modifiés, ou None si la vérification rapide n'est pas possible.
     """
-    print("\n🔍 Recherche des projets à estimer...")
-    
+    if not get_config().db_taches:
+        return None
+    since_filter = task_store.changed_since_filter()
     try:
-        all_projects = notion.query_database(DB_PROJETS_IA)
+        pages = get_notion().query_database(get_config().db_taches, since_filter, strict=True)
     except Exception as e:
-        print(f"❌ Erreur lecture base Projets: {e}")
-        return []
+        print(f"   ⚠️ Synchro des tâches indisponible, vérification complète: {e}")
+        return None
     
-    to_estimate = []
-    skipped_already = 0
+    for page in pages:
+        record_task_leaf(task_store, page)
     
-    for project in all_projects:
-        page_id = project.get("id")
-        nom = get_property_value(project, PROP_NOM) or "Sans nom"
-        
-        # Filtre "Au long court"
-        ordre = get_property_value(project, "Ordre")
-        if ordre and "Au long court" in str(ordre):
-            # On veut VIDER l'estimation si c'est au long court
-            duree_actu = get_property_value(project, PROP_DUREE_ACTU)
-            if duree_actu: # Si pas déjà vide
-                print(f"   🗑️  MARQUÉ POUR RESET (Au long court): {nom}")
-                to_estimate.append({
-                    "id": page_id,
-                    "nom": nom,
-                    "action": "CLEAR"
-                })
-            else:
-                print(f"   SKIP (Au long court déjà vide): {nom}")
-                skipped_already += 1
-            continue
-
-        # Récupérer les infos du projet
-        description = get_property_value(project, PROP_DESCRIPTION) or ""
-        
-        # Récupérer TOUTES les propriétés pour le contexte (Ordre, Statut, etc.)
-        properties_context = []
-        for prop_name, prop_data in project.get("properties", {}).items():
-            if prop_name in [PROP_NOM, PROP_DESCRIPTION, PROP_DUREE_INIT, PROP_DUREE_ACTU, PROP_TACHES]:
+    if not since_filter:
+        print(f"   🌳 {len(pages)} tâches indexées (premier passage)")
+        return None
+    print(f"   ⚡ {len(pages)} tâches modifiées depuis {task_store.synced_at}")
+    return {page.get("id") for page in pages}
+
+
+def get_task_leaves(task_ids: list, task_store: Manifest) -> dict:
+    """Hashs feuilles de toutes les tâches liées (lecture unitaire seulement si inconnue)"""
+    leaves = {}
+    for task_id in task_ids:
+        entry = task_store.get(task_id)
+        if entry is None:
+            page = get_notion().get_page(task_id)
+            if page is None:
                 continue
-            try:
-                val = get_property_value(project, prop_name)
-                if val:
-                    properties_context.append(f"{prop_name}: {val}")
-            except:
-                pass
-        
-        full_context = "\n".join(properties_context)
-        print(f"   📄 Lecture du contenu: {nom}")
-        try:
-            content = notion.get_page_content(page_id)
-        except Exception as e:
-            print(f"   ⚠️ Impossible de lire le contenu: {e}")
-            content = ""
-        
-        taches_ids = get_property_value(project, PROP_TACHES) or []
-        tasks_summary = get_tasks_summary(taches_ids)
+            record_task_leaf(task_store, page)
+            entry = task_store.get(task_id)
+        if entry is not None:
+            leaves[task_id] = entry["hash"]
+    return leaves
 
-        # --- LOGIQUE DE DÉTECTION DE CHANGEMENT (HASH) ---
-        current_data = {
-            "nom": nom,
-            "description": description,
-            "content": content,
-            "tasks_summary": tasks_summary,
-            "full_context": full_context
-        }
-        current_hash = calculate_project_hash(current_data)
-        stored_hash = get_property_value(project, PROP_HASH)
-        
-        duree_init = get_property_value(project, PROP_DUREE_INIT)
+
+def is_long_term(project: dict) -> bool:
+    """Projet "Au long court" (Ordre) : pas d'estimation, ACTU vidée"""
+    ordre = get_property_value(project, "Ordre")
+    return bool(ordre) and "Au long court" in str(ordre)
+
+
+def prepare_project(project: dict, manifest: Manifest, task_store: Manifest, changed_task_ids, stats: Tally):
+    """
+    Étape "lecture" d'un projet : vérification rapide (niveau 1), puis lecture du
+    contenu (si la page a changé) et des hashs feuilles de ses tâches.
+    Retourne un candidat CLEAR, un projet préparé pour decide_project, ou None (à jour).
+    """
+    page_id = project.get("id")
+    nom = get_property_value(project, PROP_NOM) or "Sans nom"
+    
+    # Filtre "Au long court"
+    if is_long_term(project):
+        # On veut VIDER l'estimation si c'est au long court
         duree_actu = get_property_value(project, PROP_DUREE_ACTU)
-        
-        should_reestimate = False
-        is_initial = False
-        reason = ""
-        
-        if not duree_init or duree_init <= 0:
-            should_reestimate = True
-            is_initial = True
-            reason = "Première estimation"
-        elif current_hash != stored_hash:
-            print(f"   ✨ CHANGEMENT DÉTECTÉ pour: {nom}")
-            should_reestimate = True
-            is_initial = False
-            reason = "Mise à jour des infos"
-        elif not duree_actu or duree_actu <= 0:
-            print(f"   🔄 Ré-estimation IA demandée (ACTU vide) pour: {nom}")
-            should_reestimate = True
-            is_initial = False
-            reason = "Forçage manuel (ACTU vide)"
-        
-        if not should_reestimate:
-            print(f"   SKIP déjà à jour: {nom}")
-            skipped_already += 1
+        if duree_actu: # Si pas déjà vide
+            print(f"   🗑️  MARQUÉ POUR RESET (Au long court): {nom}")
+            return {
+                "id": page_id,
+                "nom": nom,
+                "action": "CLEAR"
+            }
+        print(f"   SKIP (Au long court déjà vide): {nom}")
+        stats.add("already")
+        return None
+
+    stored_hash = get_property_value(project, PROP_HASH)
+    duree_init = get_property_value(project, PROP_DUREE_INIT)
+    duree_actu = get_property_value(project, PROP_DUREE_ACTU)
+    # Relation complète (la requête la tronque à 25 tâches)
+    taches_ids = get_notion().get_relation_ids(project, PROP_TACHES)
+    
+    # --- NIVEAU 1 : VÉRIFICATION RAPIDE (sans lecture du contenu) ---
+    if (
+        changed_task_ids is not None
+        and duree_init and duree_init > 0
+        and duree_actu and duree_actu > 0
+        and manifest.is_unchanged(project, stored_hash)
+        and not changed_task_ids.intersection(taches_ids)
+    ):
+        print(f"   SKIP inchangé (vérification rapide): {nom}")
+        stats.add("already")
+        stats.add("fast")
+        return None
+    
+    # Changement possible : l'entrée ne sera rétablie qu'une fois le projet vérifié/estimé
+    previous = manifest.get(page_id)
+    manifest.forget(page_id)
+    
+    # Récupérer les infos du projet
+    description = get_property_value(project, PROP_DESCRIPTION) or ""
+    
+    # Récupérer TOUTES les propriétés pour le contexte (Ordre, Statut, etc.)
+    properties_context = []
+    for prop_name, prop_data in project.get("properties", {}).items():
+        if prop_name in [PROP_NOM, PROP_DESCRIPTION, PROP_DUREE_INIT, PROP_DUREE_ACTU, PROP_TACHES, PROP_HASH]:
             continue
-        
-        to_estimate.append({
+        try:
+            val = get_property_value(project, prop_name)
+            if val:
+                properties_context.append(f"{prop_name}: {val}")
+        except:
+            pass
+    
+    full_context = "\n".join(properties_context)
+    
+    # Le contenu n'est relu que si la page elle-même a été modifiée
+    # (ou pour vérifier un hash historique, calculé sur le texte complet)
+    content = None
+    is_legacy = bool(stored_hash) and parse_hash(stored_hash)[0] is None
+    page_unchanged = (previous and previous.get("last_edited_time") == project.get("last_edited_time")
+                      and Manifest.is_settled(previous))
+    if page_unchanged and previous.get("components", {}).get("content") and not is_legacy:
+        content_hash = previous["components"]["content"]
+    else:
+        content = fetch_project_content(page_id, nom)
+        content_hash = hash_text(content)
+    task_leaves = get_task_leaves(taches_ids, task_store)
+    
+    return {
+        "page": project,
+        "nom": nom,
+        "description": description,
+        "full_context": full_context,
+        "content": content,
+        "content_hash": content_hash,
+        "task_ids": taches_ids,
+        "task_leaves": task_leaves,
+        # Hash historique recalculé avec sa spécification (la colonne Hash, alors lue dans
+        # le contexte, était vide lors de la première estimation : seul ce cas est vérifiable)
+        "legacy_hash": legacy_hash(nom, description, content, get_tasks_summary(taches_ids, task_store),
+                                   full_context) if is_legacy else None,
+        "previous": previous,
+        "stored_hash": stored_hash,
+        "duree_init": duree_init,
+        "duree_actu": duree_actu
+    }
+
+
+def decide_project(prepared: dict, manifest: Manifest, stats: Tally):
+    """
+    Hash d'un projet préparé (calcul local, sans requête) : hash hiérarchique
+    (contenu / propriétés / tâches), migration éventuelle du format, puis choix de l'action.
+    Retourne le candidat (HASH_ONLY ou ESTIMATE, compléter ce dernier avec
+    load_project_inputs), ou None si le projet est à jour.
+    """
+    if "page" not in prepared:
+        return prepared  # CLEAR : rien à vérifier
+    
+    project = prepared["page"]
+    page_id = project.get("id")
+    nom = prepared["nom"]
+    stored_hash = prepared["stored_hash"]
+    duree_init = prepared["duree_init"]
+    duree_actu = prepared["duree_actu"]
+    previous = prepared["previous"]
+    
+    # --- NIVEAU 2 : HASH HIÉRARCHIQUE ---
+    hash_context = {
+        "page": project,
+        "excluded": {PROP_DUREE_INIT, PROP_DUREE_ACTU, PROP_TACHES, PROP_HASH},
+        "nom": nom,
+        "description": prepared["description"],
+        "full_context": prepared["full_context"]
+    }
+    components = {
+        "content": prepared["content_hash"],
+        "properties": properties_component(HASH_VERSION, hash_context),
+        "tasks": tasks_root_hash(prepared["task_leaves"])
+    }
+    current_hash = calculate_project_hash(components)
+    
+    # Hash d'une version antérieure : on le vérifie avec SA spécification.
+    # S'il correspond, seul le format change -> migration sans appel IA.
+    stored_version, _ = parse_hash(stored_hash)
+    migrate_hash = False
+    if stored_hash and stored_version != HASH_VERSION and duree_actu and duree_actu > 0:
+        if stored_version is None:
+            migrate_hash = prepared["legacy_hash"] == stored_hash
+        elif stored_version in PROPERTIES_CANONICALIZERS:
+            old_components = dict(components, properties=properties_component(stored_version, hash_context))
+            migrate_hash = calculate_project_hash(old_components, stored_version) == stored_hash
+    
+    should_reestimate = False
+    is_initial = False
+    reason = ""
+    
+    if not duree_init or duree_init <= 0:
+        should_reestimate = True
+        is_initial = True
+        reason = "Première estimation"
+    elif migrate_hash:
+        print(f"   🔁 Migration du hash {stored_version or 'historique'} → {HASH_VERSION} (sans ré-estimation): {nom}")
+        return {
             "id": page_id,
             "nom": nom,
-            "description": description,
-            "content": content,
-            "tasks_summary": tasks_summary,
-            "full_context": full_context,
-            "action": "ESTIMATE",
-            "is_initial": is_initial,
+            "action": "HASH_ONLY",
             "new_hash": current_hash,
-            "reason": reason
-        })
+            "components": components
+        }
+    elif current_hash != stored_hash:
+        changed = changed_components(previous.get("components") if previous else None, components)
+        print(f"   ✨ CHANGEMENT DÉTECTÉ pour: {nom} ({', '.join(changed)})")
+        should_reestimate = True
+        is_initial = False
+        reason = "Mise à jour des infos"
+    elif not duree_actu or duree_actu <= 0:
+        print(f"   🔄 Ré-estimation IA demandée (ACTU vide) pour: {nom}")
+        should_reestimate = True
+        is_initial = False
+        reason = "Forçage manuel (ACTU vide)"
+    
+    if not should_reestimate:
+        print(f"   SKIP déjà à jour: {nom}")
+        stats.add("already")
+        manifest.record(page_id, project.get("last_edited_time"), current_hash, components=components)
+        return None
+    
+    return {
+        "id": page_id,
+        "nom": nom,
+        "description": prepared["description"],
+        "content": prepared["content"],
+        "task_ids": prepared["task_ids"],
+        "full_context": prepared["full_context"],
+        "action": "ESTIMATE",
+        "is_initial": is_initial,
+        "new_hash": current_hash,
+        "components": components,
+        "reason": reason,
+        "priorite": read_choice(project, PROP_PRIORITE),
+        "statut": read_choice(project, PROP_STATUT),
+        "last_edited_time": project.get("last_edited_time")
+    }
+
+
+def load_project_inputs(candidate: dict, task_store: Manifest) -> dict:
+    """Complète un candidat ESTIMATE : contenu (s'il n'a pas été relu) et résumé des tâches"""
+    if candidate.get("action", "ESTIMATE") != "ESTIMATE":
+        return candidate
+    if candidate["content"] is None:
+        candidate["content"] = fetch_project_content(candidate["id"], candidate["nom"])
+    candidate["tasks_summary"] = get_tasks_summary(candidate["task_ids"], task_store)
+    return candidate
+
+
+def query_projects(manifest: Manifest, task_store: Manifest) -> tuple:
+    """
+    Étape "requête" : lit la base Projets et synchronise les hashs feuilles des tâches.
+    Returns: (projets, ids des tâches modifiées ou None)
+    """
+    try:
+        all_projects = get_notion().query_database(get_config().db_projets)
+    except Exception as e:
+        print(f"❌ Erreur lecture base Projets: {e}")
+        return [], None
+    return all_projects, sync_task_leaves(task_store)
+
+
+def get_projects_to_estimate(manifest: Manifest = None, task_store: Manifest = None) -> list:
+    """
+    Récupère les projets à estimer depuis Notion (parcours séquentiel des étapes
+    requête → lecture → hash, sans appel IA).
+    Filtre: DUREE_INIT vide ou 0
+
+    Détection de changement en deux niveaux :
+      1. Rapide : last_edited_time du projet et de ses tâches comparés au manifeste local
+      2. Complet : hash hiérarchique (contenu / propriétés / tâches), seul le contenu
+         d'une page modifiée est relu, les tâches viennent des hashs feuilles locaux
+    """
+    print("\n🔍 Recherche des projets à estimer...")
+    
+    if manifest is None:
+        manifest = Manifest.load("projets", get_config().db_projets)
+    if task_store is None:
+        task_store = Manifest.load("taches", get_config().db_taches)
+    all_projects, changed_task_ids = query_projects(manifest, task_store)
+    
+    to_estimate = []
+    stats = Tally()
+    for project in all_projects:
+        prepared = prepare_project(project, manifest, task_store, changed_task_ids, stats)
+        candidate = decide_project(prepared, manifest, stats) if prepared else None
+        if candidate:
+            to_estimate.append(load_project_inputs(candidate, task_store))
     
     print(f"\n📊 Résumé:")
-    print(f"   - Déjà à jour: {skipped_already}")
+    print(f"   - Déjà à jour: {stats.get('already')} (dont {stats.get('fast')} par vérification rapide)")
     print(f"   - Actions prévues: {len(to_estimate)}")
     
     return to_estimate
 
 
-def get_tasks_summary(task_ids: list) -> str:
-    """Génère un résumé des tâches liées à un projet"""
+def fetch_project_content(page_id: str, nom: str) -> str:
+    """Lit le contenu texte d'une page projet"""
+    print(f"   📄 Lecture du contenu: {nom}")
+    try:
+        with metrics.phase("content"):
+            return get_notion().get_page_content(page_id)
+    except Exception as e:
+        print(f"   ⚠️ Impossible de lire le contenu: {e}")
+        return ""
+
+
+def get_tasks_summary(task_ids: list, task_store: Manifest) -> str:
+    """Génère un résumé des tâches liées à un projet (depuis l'index local des tâches)"""
     if not task_ids:
         return "Aucune tâche liée."
     
     summaries = []
-    for task_id in task_ids[:10]:  # Limiter à 10 tâches
-        try:
-            # Récupérer la page de la tâche
-            import requests
-            headers = {
-                "Authorization": f"Bearer {NOTION_TOKEN}",
-                "Notion-Version": "2022-06-28"
-            }
-            r = requests.get(f"https://api.notion.com/v1/pages/{task_id}", headers=headers)
-            if r.status_code == 200:
-                page = r.json()
-                nom = get_property_value(page, "Nom") or "Tâche"
-                estimation = get_property_value(page, "🤖⏱️Temps est IA (h) ENFANT")
-                if estimation:
-                    summaries.append(f"- {nom}: ~{estimation}h estimé")
-                else:
-                    summaries.append(f"- {nom}: non estimé")
-        except Exception:
+    for task_id in task_ids[:10]:  # Limiter à 10 tâches dans le prompt
+        entry = task_store.get(task_id)
+        if entry is None:
             continue
+        nom = entry.get("nom") or "Tâche"
+        estimation = entry.get("estimation")
+        if estimation:
+            summaries.append(f"- {nom}: ~{estimation}h estimé")
+        else:
+            summaries.append(f"- {nom}: non estimé")
     
     if not summaries:
         return f"{len(task_ids)} tâches liées (détails non disponibles)"
@@ -250,20 +453,26 @@ def get_tasks_summary(task_ids: list) -> str:
     return "\n".join(summaries)
 
 
-def get_historical_projects() -> list:
-    """Récupère l'historique des projets avec durée réelle > 0"""
+def get_historical_projects(projects: list = None) -> list:
+    """
+    Récupère l'historique des projets avec durée réelle > 0
+    (à défaut, la durée IA ACTU : source indiquée par "duree_source")
+    projects: projets déjà chargés (sinon nouvelle requête)
+    """
     print("\n📚 Chargement de l'historique des projets...")
     
-    try:
-        projects = notion.query_database(DB_PROJETS_IA)
-    except Exception as e:
-        print(f"⚠️ Erreur chargement historique: {e}")
-        return []
+    if projects is None:
+        try:
+            projects = get_notion().query_database(get_config().db_projets)
+        except Exception as e:
+            print(f"⚠️ Erreur chargement historique: {e}")
+            return []
     
     history = []
     for project in projects:
         # Chercher un champ durée réelle
         duree_reelle = None
+        source = "reelle"
         for prop_name in ["Durée réelle (sem)", "⏱️ Durée réelle", "Durée"]:
             try:
                 duree_reelle = get_property_value(project, prop_name)
@@ -278,6 +487,7 @@ def get_historical_projects() -> list:
                 duree_actu = get_property_value(project, PROP_DUREE_ACTU)
                 if duree_actu and duree_actu > 0:
                     duree_reelle = duree_actu  # On utilise l'actu comme référence faute de mieux
+                    source = "actu"
             except Exception:
                 pass
 
@@ -286,18 +496,22 @@ def get_historical_projects() -> list:
                 "id": project.get("id"),
                 "nom": get_property_value(project, PROP_NOM) or "Sans nom",
                 "description": get_property_value(project, PROP_DESCRIPTION) or "",
-                "duree_reelle": duree_reelle
+                "duree_reelle": duree_reelle,
+                "duree_source": source
             })
     
     print(f"📊 {len(history)} projets historiques chargés")
     return history
 
 
-def update_project_estimate(page_id: str, weeks: float, is_initial: bool = False, new_hash: str = None) -> bool:
+def update_project_estimate(page_id: str, weeks: float, is_initial: bool = False, new_hash: str = None,
+                            manifest: Manifest = None, components: dict = None) -> bool:
     """
     Met à jour l'estimation et le hash d'un projet dans Notion.
+    Le manifeste retient le last_edited_time renvoyé par l'écriture (notre propre
+    modification ne doit pas déclencher de relecture au passage suivant).
     """
-    if DEBUG_MODE:
+    if get_config().debug_mode:
         print(f"   [DEBUG] Simulation écriture: {weeks} semaines (hash: {new_hash[:8] if new_hash else 'N/A'})")
         return True
     
@@ -312,145 +526,285 @@ def update_project_estimate(page_id: str, weeks: float, is_initial: bool = False
         if new_hash:
             properties[PROP_HASH] = {"rich_text": [{"text": {"content": new_hash}}]}
         
-        success = notion.update_page(page_id, properties)
-        return success
+        page = get_notion().patch_page(page_id, properties)
+        if page is not None and new_hash and manifest is not None:
+            manifest.record(page_id, page.get("last_edited_time"), new_hash, components=components)
+        return page is not None
     except Exception as e:
         print(f"   ❌ Erreur mise à jour: {e}")
         return False
 
 
-def run_estimations():
-    """Lance les estimations GPT et met à jour Notion"""
+def update_project_hash(page_id: str, new_hash: str, manifest: Manifest = None, components: dict = None) -> bool:
+    """Met à jour uniquement le hash d'un projet (migration de format, sans ré-estimation)"""
+    if get_config().debug_mode:
+        print(f"   [DEBUG] Simulation écriture hash: {new_hash[:12]}")
+        return True
+    
+    try:
+        page = get_notion().patch_page(page_id, {
+            PROP_HASH: {"rich_text": [{"text": {"content": new_hash}}]}
+        })
+        if page is not None and manifest is not None:
+            manifest.record(page_id, page.get("last_edited_time"), new_hash, components=components)
+        return page is not None
+    except Exception as e:
+        print(f"   ❌ Erreur mise à jour du hash: {e}")
+        return False
+
+
+def project_priority(project: dict) -> dict:
+    """Champs d'ordonnancement d'un projet, lus sans appel réseau"""
+    duree_init = get_property_value(project, PROP_DUREE_INIT)
+    return {
+        "priorite": read_choice(project, PROP_PRIORITE),
+        "statut": read_choice(project, PROP_STATUT),
+        "is_initial": not (duree_init and duree_init > 0),
+        "last_edited_time": project.get("last_edited_time")
+    }
+
+
+def write_project_action(project: dict, manifest: Manifest) -> bool:
+    """Écrit dans Notion le résultat d'une action (CLEAR, HASH_ONLY, UPDATE_ACTU_ONLY, ESTIMATE)"""
+    action = project.get("action", "ESTIMATE")
+    nom = project["nom"]
+    
+    if action == "CLEAR":
+        print(f"   🗑️  Suppression des estimations (Au long court): {nom}")
+        # On met à None pour vider dans Notion
+        return update_project_estimate(project["id"], None, is_initial=False)
+    
+    if action == "HASH_ONLY":
+        print(f"   🔁 Nouveau format de hash, estimation conservée: {nom}")
+        return update_project_hash(project["id"], project["new_hash"], manifest, project.get("components"))
+    
+    if action == "UPDATE_ACTU_ONLY":
+        print(f"   🔄 Synchro ACTU avec INIT ({project['value']} sem): {nom}")
+        return update_project_estimate(project["id"], project["value"], is_initial=False)
+    
+    success = update_project_estimate(
+        project["id"],
+        project["weeks"],
+        is_initial=project.get("is_initial", False),
+        new_hash=project.get("new_hash"),
+        manifest=manifest,
+        components=project.get("components")
+    )
+    if success:
+        mode_str = "INIT + ACTU" if project.get("is_initial") else "ACTU uniquement"
+        print(f"   💾 Écrit dans Notion ({mode_str}): {nom}")
+    else:
+        print(f"   ❌ Échec écriture: {nom}")
+    return success
+
+
+def run_estimations(estimator=None, deadline: Deadline = None, shard: Shard = None) -> dict:
+    """
+    Lance les estimations GPT et met à jour Notion, en pipeline :
+    requête → lecture (contenu, tâches) → hash → estimation IA → écriture,
+    chaque étape avec ses workers et une file bornée vers la suivante
+    estimator: estimateur partagé (sinon créé depuis le .env)
+    deadline: échéance partagée (sinon RUN_BUDGET_MINUTES)
+    shard: ne traite que les projets de ce shard (exécution répartie)
+    Returns: résumé du run (compteurs)
+    """
+    metrics.reset()
+    config = get_config()
+    suffix = shard.suffix if shard else ""
+    run_log = RunLog.open("projets", config.target, suffix)
+    run_log.emit("run_start", engine="projets", database_id=config.db_projets, target=config.target,
+                 shard=suffix or None, debug=config.debug_mode)
+    summary = None
+    error = None
+    try:
+        summary = _run_estimations(estimator, deadline, shard, run_log)
+        return summary
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        run_log.emit("run_end", summary=summary, error=error, metrics=metrics.snapshot())
+        run_log.close()
+        print(f"📝 Journal du run {run_log.run_id}: {run_log.path}")
+        metrics.export_textfile("projets" + suffix, config.target)
+
+
+def _run_estimations(estimator, deadline: Deadline, shard: Shard, run_log: RunLog) -> dict:
+    """
+    Corps de run_estimations (métriques du run remises à zéro avant, exportées après ;
+    début et fin du run consignés dans son journal)
+    """
+    summary = {"projects": 0, "updated": 0, "failed": 0, "postponed": 0}
     
     # --- PRÉ-REQUIS : Vérifier l'existence de la colonne HASH ---
     print("🔍 Vérification du schéma Notion...")
     try:
-        schema = notion.get_database_schema(DB_PROJETS_IA)
+        schema = get_notion().get_database_schema(get_config().db_projets)
         if PROP_HASH not in schema:
             print(f"   🏗️  Création de la colonne '{PROP_HASH}'...")
-            notion.add_property_to_database(DB_PROJETS_IA, PROP_HASH, {"rich_text": {}})
+            get_notion().add_property_to_database(get_config().db_projets, PROP_HASH, {"rich_text": {}})
     except Exception as e:
         print(f"   ⚠️ Impossible de vérifier le schéma: {e}")
 
     # Init GPT
-    api_key = os.getenv("GPT_API_KEY")
-    model = os.getenv("GPT_MODEL", "gpt-4o")
-    
-    if not api_key:
-        print("❌ GPT_API_KEY manquant!")
-        return
-
-    estimator = GPTEstimator(api_key, model)
+    if estimator is None:
+        try:
+            estimator = get_estimator()
+        except ValueError as e:
+            print(e)
+            return summary
     print(f"\n🤖 Lancement des estimations (mode Senior PM)...")
-    print(f"   Moteur: GPT ({model})")
+    print(f"   Moteur: GPT ({estimator.model})")
+    
+    if deadline is None:
+        deadline = Deadline.from_env()
+    # Fichiers locaux propres au shard (plusieurs workers sur la même machine)
+    suffix = shard.suffix if shard else ""
+    manifest = Manifest.load("projets" + suffix, get_config().db_projets)
+    task_store = Manifest.load("taches" + suffix, get_config().db_taches)
+    
+    # Étape 1 : requête (une lecture de la base, historique compris)
+    print("\n🔍 Recherche des projets à estimer...")
+    with metrics.phase("query"):
+        all_projects, changed_task_ids = query_projects(manifest, task_store)
+    with metrics.phase("history"):
+        historical = get_historical_projects(all_projects)
+    profiling.mark("query et historique")
+    if shard is not None:
+        all_projects = [project for project in all_projects if shard.contains(project.get("id"))]
+    
+    # Ordonnancement : les projets les plus utiles entrent les premiers dans le pipeline
+    now = datetime.now(timezone.utc)
+    all_projects = sorted(all_projects, key=lambda project: score_item(project_priority(project), now), reverse=True)
+    max_items = max_items_from_env()
     
-    projects = get_projects_to_estimate()
-    if not projects:
-        print("✅ Tous les projets sont déjà estimés")
-        return
+    stats = Tally()
+    budget_lock = threading.Lock()
+    budget = {"used": 0}
     
-    historical = get_historical_projects()
+    def skip(project, reason):
+        run_log.emit("skip", id=project.get("id"), name=get_property_value(project, PROP_NOM), reason=reason)
     
-    # Estimation
-    print("\n🧠 Estimation via GPT...")
-    updated = 0
-    failed = 0
+    def fetch_stage(project):
+        # Étape 2 : vérification rapide, lecture du contenu et des tâches, hash
+        # hiérarchique et choix de l'action, puis lecture des entrées du prompt.
+        # Toutes les requêtes d'un projet se font ici, sur les workers de lecture.
+        if deadline.expired():
+            stats.add("unchecked")
+            skip(project, "deadline")
+            return None
+        prepared = prepare_project(project, manifest, task_store, changed_task_ids, stats)
+        if prepared is None:
+            skip(project, "long_term" if is_long_term(project) else "unchanged_fast")
+            return None
+        with metrics.phase("hash"):
+            decided = decide_project(prepared, manifest, stats)
+        if decided is None:
+            skip(prepared["page"], "unchanged")
+            return None
+        return load_project_inputs(decided, task_store)
     
-    for i, project in enumerate(projects, 1):
-        print(f"\n📦 Projet {i}/{len(projects)}: {project['nom']}")
+    def estimate_stage(project):
+        # Étape 4 : appel IA (les actions sans IA passent directement)
+        if project.get("action", "ESTIMATE") != "ESTIMATE":
+            return project
+        with budget_lock:
+            if deadline.expired() or (max_items is not None and 0 <= max_items <= budget["used"]):
+                stats.add("postponed")
+                run_log.emit("skip", id=project["id"], name=project["nom"],
+                             reason="deadline" if deadline.expired() else "max_items")
+                return None
+            budget["used"] += 1
+        print(f"\n📦 Estimation: {project['nom']}")
         if project.get("reason"):
             print(f"   Motif: {project['reason']}")
-        
-        action = project.get("action", "ESTIMATE")
-        
-        if action == "CLEAR":
-            print(f"   🗑️  Suppression des estimations (Au long court)")
-            # On met à None pour vider dans Notion
-            success = update_project_estimate(project["id"], None, is_initial=False)
-            if success:
-                updated += 1
-            else:
-                failed += 1
-            continue
-
-        if action == "UPDATE_ACTU_ONLY":
-            print(f"   🔄 Synchro ACTU avec INIT ({project['value']} sem)")
-            success = update_project_estimate(project["id"], project["value"], is_initial=False)
-            if success:
-                updated += 1
-            else:
-                failed += 1
-            continue
-
-        # Sinon ESTIMATE
-        estimated_weeks = estimator.estimate_project_duration(
-            project_name=project["nom"],
-            project_description=project["description"] + "\n\nCONTEXTE: " + (project.get("full_context") or ""),
-            project_content=project.get("content") or "",
-            tasks_summary=project.get("tasks_summary") or "",
-            historical_projects=historical
-        )
-        
-        if estimated_weeks is not None:
-            print(f"   ✅ Estimation: {estimated_weeks} semaines")
-            
-            success = update_project_estimate(
-                project["id"], 
-                estimated_weeks, 
-                is_initial=project.get("is_initial", False),
-                new_hash=project.get("new_hash")
+        with metrics.phase("llm"):
+            project["weeks"] = estimator.estimate_project_duration(
+                project_name=project["nom"],
+                project_description=project["description"] + "\n\nCONTEXTE: " + (project.get("full_context") or ""),
+                project_content=project.get("content") or "",
+                tasks_summary=project.get("tasks_summary") or "",
+                historical_projects=historical
             )
-            
-            if success:
-                mode_str = "INIT + ACTU" if project.get("is_initial") else "ACTU uniquement"
-                print(f"   💾 Écrit dans Notion ({mode_str})")
-                updated += 1
-            else:
-                print(f"   ❌ Échec écriture")
-                failed += 1
-        else:
-            print(f"   ⚠️ Échec estimation")
-            failed += 1
+        if project["weeks"] is None:
+            print(f"   ⚠️ Échec estimation: {project['nom']}")
+            stats.add("failed")
+            run_log.emit("skip", id=project["id"], name=project["nom"], reason="not_estimated")
+            return None
+        print(f"   ✅ Estimation: {project['nom']} → {project['weeks']} semaines")
+        run_log.emit("estimate", id=project["id"], name=project["nom"], weeks=project["weeks"],
+                     initial=project.get("is_initial", False), reason=project.get("reason") or None)
+        return project
     
-    print(f"\n✅ Résultat: {updated} projets estimés, {failed} échecs")
+    def write_stage(project):
+        # Étape 5 : écriture dans Notion (aucune si le bail du shard est perdu)
+        if deadline.revoked():
+            skip(project, "lease_lost")
+            return None
+        started = time.perf_counter()
+        with metrics.phase("write"):
+            success = write_project_action(project, manifest)
+        run_log.emit("write", id=project["id"], name=project["nom"], action=project.get("action", "ESTIMATE"),
+                     weeks=project.get("weeks", project.get("value")), ok=success,
+                     seconds=round(time.perf_counter() - started, 3))
+        return project, success
     
-    # Log
-    try:
-        log_dir = Path(__file__).resolve().parent.parent / "logs"
-        log_dir.mkdir(exist_ok=True)
-        log_path = log_dir / f"projets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        
-        log_data = {
-            "timestamp": datetime.now().isoformat(),
-            "mode": "DEBUG" if DEBUG_MODE else "PRODUCTION",
-            "database_id": DB_PROJETS_IA,
-            "summary": {
-                "total": len(projects),
-                "updated": updated,
-                "failed": failed
-            }
-        }
-        
-        with open(log_path, "w", encoding="utf-8") as f:
-            json.dump(log_data, f, indent=2, ensure_ascii=False)
-        print(f"📝 Log sauvegardé: {log_path}")
-    except Exception as e:
-        print(f"⚠️ Log non sauvegardé: {e}")
-
-
-def main():
+    def collect(result):
+        project, success = result
+        stats.add("updated" if success else "failed")
+    
+    pipeline = Pipeline([
+        Stage("fetch", fetch_stage, env_number("PIPELINE_FETCH_WORKERS", 4)),
+        Stage("estimate", estimate_stage, env_number("PIPELINE_LLM_WORKERS", 2)),
+        Stage("write", write_stage, env_number("PIPELINE_WRITE_WORKERS", 2)),
+    ], queue_size=env_number("PIPELINE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+    pipeline.run(all_projects, on_result=collect)
+    profiling.mark("pipeline")
+    
+    updated = stats.get("updated")
+    # Un projet dont une étape a levé une exception n'est pas écrit : échec
+    failed = stats.get("failed") + sum(stage.errors for stage in pipeline.stages)
+    postponed = stats.get("postponed") + stats.get("unchecked")
+    if postponed:
+        print(f"\n⏰ Échéance ou budget atteint: {postponed} projets reportés au prochain passage")
+    print(f"\n📊 Déjà à jour: {stats.get('already')} (dont {stats.get('fast')} par vérification rapide)")
+    print(f"✅ Résultat: {updated} projets estimés, {failed} échecs, {postponed} reportés")
+    print(f"   ⏱️ Pipeline: {pipeline.elapsed:.1f}s")
+    pipeline_stats = pipeline.stats()
+    for name, stage in pipeline_stats["stages"].items():
+        print(f"      {name:<9} {stage['workers']} workers, {stage['processed']} traités, "
+              f"{stage['dropped']} écartés, {stage['errors']} erreurs, {stage['busy_seconds']:.1f}s occupés")
+    run_log.emit("pipeline", **pipeline_stats)
+    manifest.save()
+    task_store.save()
+    summary.update(projects=len(all_projects), updated=updated, failed=failed, postponed=postponed)
+    return summary
+
+
+def main(argv=None):
     """Fonction principale"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Martine IA - estimation des projets")
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    # Forcer l'encodage UTF-8 pour Windows
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    
+    load_env(required=True)
     print("=" * 60)
     print("🧠 MARTINE IA - Estimation des Projets (Senior PM)")
     print("   Base: Projets IA")
     print("   Mode: Durée en semaines (0.5 à 12)")
     print("   Moteur: Gemini")
-    if DEBUG_MODE:
+    if get_config().debug_mode:
         print("   ⚠️  MODE DEBUG ACTIVÉ (pas d'écriture)")
     print("=" * 60)
     
     try:
-        run_estimations()
+        with profiling.session("projets", args.profile, args.profile_sample):
+            run_estimations()
         
         print("\n" + "=" * 60)
         print("✅ TRAITEMENT TERMINÉ")
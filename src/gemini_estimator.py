@@ -4,12 +4,17 @@ import re
 import time
 from typing import Dict, List, Optional
 
+import metrics
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
 
 class GeminiEstimator:
-    def __init__(self, api_key: str, model: str = "gemini-2.0-flash-exp"):
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash-exp", api_base: str = DEFAULT_API_BASE):
         self.api_key = api_key
         self.model = model
-        self.base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+        self.api_base = api_base.rstrip("/")
+        self.base_url = f"{self.api_base}/models/{model}:generateContent"
 
     def _call_api(self, payload: Dict) -> Optional[Dict]:
         """Appelle l'API avec retry automatique sur 429"""
@@ -18,19 +23,30 @@ class GeminiEstimator:
         
         for attempt in range(max_retries):
             try:
-                response = requests.post(
-                    f"{self.base_url}?key={self.api_key}",
-                    headers={"Content-Type": "application/json"},
-                    json=payload,
-                    timeout=30
-                )
+                with metrics.request("gemini", "generateContent") as call:
+                    response = requests.post(
+                        f"{self.base_url}?key={self.api_key}",
+                        headers={"Content-Type": "application/json"},
+                        json=payload,
+                        timeout=30
+                    )
+                    call.status = response.status_code
                 
                 if response.status_code == 200:
-                    return response.json()
+                    result = response.json()
+                    usage = result.get("usageMetadata") or {}
+                    metrics.record_tokens("gemini", usage.get("promptTokenCount") or 0,
+                                          usage.get("candidatesTokenCount") or 0)
+                    return result
                 
                 if response.status_code == 429:
-                    print(f"    ⚠️ Rate Limit (429). Pause {wait_time}s...")
-                    time.sleep(wait_time)
+                    # Pause imposée par le serveur si fournie, sinon backoff exponentiel
+                    try:
+                        pause = float(response.headers.get("Retry-After", ""))
+                    except ValueError:
+                        pause = wait_time
+                    print(f"    ⚠️ Rate Limit (429). Pause {pause}s...")
+                    time.sleep(pause)
                     wait_time *= 2  # Exponential backoff
                     continue
                 
@@ -202,15 +218,23 @@ DURÉE ESTIMÉE EN SEMAINES:"""
         self,
         tasks_to_estimate: List[Dict],
         all_tasks_history: List[Dict],
-        project_name: str = "Projet EISF"
+        project_name: str = "Projet EISF",
+        deadline=None,
+        on_estimate=None
     ) -> Dict[str, float]:
         """
         Estime plusieurs tâches en batch
+        deadline: objet exposant expired() (arrêt propre à l'échéance)
+        on_estimate: appelé avec (tâche, minutes) dès chaque estimation obtenue
         Returns: Dict[task_id -> estimated_minutes]
         """
         estimates = {}
         
         for i, task in enumerate(tasks_to_estimate, 1):
+            if deadline is not None and deadline.expired():
+                print(f"⏰ Échéance atteinte: {len(tasks_to_estimate) - i + 1} tâches reportées au prochain passage")
+                break
+            
             task_id = task.get("id")
             task_name = task.get("nom", "Tâche sans nom")
             task_desc = task.get("description", "")
@@ -234,6 +258,8 @@ DURÉE ESTIMÉE EN SEMAINES:"""
             if estimated_time:
                 estimates[task_id] = estimated_time
                 print(f"  ✅ {estimated_time} min estimées")
+                if on_estimate is not None:
+                    on_estimate(task, estimated_time)
             else:
                 print(f"  ⚠️ Échec estimation")
         
@@ -7,24 +7,44 @@ import json
 import re
 from typing import Dict, List, Optional
 
+import metrics
+
+DEFAULT_API_BASE = "https://api.openai.com/v1"
+CHAT_ENDPOINT = "/v1/chat/completions"
+
+
 class GPTEstimator:
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
+    def __init__(self, api_key: str, model: str = "gpt-4o", api_base: str = DEFAULT_API_BASE):
         self.api_key = api_key
         self.model = model
-        self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.api_base = api_base.rstrip("/")
+        self.base_url = f"{self.api_base}/chat/completions"
     
-    def estimate_task_time(
-        self, 
+    def _auth_headers(self) -> Dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+    
+    def _http(self, method: str, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """Requête vers l'API (durée et code HTTP mesurés par route)"""
+        with metrics.request("gpt", endpoint) as call:
+            response = requests.request(method, url, **kwargs)
+            call.status = response.status_code
+        return response
+    
+    @staticmethod
+    def _record_usage(result: Dict):
+        """Tokens d'une réponse chat-completions (champ usage, s'il est fourni)"""
+        usage = result.get("usage") or {}
+        metrics.record_tokens("gpt", usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0)
+    
+    def task_request(
+        self,
         task_name: str,
         task_description: str,
         project_context: str,
         historical_tasks: List[Dict],
         task_content: str = ""
-    ) -> Optional[float]:
-        """
-        Estime le temps nécessaire pour une tâche
-        Returns: temps en minutes (float) ou None si erreur
-        """
+    ) -> Dict:
+        """Corps de la requête chat-completions d'une estimation de tâche"""
         
         # Construire le contexte historique
         history_str = self._format_history(historical_tasks)
@@ -53,22 +73,46 @@ INSTRUCTIONS:
 
 ESTIMATION EN MINUTES (entier uniquement) :"""
 
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 50
+        }
+    
+    @staticmethod
+    def parse_minutes(result: Dict) -> Optional[float]:
+        """Minutes d'une réponse chat-completions (None si non parsable)"""
+        text = result["choices"][0]["message"]["content"].strip()
+        
+        # Extraire le nombre
+        match = re.search(r'\d+', text)
+        if match:
+            return float(match.group())
+        print(f"⚠️ Réponse GPT non parsable: {text}")
+        return None
+    
+    def estimate_task_time(
+        self, 
+        task_name: str,
+        task_description: str,
+        project_context: str,
+        historical_tasks: List[Dict],
+        task_content: str = ""
+    ) -> Optional[float]:
+        """
+        Estime le temps nécessaire pour une tâche
+        Returns: temps en minutes (float) ou None si erreur
+        """
+        body = self.task_request(task_name, task_description, project_context, historical_tasks, task_content)
         try:
-            response = requests.post(
-                self.base_url,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 50
-                },
+            response = self._http(
+                "POST", "chat.completions", self.base_url,
+                headers=dict(self._auth_headers(), **{"Content-Type": "application/json"}),
+                json=body,
                 timeout=30
             )
             
@@ -77,16 +121,8 @@ ESTIMATION EN MINUTES (entier uniquement) :"""
                 return None
             
             result = response.json()
-            text = result["choices"][0]["message"]["content"].strip()
-            
-            # Extraire le nombre
-            match = re.search(r'\d+', text)
-            if match:
-                minutes = float(match.group())
-                return minutes
-            else:
-                print(f"⚠️ Réponse GPT non parsable: {text}")
-                return None
+            self._record_usage(result)
+            return self.parse_minutes(result)
                 
         except Exception as e:
             print(f"❌ Erreur estimation: {e}")
@@ -177,8 +213,8 @@ INSTRUCTIONS CRITIQUES:
 DURÉE ESTIMÉE EN SEMAINES (Optimiste = Interdit) :"""
 
         try:
-            response = requests.post(
-                self.base_url,
+            response = self._http(
+                "POST", "chat.completions", self.base_url,
                 headers={
                     "Content-Type": "application/json",
                     "Authorization": f"Bearer {self.api_key}"
@@ -200,6 +236,7 @@ DURÉE ESTIMÉE EN SEMAINES (Optimiste = Interdit) :"""
                 return None
 
             result = response.json()
+            self._record_usage(result)
             text = result["choices"][0]["message"]["content"].strip()
 
             # Extraire le nombre (peut être décimal)
@@ -222,15 +259,23 @@ DURÉE ESTIMÉE EN SEMAINES (Optimiste = Interdit) :"""
         self,
         tasks_to_estimate: List[Dict],
         all_tasks_history: List[Dict],
-        project_name: str = "Projet EISF"
+        project_name: str = "Projet EISF",
+        deadline=None,
+        on_estimate=None
     ) -> Dict[str, float]:
         """
         Estime plusieurs tâches en batch
+        deadline: objet exposant expired() (arrêt propre à l'échéance)
+        on_estimate: appelé avec (tâche, minutes) dès chaque estimation obtenue
         Returns: Dict[task_id -> estimated_minutes]
         """
         estimates = {}
         
         for i, task in enumerate(tasks_to_estimate, 1):
+            if deadline is not None and deadline.expired():
+                print(f"⏰ Échéance atteinte: {len(tasks_to_estimate) - i + 1} tâches reportées au prochain passage")
+                break
+            
             task_id = task.get("id")
             task_name = task.get("nom", "Tâche sans nom")
             task_desc = task.get("description", "")
@@ -238,11 +283,7 @@ DURÉE ESTIMÉE EN SEMAINES (Optimiste = Interdit) :"""
             
             print(f"🤖 Estimation {i}/{len(tasks_to_estimate)}: {task_name}")
             
-            # Filtrer l'historique (tâches similaires du même projet)
-            similar_tasks = [
-                t for t in all_tasks_history
-                if t.get("projet") == task.get("projet") and t.get("temps_reel", 0) > 0
-            ]
+            similar_tasks = self._similar_tasks(task, all_tasks_history)
             
             estimated_time = self.estimate_task_time(
                 task_name=task_name,
@@ -255,7 +296,111 @@ DURÉE ESTIMÉE EN SEMAINES (Optimiste = Interdit) :"""
             if estimated_time:
                 estimates[task_id] = estimated_time
                 print(f"  ✅ {estimated_time} min estimées")
+                if on_estimate is not None:
+                    on_estimate(task, estimated_time)
             else:
                 print(f"  ⚠️ Échec estimation")
         
         return estimates
+    
+    @staticmethod
+    def _similar_tasks(task: Dict, all_tasks_history: List[Dict]) -> List[Dict]:
+        """Filtre l'historique (tâches similaires du même projet)"""
+        return [
+            t for t in all_tasks_history
+            if t.get("projet") == task.get("projet") and t.get("temps_reel", 0) > 0
+        ]
+    
+    # --- Mode batch (API Batch OpenAI : asynchrone, tarif réduit) ---------------
+    
+    def batch_request_lines(self, tasks: List[Dict], all_tasks_history: List[Dict],
+                            project_name: str = "Projet EISF") -> List[Dict]:
+        """Lignes du fichier JSONL d'un job batch (custom_id = id de la tâche)"""
+        return [
+            {
+                "custom_id": task.get("id"),
+                "method": "POST",
+                "url": CHAT_ENDPOINT,
+                "body": self.task_request(
+                    task_name=task.get("nom", "Tâche sans nom"),
+                    task_description=task.get("description", ""),
+                    project_context=f"Projet: {project_name}",
+                    historical_tasks=self._similar_tasks(task, all_tasks_history),
+                    task_content=task.get("content", "")
+                )
+            }
+            for task in tasks
+        ]
+    
+    def submit_batch(self, jsonl: bytes) -> Optional[str]:
+        """Envoie le fichier JSONL puis crée le job. Returns: id du batch, ou None si erreur"""
+        try:
+            upload = self._http(
+                "POST", "files.create", f"{self.api_base}/files",
+                headers=self._auth_headers(),
+                files={"file": ("martine_batch.jsonl", jsonl, "application/jsonl")},
+                data={"purpose": "batch"},
+                timeout=120
+            )
+            if upload.status_code != 200:
+                print(f"❌ Erreur envoi du fichier batch ({upload.status_code}): {upload.text}")
+                return None
+            response = self._http(
+                "POST", "batches.create", f"{self.api_base}/batches",
+                headers=self._auth_headers(),
+                json={
+                    "input_file_id": upload.json()["id"],
+                    "endpoint": CHAT_ENDPOINT,
+                    "completion_window": "24h"
+                },
+                timeout=30
+            )
+            if response.status_code != 200:
+                print(f"❌ Erreur création du batch ({response.status_code}): {response.text}")
+                return None
+            return response.json()["id"]
+        except Exception as e:
+            print(f"❌ Erreur soumission batch: {e}")
+            return None
+    
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """État d'un job batch (status, output_file_id...), None si erreur"""
+        try:
+            response = self._http("GET", "batches.retrieve", f"{self.api_base}/batches/{batch_id}", headers=self._auth_headers(), timeout=30)
+            if response.status_code != 200:
+                print(f"❌ Erreur lecture du batch {batch_id} ({response.status_code}): {response.text}")
+                return None
+            return response.json()
+        except Exception as e:
+            print(f"❌ Erreur lecture du batch {batch_id}: {e}")
+            return None
+    
+    def batch_results(self, batch: Dict) -> Dict[str, float]:
+        """Estimations d'un job terminé : {custom_id: minutes} (lignes en erreur ignorées)"""
+        results = {}
+        file_id = batch.get("output_file_id")
+        if not file_id:
+            return results
+        try:
+            response = self._http("GET", "files.content", f"{self.api_base}/files/{file_id}/content", headers=self._auth_headers(), timeout=120)
+            if response.status_code != 200:
+                print(f"❌ Erreur lecture des résultats ({response.status_code}): {response.text}")
+                return results
+            lines = response.text.splitlines()
+        except Exception as e:
+            print(f"❌ Erreur lecture des résultats: {e}")
+            return results
+        
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                answer = entry.get("response") or {}
+                if answer.get("status_code") != 200:
+                    continue
+                self._record_usage(answer["body"])
+                minutes = self.parse_minutes(answer["body"])
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+            if minutes:
+                results[entry["custom_id"]] = minutes
+        return results
@@ -0,0 +1,123 @@
+"""
+Journal de reprise pour Martine IA
+Fichier JSONL en ajout seul (cache/journal_<nom>.jsonl) : chaque estimation est
+consignée dès le retour de l'IA, chaque écriture Notion réussie ensuite.
+Après un arrêt (plantage, Ctrl+C), les estimations déjà payées sont réutilisées
+pour les mêmes données sources (même hash) et les écritures manquantes rejouées
+"""
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import manifest
+
+
+class RunJournal:
+    """Journal {page_id, hash} -> estimation, avec suivi des écritures"""
+
+    def __init__(self, path: Path, database_id: str):
+        self.path = Path(path)
+        self.database_id = database_id
+        self.estimates: Dict[str, Dict] = {}  # page_id -> {"hash", "minutes", "written"}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, name: str, database_id: str) -> "RunJournal":
+        """Relit cache/journal_<name>.jsonl (lignes d'une autre database ou illisibles ignorées)"""
+        journal = cls(manifest.CACHE_DIR / f"journal_{name}.jsonl", database_id)
+        if not journal.path.exists():
+            return journal
+        try:
+            with open(journal.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # ligne tronquée par un arrêt brutal
+                    if entry.get("db") == database_id:
+                        journal._apply(entry)
+        except Exception as e:
+            print(f"⚠️ Journal illisible, ignoré: {e}")
+        return journal
+
+    def _apply(self, entry: Dict):
+        page_id = entry.get("id")
+        if entry.get("event") == "estimate":
+            self.estimates[page_id] = {"hash": entry.get("hash"), "minutes": entry.get("minutes"), "written": False}
+        elif entry.get("event") == "write":
+            known = self.estimates.get(page_id)
+            if known and known["hash"] == entry.get("hash"):
+                known["written"] = True
+
+    def _append(self, entry: Dict):
+        """Ajoute une ligne et la force sur disque (survit à un arrêt brutal)"""
+        entry["db"] = self.database_id
+        entry["at"] = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            self._apply(entry)
+            try:
+                self.path.parent.mkdir(exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                print(f"⚠️ Journal non écrit (non critique): {e}")
+
+    def record_estimate(self, page_id: str, source_hash: Optional[str], minutes: float):
+        """Consigne une estimation dès son retour de l'IA"""
+        self._append({"event": "estimate", "id": page_id, "hash": source_hash, "minutes": minutes})
+
+    def record_write(self, page_id: str, source_hash: Optional[str]):
+        """Consigne l'écriture Notion d'une estimation"""
+        self._append({"event": "write", "id": page_id, "hash": source_hash})
+
+    def estimated(self, page_id: str, source_hash: Optional[str]) -> Optional[float]:
+        """Estimation déjà payée pour ces données sources (même hash), sinon None"""
+        known = self.estimates.get(page_id)
+        if known and source_hash and known["hash"] == source_hash:
+            return known["minutes"]
+        return None
+
+    def pending(self) -> Dict[str, Dict]:
+        """Estimations pas encore écrites dans Notion {page_id: {"hash", "minutes"}}"""
+        return {
+            page_id: {"hash": known["hash"], "minutes": known["minutes"]}
+            for page_id, known in self.estimates.items()
+            if not known["written"]
+        }
+
+    def retain(self, current_hashes: Dict[str, str]):
+        """
+        Oublie les estimations devenues inutiles : page absente des candidats du run
+        ou données sources modifiées depuis (hash différent)
+        """
+        with self.lock:
+            self.estimates = {
+                page_id: known for page_id, known in self.estimates.items()
+                if current_hashes.get(page_id) == known["hash"]
+            }
+
+    def compact(self):
+        """Réécrit le journal avec les seules estimations en attente (supprimé si aucune)"""
+        pending = self.pending()
+        with self.lock:
+            try:
+                if not pending:
+                    if self.path.exists():
+                        self.path.unlink()
+                    self.estimates = {}
+                    return
+                tmp_path = self.path.with_suffix(".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for page_id, known in pending.items():
+                        entry = {"event": "estimate", "id": page_id, "hash": known["hash"],
+                                 "minutes": known["minutes"], "db": self.database_id}
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.path)
+                self.estimates = {page_id: dict(known, written=False) for page_id, known in pending.items()}
+            except Exception as e:
+                print(f"⚠️ Journal non compacté (non critique): {e}")
@@ -0,0 +1,272 @@
+"""
+Exécution répartie de Martine IA (plusieurs processus ou machines)
+Les pages sont réparties en N shards par hash de leur id ; chaque worker réserve
+un shard par un bail (lease) dans un fichier SQLite partagé, le renouvelle tant
+qu'il travaille, puis y dépose le résumé de son run. Un bail expiré (worker
+arrêté) est repris par un autre worker : aucune page n'est traitée deux fois.
+Un shard en erreur est rendu avec un délai (SHARD_RETRY_SECONDS) et marqué en
+échec après SHARD_MAX_ATTEMPTS tentatives, sans bloquer les autres shards.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import manifest
+from config import env_number
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_RETRY_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def shard_of(page_id: str, count: int) -> int:
+    """Shard d'une page (stable, indépendant du format de l'id)"""
+    digest = hashlib.sha256(page_id.replace("-", "").encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % count
+
+
+class Shard:
+    """Part `index` sur `count` des pages d'une base"""
+
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+
+    def contains(self, page_id: str) -> bool:
+        return shard_of(page_id, self.count) == self.index
+
+    @property
+    def suffix(self) -> str:
+        """Suffixe des fichiers locaux (manifestes, journal) propres au shard"""
+        return f".shard{self.index}of{self.count}"
+
+    def __str__(self) -> str:
+        return f"{self.index + 1}/{self.count}"
+
+
+def worker_id() -> str:
+    """Identifiant du worker courant (machine:pid)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseStore:
+    """Baux et résumés des shards d'un run, dans un fichier SQLite partagé"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    run_id TEXT NOT NULL,
+                    shard INTEGER NOT NULL,
+                    owner TEXT,
+                    expires_at REAL NOT NULL DEFAULT 0,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    summary TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (run_id, shard)
+                )
+            """)
+            # Base créée par une version sans compteur de tentatives
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(leases)")}
+            for column in ("attempts", "failed"):
+                if column not in columns:
+                    db.execute(f"ALTER TABLE leases ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    @classmethod
+    def from_env(cls) -> "LeaseStore":
+        """Fichier SHARD_DB (défaut: cache/leases.sqlite)"""
+        return cls(os.getenv("SHARD_DB") or manifest.CACHE_DIR / "leases.sqlite")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def claim(self, run_id: str, owner: str, count: int, ttl: float, exclude=()) -> Optional[int]:
+        """
+        Réserve un shard libre (ou dont le bail a expiré), hors shards terminés, en échec
+        ou exclus (déjà rendus par ce worker). Returns: index, ou None si tout est pris/fini
+        """
+        now = time.time()
+        exclude = sorted(exclude)
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR IGNORE INTO leases (run_id, shard) VALUES (?, ?)",
+                [(run_id, index) for index in range(count)]
+            )
+            row = db.execute(
+                "SELECT shard FROM leases WHERE run_id = ? AND shard < ? AND done = 0 AND failed = 0 "
+                f"AND expires_at < ? AND shard NOT IN ({', '.join('?' * len(exclude))}) "
+                "ORDER BY shard LIMIT 1",
+                (run_id, count, now, *exclude)
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE leases SET owner = ?, expires_at = ? WHERE run_id = ? AND shard = ?",
+                (owner, now + ttl, run_id, row["shard"])
+            )
+            db.execute("COMMIT")
+            return row["shard"]
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def renew(self, run_id: str, shard: int, owner: str, ttl: float) -> bool:
+        """Prolonge un bail ; False si le bail a été perdu (expiré et repris)"""
+        with closing(self._connect()) as db:
+            cursor = db.execute(
+                "UPDATE leases SET expires_at = ? WHERE run_id = ? AND shard = ? AND owner = ? AND done = 0",
+                (time.time() + ttl, run_id, shard, owner)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, run_id: str, shard: int, owner: str, summary: Dict) -> bool:
+        """Marque un shard terminé avec son résumé ; False si le bail avait été perdu"""
+        with closing(self._connect()) as db:
+            cursor = db.execute(
+                "UPDATE leases SET done = 1, summary = ? WHERE run_id = ? AND shard = ? AND owner = ? AND done = 0",
+                (json.dumps(summary, ensure_ascii=False), run_id, shard, owner)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, run_id: str, shard: int, owner: str):
+        """Libère un bail sans terminer le shard (travail reporté : un autre worker le reprendra)"""
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE leases SET expires_at = 0 WHERE run_id = ? AND shard = ? AND owner = ? AND done = 0",
+                (run_id, shard, owner)
+            )
+
+    def fail(self, run_id: str, shard: int, owner: str, error: str, max_attempts: int, retry_after: float) -> bool:
+        """
+        Libère un bail après une erreur : le shard redevient disponible après retry_after
+        secondes, ou est marqué en échec (erreur dans le résumé) à la max_attempts-ième.
+        Returns: True si le shard est définitivement en échec
+        """
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE leases SET attempts = attempts + 1, expires_at = ? "
+                "WHERE run_id = ? AND shard = ? AND owner = ? AND done = 0",
+                (time.time() + retry_after, run_id, shard, owner)
+            )
+            cursor = db.execute(
+                "UPDATE leases SET failed = 1, summary = ? "
+                "WHERE run_id = ? AND shard = ? AND owner = ? AND done = 0 AND attempts >= ?",
+                (json.dumps({"error": error}, ensure_ascii=False), run_id, shard, owner, max_attempts)
+            )
+            db.execute("COMMIT")
+            return cursor.rowcount == 1
+
+    def status(self, run_id: str) -> List[Dict]:
+        """État des shards d'un run"""
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT shard, owner, expires_at, done, summary, attempts, failed FROM leases "
+                "WHERE run_id = ? ORDER BY shard",
+                (run_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def merged_summary(self, run_id: str) -> Dict:
+        """
+        Résumé consolidé d'un run (coordinateur) : compteurs des shards terminés
+        additionnés par moteur, avancement des shards et erreurs des shards en échec
+        """
+        rows = self.status(run_id)
+        now = time.time()
+        merged: Dict = {
+            "run_id": run_id,
+            "shards": len(rows),
+            "done": sum(1 for row in rows if row["done"]),
+            "leased": sum(1 for row in rows if not row["done"] and not row["failed"] and row["expires_at"] >= now),
+            "failed": {row["shard"]: json.loads(row["summary"] or "{}").get("error") for row in rows if row["failed"]},
+            "engines": {}
+        }
+        for row in rows:
+            if not row["done"] or not row["summary"]:
+                continue
+            for engine, counters in json.loads(row["summary"]).items():
+                totals = merged["engines"].setdefault(engine, {})
+                for key, value in (counters or {}).items():
+                    if isinstance(value, (int, float)):
+                        totals[key] = totals.get(key, 0) + value
+        return merged
+
+
+class LeaseHeartbeat:
+    """Renouvelle un bail en arrière-plan ; `lost` passe à True si le bail est perdu"""
+
+    def __init__(self, store: LeaseStore, run_id: str, shard: int, owner: str, ttl: float):
+        self.store = store
+        self.run_id = run_id
+        self.shard = shard
+        self.owner = owner
+        self.ttl = ttl
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.ttl / 3):
+            try:
+                if not self.store.renew(self.run_id, self.shard, self.owner, self.ttl):
+                    print(f"⚠️ Bail du shard {self.shard + 1} perdu : arrêt des estimations du shard")
+                    self.lost = True
+                    return
+            except Exception as e:
+                print(f"⚠️ Renouvellement du bail impossible: {e}")
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class LeaseDeadline:
+    """Échéance du run, avancée si le bail du shard est perdu (même interface que Deadline)"""
+
+    def __init__(self, deadline, heartbeat: LeaseHeartbeat):
+        self.deadline = deadline
+        self.heartbeat = heartbeat
+
+    def remaining(self) -> Optional[float]:
+        if self.heartbeat.lost:
+            return 0.0
+        return self.deadline.remaining() if self.deadline is not None else None
+
+    def expired(self) -> bool:
+        return self.heartbeat.lost or (self.deadline is not None and self.deadline.expired())
+
+    def revoked(self) -> bool:
+        """Bail perdu : le shard est repris par un autre worker, qui fera les écritures"""
+        return self.heartbeat.lost
+
+
+def lease_seconds_from_env() -> float:
+    """Durée d'un bail depuis SHARD_LEASE_SECONDS (.env)"""
+    return env_number("SHARD_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)
+
+
+def retry_policy_from_env() -> tuple:
+    """(tentatives max, délai avant nouvelle tentative) depuis SHARD_MAX_ATTEMPTS et SHARD_RETRY_SECONDS"""
+    return (int(env_number("SHARD_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+            env_number("SHARD_RETRY_SECONDS", DEFAULT_RETRY_SECONDS))
@@ -2,69 +2,29 @@
 MARTINE IA - Script Principal (Estimation Tâches)
 Lit Notion (base "Tâches IA"), estime via GPT ou Gemini, met à jour les temps en heures
 UNIQUEMENT pour les sous-tâches (feuilles) sans estimation existante
+ou dont les données sources ont changé (hash source)
 """
 import os
 import sys
-import json
-from datetime import datetime
-from pathlib import Path
-
-# Forcer l'encodage UTF-8 pour Windows (pour les émojis)
-if sys.platform == 'win32':
-    sys.stdout.reconfigure(encoding='utf-8')
-
-
-def find_env_file():
-    """Cherche le fichier .env en remontant l'arborescence"""
-    current = Path(__file__).resolve().parent
-    for _ in range(5):
-        env_path = current / ".env"
-        if env_path.exists():
-            return env_path
-        current = current.parent
-    return None
-
-
-# Chargement robuste du .env
-env_path = find_env_file()
-if env_path:
-    from dotenv import load_dotenv
-    load_dotenv(env_path, override=True)
-else:
-    raise FileNotFoundError("❌ Fichier .env introuvable!")
+import time
 
 # Ajouter le dossier courant au path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from config import MartineConfig, create_estimator, create_notion_limiter, load_env
 from notion_client import NotionClient
-
-# Configuration depuis variables d'environnement (.env)
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-
-# Choix du moteur d'estimation: "gemini" ou "gpt" (défaut: gemini)
-ESTIMATOR_ENGINE = os.getenv("ESTIMATOR_ENGINE", "gemini").lower()
-
-# Mode DEBUG (ne modifie pas Notion, affiche seulement)
-DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
-
-# Configuration du moteur
-if ESTIMATOR_ENGINE == "gemini":
-    from gemini_estimator import GeminiEstimator
-    GEMINI_KEY = os.getenv("GEMINI_API_KEY")
-    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
-    if not GEMINI_KEY:
-        raise ValueError("❌ GEMINI_API_KEY manquant dans .env")
-    estimator = GeminiEstimator(GEMINI_KEY, GEMINI_MODEL)
-else:
-    from gpt_estimator import GPTEstimator
-    GPT_KEY = os.getenv("GPT_API_KEY")
-    GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4o")
-    if not GPT_KEY:
-        raise ValueError("❌ GPT_API_KEY manquant dans .env")
-    estimator = GPTEstimator(GPT_KEY, GPT_MODEL)
-
-# Database ID de la base "Tâches IA"
-DB_TACHES_IA = os.getenv("DATABASE_TACHES_IA", os.getenv("DATABASE_TACHES"))
+from manifest import Manifest
+from journal import RunJournal
+from batch_jobs import BatchJobStore, collect_jobs, submit_job
+from leases import Shard
+from source_hash import HASH_VERSION, hash_text, canonical_properties, task_root_hash, format_hash, parse_hash
+from task_graph import TaskGraph
+from write_queue import WriteQueue
+from dedup import group_tasks, fan_out, groups_log, near_threshold_from_env
+from run_log import RunLog, NullRunLog
+from scheduler import Deadline, schedule_work, max_items_from_env, read_choice
+import metrics
+import profiling
 
 # Noms des propriétés Notion (EXACTS)
 PROP_NOM = "Nom"  # Title
@@ -72,22 +32,72 @@ PROP_SOUS_ELEMENT = "Sous-élément"  # Relation pour détecter les parents
 PROP_ESTIMATION_ENFANT = "🤖⏱️Temps est IA (h) ENFANT"  # Number - cible à écrire
 PROP_DESCRIPTION = "Description"  # Rich text (si disponible)
 PROP_TYPE = "Type"  # Select ou Multi-select
+PROP_PRIORITE = "Priorité"  # Select (ordonnancement)
+PROP_STATUT = "Statut"  # Select/Status (ordonnancement)
+PROP_PROJET = "Projet/Tlt"  # Relation (filtre de l'historique)
+PROP_HASH = "🤖⏱️Hash Source IA"  # Rich text - détection de changements
+PROP_ESTIMATION_TOTAL = "🤖⏱️Temps est IA (h) TOTAL"  # Number - total calculé des parents
 
-# Vérifications
-if not NOTION_TOKEN:
-    raise ValueError("❌ NOTION_TOKEN manquant dans le fichier .env")
-if not DB_TACHES_IA:
-    raise ValueError("❌ DATABASE_TACHES_IA manquant dans le fichier .env")
+# Propriétés qui alimentent le prompt : les seules prises en compte dans le hash
+HASHED_TASK_PROPS = [PROP_NOM, PROP_DESCRIPTION, PROP_TYPE, PROP_PROJET]
 
-# Initialiser client Notion
-notion = NotionClient(NOTION_TOKEN)
+# Configuration, client Notion et estimateur : construits au premier usage
+# (l'import du module n'a aucun effet de bord)
+_config = None
+_notion = None
+_estimator = None
 
 
-def is_leaf_task(page: dict) -> bool:
+def configure(config: MartineConfig = None, notion: NotionClient = None, estimator=None):
+    """
+    Injecte la configuration et/ou les dépendances du moteur (usage bibliothèque).
+    Changer la configuration oublie le client et l'estimateur construits avec l'ancienne.
+    """
+    global _config, _notion, _estimator
+    if config is not None:
+        _config = config
+        _notion = None
+        _estimator = None
+    if notion is not None:
+        _notion = notion
+    if estimator is not None:
+        _estimator = estimator
+
+
+def get_config() -> MartineConfig:
+    """Configuration du moteur (lue depuis le .env au premier appel)"""
+    global _config
+    if _config is None:
+        _config = MartineConfig.from_env()
+    return _config
+
+
+def get_notion() -> NotionClient:
+    """Client Notion (créé au premier appel)"""
+    global _notion
+    if _notion is None:
+        config = get_config()
+        config.require(notion_token="NOTION_TOKEN", db_taches="DATABASE_TACHES_IA")
+        _notion = NotionClient(config.notion_token, create_notion_limiter(config), config.notion_base_url)
+    return _notion
+
+
+def get_estimator():
+    """Estimateur du moteur ESTIMATOR_ENGINE (fournisseur importé au premier appel)"""
+    global _estimator
+    if _estimator is None:
+        _estimator = create_estimator(get_config())
+    return _estimator
+
+
+def is_leaf_task(page: dict, graph: TaskGraph = None) -> bool:
     """
     Vérifie si une page est une feuille (sous-tâche sans enfants).
     Une feuille a la propriété 'Sous-élément' vide (relation vide).
+    Avec le graphe des tâches, la réponse tient aussi compte des relations inverses.
     """
+    if graph is not None and page.get("id") in graph:
+        return graph.is_leaf(page.get("id"))
     try:
         props = page.get("properties", {})
         sous_element_prop = props.get(PROP_SOUS_ELEMENT, {})
@@ -110,7 +120,7 @@ def get_estimation_value(page: dict) -> float:
     Retourne 0.0 si vide ou non défini.
     """
     try:
-        value = notion.get_property_value(page, PROP_ESTIMATION_ENFANT)
+        value = get_notion().get_property_value(page, PROP_ESTIMATION_ENFANT)
         if value is None:
             return 0.0
         return float(value)
@@ -118,18 +128,45 @@ def get_estimation_value(page: dict) -> float:
         return 0.0
 
 
-def query_notion_tasks_to_estimate() -> list:
+def _task_properties_v3(page: dict) -> str:
+    """v3 : propriétés HASHED_TASK_PROPS canoniques (premier hash des tâches)"""
+    return hash_text(canonical_properties(page, set(), set(HASHED_TASK_PROPS)))
+
+
+# Spécifications connues du sous-hash des propriétés d'une tâche, par version
+# (HASH_VERSION est partagé avec les projets : une nouvelle version s'ajoute aussi ici)
+TASK_PROPERTIES_SPECS = {
+    "v3": _task_properties_v3,
+}
+
+
+def calculate_task_hash(page: dict, content: str, version: str = HASH_VERSION) -> tuple:
     """
-    Récupère les tâches à estimer depuis la base Notion "Tâches IA".
-    Filtre : 
-      - Sous-élément est vide (feuilles uniquement)
-      - Estimation enfant est vide ou = 0
-    
-    Le filtre Notion sur relation.is_empty est utilisé, 
-    puis filtrage Python pour l'estimation.
+    Calcule le hash source d'une tâche feuille (valeur stockée dans Notion).
+    Seules les données qui alimentent le prompt comptent : contenu + propriétés HASHED_TASK_PROPS.
+    version: spécification à appliquer (une version antérieure sert à vérifier un hash stocké)
+    Returns: (hash, sous-hashs)
     """
-    print("\n🔍 Recherche des tâches à estimer...")
-    
+    components = {
+        "content": hash_text(content),
+        "properties": TASK_PROPERTIES_SPECS[version](page)
+    }
+    return format_hash(task_root_hash(components), version), components
+
+
+def fetch_task_content(page_id: str, nom: str) -> str:
+    """Lit le contenu détaillé d'une page tâche"""
+    print(f"   📄 Lecture du contenu pour : {nom}")
+    try:
+        with metrics.phase("content"):
+            return get_notion().get_page_content(page_id)
+    except Exception as e:
+        print(f"   ⚠️ Impossible de lire le contenu: {e}")
+        return ""
+
+
+def query_leaf_pages() -> list:
+    """Récupère les pages feuilles de la base (utilisé sans graphe des tâches)"""
     # Filtre Notion : Sous-élément est vide (relation.is_empty)
     # NOTE: Si le filtre ne fonctionne pas parfaitement, on fait un filtrage Python ensuite
     filter_obj = {
@@ -139,36 +176,68 @@ def query_notion_tasks_to_estimate() -> list:
         }
     }
     
-    try:
-        all_pages = notion.query_database(DB_TACHES_IA, filter_obj)
-    except Exception as e:
-        print(f"⚠️ Erreur lors du filtrage Notion, récupération de toutes les pages: {e}")
-        all_pages = notion.query_database(DB_TACHES_IA)
+    with metrics.phase("query"):
+        try:
+            return get_notion().query_database(get_config().db_taches, filter_obj)
+        except Exception as e:
+            print(f"⚠️ Erreur lors du filtrage Notion, récupération de toutes les pages: {e}")
+            return get_notion().query_database(get_config().db_taches)
+
+
+def query_notion_tasks_to_estimate(manifest: Manifest = None, graph: TaskGraph = None, shard: Shard = None,
+                                   run_log: RunLog = None) -> list:
+    """
+    Récupère les tâches à estimer depuis la base Notion "Tâches IA".
+    Filtre : 
+      - Sous-élément est vide (feuilles uniquement)
+      - Estimation enfant est vide ou = 0, OU hash source différent (tâche modifiée)
+    
+    Le filtre Notion sur relation.is_empty est utilisé, 
+    puis filtrage Python pour l'estimation.
+    
+    Détection de changement en deux niveaux (comme pour les projets) :
+      1. Rapide : last_edited_time + hash comparés au manifeste local (sans lecture du contenu)
+      2. Complet : lecture du contenu et hash SHA-256
+    Les tâches estimées sans hash reçoivent leur hash sans ré-estimation (action HASH_ONLY).
+    
+    Avec le graphe des tâches (snapshot déjà chargé), aucune requête n'est faite.
+    Avec un shard, seules les feuilles de ce shard sont examinées.
+    Chaque tâche écartée est consignée dans le journal du run avec son motif.
+    """
+    print("\n🔍 Recherche des tâches à estimer...")
+    
+    if graph is not None:
+        all_pages = graph.leaves()
+    else:
+        all_pages = query_leaf_pages()
+    if shard is not None:
+        all_pages = [page for page in all_pages if shard.contains(page.get("id"))]
+    
+    if manifest is None:
+        manifest = Manifest.load("taches_sources", get_config().db_taches)
+    if run_log is None:
+        run_log = NullRunLog()
     
     to_estimate = []
     skipped_parents = 0
     skipped_already_estimated = 0
+    skipped_fast = 0
     skipped_wrong_type = 0
+    to_rehash = 0
     
     for page in all_pages:
         page_id = page.get("id")
-        nom = notion.get_property_value(page, PROP_NOM) or "Sans nom"
+        nom = get_notion().get_property_value(page, PROP_NOM) or "Sans nom"
         
         # Vérifier si c'est une feuille
-        if not is_leaf_task(page):
+        if not is_leaf_task(page, graph):
             print(f"   SKIP parent: {nom}")
+            run_log.emit("skip", id=page_id, name=nom, reason="parent")
             skipped_parents += 1
             continue
         
-        # Vérifier si déjà estimée
-        estimation = get_estimation_value(page)
-        if estimation > 0:
-            print(f"   SKIP already estimated: {nom} ({estimation}h)")
-            skipped_already_estimated += 1
-            continue
-        
         # Vérifier le type (doit être "Tâche")
-        tache_type = notion.get_property_value(page, PROP_TYPE)
+        tache_type = get_notion().get_property_value(page, PROP_TYPE)
         
         # Gérer le cas où Type est une Multi-sélection (liste) ou Sélection unique (chaîne)
         is_tache = False
@@ -179,24 +248,63 @@ def query_notion_tasks_to_estimate() -> list:
 
         if not is_tache:
             print(f"   SKIP wrong type: {nom} (Type: {tache_type})")
+            run_log.emit("skip", id=page_id, name=nom, reason="wrong_type", type=tache_type)
             skipped_wrong_type += 1
             continue
         
-        # Récupérer les détails pour l'estimation
-        description = notion.get_property_value(page, PROP_DESCRIPTION) or ""
+        estimation = get_estimation_value(page)
+        stored_hash = get_notion().get_property_value(page, PROP_HASH)
         
-        # Récupérer le contenu détaillé de la page
-        print(f"   📄 Lecture du contenu pour : {nom}")
-        try:
-            content = notion.get_page_content(page_id)
-        except Exception as e:
-            print(f"   ⚠️ Impossible de lire le contenu: {e}")
-            content = ""
+        # Niveau 1 : tâche estimée et inchangée depuis le dernier passage vérifié
+        if estimation > 0 and manifest.is_unchanged(page, stored_hash):
+            run_log.emit("skip", id=page_id, name=nom, reason="unchanged_fast", hours=estimation)
+            skipped_already_estimated += 1
+            skipped_fast += 1
+            continue
+        manifest.forget(page_id)
+        
+        # Niveau 2 : lecture du contenu et hash complet
+        content = fetch_task_content(page_id, nom)
+        with metrics.phase("hash"):
+            current_hash, _ = calculate_task_hash(page, content)
+        stored_version, _ = parse_hash(stored_hash)
+        
+        action = "ESTIMATE"
+        is_initial = False
+        reason = ""
+        
+        if estimation <= 0:
+            is_initial = True
+            reason = "Première estimation"
+        elif not stored_hash:
+            # Estimation sans hash (historique ou saisie manuelle) : on adopte le hash
+            # actuel sans appel IA ; les modifications suivantes seront détectées
+            action = "HASH_ONLY"
+            to_rehash += 1
+        elif stored_version != HASH_VERSION and stored_version in TASK_PROPERTIES_SPECS and \
+                calculate_task_hash(page, content, stored_version)[0] == stored_hash:
+            # Hash d'une version antérieure vérifié avec SA spécification : seul le format change
+            print(f"   🔁 Migration du hash {stored_version} → {HASH_VERSION} (sans ré-estimation): {nom}")
+            action = "HASH_ONLY"
+            to_rehash += 1
+        elif current_hash != stored_hash:
+            # Y compris un hash d'une version inconnue ou qui ne correspond plus : ré-estimation
+            print(f"   ✨ CHANGEMENT DÉTECTÉ pour: {nom} ({estimation}h)")
+            reason = "Mise à jour des infos"
+        else:
+            print(f"   SKIP already estimated: {nom} ({estimation}h)")
+            run_log.emit("skip", id=page_id, name=nom, reason="unchanged", hours=estimation)
+            skipped_already_estimated += 1
+            manifest.record(page_id, page.get("last_edited_time"), current_hash)
+            continue
+        
+        # Récupérer les détails pour l'estimation
+        description = get_notion().get_property_value(page, PROP_DESCRIPTION) or ""
         
         # Récupérer le projet si disponible
         projet = []
         try:
-            projet_value = notion.get_property_value(page, "Projet/Tlt")
+            projet_value = get_notion().get_property_value(page, PROP_PROJET)
             if projet_value:
                 projet = projet_value if isinstance(projet_value, list) else [projet_value]
         except Exception:
@@ -207,56 +315,90 @@ def query_notion_tasks_to_estimate() -> list:
             "nom": nom,
             "description": description,
             "projet": projet,
-            "content": content
+            "content": content,
+            "action": action,
+            "new_hash": current_hash,
+            "reason": reason,
+            "priorite": read_choice(page, PROP_PRIORITE),
+            "statut": read_choice(page, PROP_STATUT),
+            "is_initial": is_initial,
+            "last_edited_time": page.get("last_edited_time")
         })
     
     print(f"\n📊 Résumé:")
     print(f"   - Parents ignorés: {skipped_parents}")
-    print(f"   - Déjà estimées: {skipped_already_estimated}")
+    print(f"   - Déjà estimées et inchangées: {skipped_already_estimated} (dont {skipped_fast} par vérification rapide)")
     print(f"   - Type invalide (non 'Tâche'): {skipped_wrong_type}")
-    print(f"   - À estimer: {len(to_estimate)}")
+    print(f"   - Hash à initialiser (sans ré-estimation): {to_rehash}")
+    print(f"   - À estimer: {len(to_estimate) - to_rehash}")
     
     return to_estimate
 
 
-def update_notion_estimate(page_id: str, hours: float) -> bool:
+def update_notion_estimate(page_id: str, hours: float, new_hash: str = None, manifest: Manifest = None) -> bool:
     """
     Met à jour l'estimation d'une page dans Notion.
-    Écrit dans la propriété "🤖⏱️Temps est IA (h) ENFANT" (Number).
+    Écrit dans la propriété "🤖⏱️Temps est IA (h) ENFANT" (Number),
+    et le hash source si fourni (hours=None : hash seul).
     
     Args:
         page_id: ID de la page Notion
         hours: Temps estimé en heures décimales
+        new_hash: Hash source des données estimées
+        manifest: Manifeste local, mis à jour avec le last_edited_time de l'écriture
     
     Returns:
         True si succès, False sinon
     """
-    if DEBUG_MODE:
-        print(f"   [DEBUG] Simulation: {hours}h")
+    if get_config().debug_mode:
+        if hours is None:
+            print(f"   [DEBUG] Simulation hash: {new_hash[:12] if new_hash else 'N/A'}")
+        else:
+            print(f"   [DEBUG] Simulation: {hours}h")
         return True
     
+    properties = {}
+    if hours is not None:
+        properties[PROP_ESTIMATION_ENFANT] = {"number": hours}
+    if new_hash:
+        properties[PROP_HASH] = {"rich_text": [{"text": {"content": new_hash}}]}
+    
     try:
-        success = notion.update_page(page_id, {
-            PROP_ESTIMATION_ENFANT: {"number": hours}
-        })
-        return success
+        with metrics.phase("write"):
+            page = get_notion().patch_page(page_id, properties)
+        if page is not None and new_hash and manifest is not None:
+            manifest.record(page_id, page.get("last_edited_time"), new_hash)
+        return page is not None
     except Exception as e:
         print(f"   ❌ Erreur lors de la mise à jour: {e}")
         return False
 
 
-def get_historical_tasks() -> list:
+def write_estimate(run_log: RunLog, page_id: str, name: str, hours: float, new_hash: str = None,
+                   manifest: Manifest = None, **fields) -> bool:
+    """update_notion_estimate, avec son résultat et sa durée consignés dans le journal du run"""
+    started = time.perf_counter()
+    success = update_notion_estimate(page_id, hours, new_hash=new_hash, manifest=manifest)
+    run_log.emit("write", id=page_id, name=name, hours=hours, ok=success,
+                 seconds=round(time.perf_counter() - started, 3), **fields)
+    return success
+
+
+
+def get_historical_tasks(taches: list = None) -> list:
     """
     Récupère l'historique des tâches avec temps réel > 0
     pour servir de contexte à l'estimation.
+    taches: snapshot déjà chargé de la base (sinon nouvelle requête)
     """
     print("\n📚 Chargement de l'historique...")
     
-    try:
-        taches = notion.query_database(DB_TACHES_IA)
-    except Exception as e:
-        print(f"⚠️ Erreur chargement historique: {e}")
-        return []
+    if taches is None:
+        try:
+            taches = get_notion().query_database(get_config().db_taches)
+        except Exception as e:
+            print(f"⚠️ Erreur chargement historique: {e}")
+            return []
     
     history = []
     for tache in taches:
@@ -264,7 +406,7 @@ def get_historical_tasks() -> list:
         temps_reel = None
         for prop_name in ["⏱️ Temps réel agrégé (h)", "Temps réel (h)", "Temps réel"]:
             try:
-                temps_reel = notion.get_property_value(tache, prop_name)
+                temps_reel = get_notion().get_property_value(tache, prop_name)
                 if temps_reel:
                     break
             except Exception:
@@ -273,36 +415,295 @@ def get_historical_tasks() -> list:
         if temps_reel and temps_reel > 0:
             history.append({
                 "id": tache.get("id"),
-                "nom": notion.get_property_value(tache, PROP_NOM) or "Sans nom",
-                "description": notion.get_property_value(tache, PROP_DESCRIPTION) or "",
+                "nom": get_notion().get_property_value(tache, PROP_NOM) or "Sans nom",
+                "description": get_notion().get_property_value(tache, PROP_DESCRIPTION) or "",
                 "temps_reel": temps_reel,
-                "projet": notion.get_property_value(tache, "Projet/Tlt") or [],
+                "projet": get_notion().get_property_value(tache, PROP_PROJET) or [],
             })
     
     print(f"📊 {len(history)} tâches historiques chargées")
     return history
 
 
-def run_estimations():
-    """Lance les estimations IA et met à jour Notion"""
-    engine_name = "Gemini" if ESTIMATOR_ENGINE == "gemini" else "GPT"
+def write_parent_totals(graph: TaskGraph) -> int:
+    """
+    Écrit le total agrégé (somme des feuilles) de chaque tâche parente,
+    calculé via le graphe des tâches. Seuls les totaux modifiés sont écrits.
+    Returns: nombre de parents mis à jour
+    """
+    print("\n🌳 Totaux des tâches parentes...")
+    config = get_config()
+    notion = get_notion()
+    try:
+        schema = notion.get_database_schema(config.db_taches)
+        if schema and PROP_ESTIMATION_TOTAL not in schema:
+            print(f"   🏗️  Création de la colonne '{PROP_ESTIMATION_TOTAL}'...")
+            notion.add_property_to_database(config.db_taches, PROP_ESTIMATION_TOTAL, {"number": {"format": "number"}})
+    except Exception as e:
+        print(f"   ⚠️ Impossible de vérifier le schéma: {e}")
+    
+    queue = WriteQueue(notion)
+    simulated = 0
+    for task_id, total in graph.parent_totals().items():
+        total = round(total, 2)
+        current = notion.get_property_value(graph.pages[task_id], PROP_ESTIMATION_TOTAL)
+        if current is not None and round(float(current), 2) == total:
+            continue
+        if config.debug_mode:
+            print(f"   [DEBUG] Simulation total: {total}h")
+            simulated += 1
+            continue
+        queue.submit(task_id, {PROP_ESTIMATION_TOTAL: {"number": total}})
+    
+    written, failed = queue.drain()
+    queue.close()
+    print(f"   ✅ {written + simulated} totaux parents mis à jour, {failed} échecs")
+    return written + simulated
+
+
+def minutes_to_hours(estimated_minutes: float) -> float:
+    """Minutes estimées -> heures décimales arrondies au quart d'heure"""
+    # Conversion en heures décimales
+    raw_hours = estimated_minutes / 60
+    
+    # Arrondi au quart d'heure le plus proche (ex: 1.15 -> 1.25, 1.05 -> 1.0)
+    # On multiplie par 4, on arrondit à l'entier, puis on divise par 4
+    rounded_hours = round(raw_hours * 4) / 4
+    
+    # Sécurité: minimum 0.25h si GPT a estimé quelque chose
+    if rounded_hours == 0 and estimated_minutes > 0:
+        rounded_hours = 0.25
+    return rounded_hours
+
+
+def replay_journal(journal: RunJournal, manifest: Manifest, run_log: RunLog = None) -> int:
+    """
+    Rejoue les écritures des estimations journalisées mais jamais écrites
+    (run précédent interrompu). Le hash écrit est celui des données estimées :
+    une modification faite depuis sera détectée au passage suivant.
+    Returns: nombre d'estimations écrites
+    """
+    if run_log is None:
+        run_log = NullRunLog()
+    pending = journal.pending()
+    if not pending:
+        print("\n📒 Journal: aucune écriture en attente")
+        return 0
+    
+    print(f"\n📒 Reprise: {len(pending)} estimations en attente d'écriture...")
+    written = 0
+    for page_id, known in pending.items():
+        hours = minutes_to_hours(known["minutes"])
+        if write_estimate(run_log, page_id, None, hours, new_hash=known["hash"], manifest=manifest,
+                          minutes=known["minutes"], source="journal"):
+            print(f"   WRITE {page_id}: {hours}h ({known['minutes']} min, journal)")
+            if not get_config().debug_mode:
+                journal.record_write(page_id, known["hash"])
+            written += 1
+    journal.compact()
+    return written
+
+
+def run_estimations(deadline: Deadline = None, resume: bool = False, shard: Shard = None,
+                    batch: bool = False) -> dict:
+    """
+    Lance les estimations IA et met à jour Notion
+    deadline: échéance partagée (sinon RUN_BUDGET_MINUTES)
+    resume: rejoue d'abord les écritures en attente du journal (run interrompu)
+    shard: ne traite que les tâches de ce shard (exécution répartie)
+    batch: soumet les estimations à l'API Batch du fournisseur au lieu d'appels
+           synchrones ; les résultats sont relevés et écrits par un run suivant
+    Returns: résumé du run (compteurs)
+    """
+    metrics.reset()
+    config = get_config()
+    suffix = shard.suffix if shard else ""
+    run_log = RunLog.open("taches", config.target, suffix)
+    run_log.emit("run_start", engine="taches", database_id=config.db_taches, target=config.target,
+                 shard=suffix or None, estimator=config.estimator_engine, debug=config.debug_mode,
+                 resume=resume, batch=batch)
+    summary = None
+    error = None
+    try:
+        summary = _run_estimations(deadline, resume, shard, batch, run_log)
+        return summary
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        run_log.emit("run_end", summary=summary, error=error, metrics=metrics.snapshot())
+        run_log.close()
+        print(f"📝 Journal du run {run_log.run_id}: {run_log.path}")
+        metrics.export_textfile("taches" + suffix, config.target)
+
+
+def _run_estimations(deadline: Deadline, resume: bool, shard: Shard, batch: bool, run_log: RunLog) -> dict:
+    """
+    Corps de run_estimations (métriques du run remises à zéro avant, exportées après ;
+    début et fin du run consignés dans son journal)
+    """
+    summary = {"candidates": 0, "hash_only": 0, "estimated": 0, "llm_calls": 0,
+               "reused_from_journal": 0, "written": 0, "failed": 0, "postponed": 0}
+    if batch and not hasattr(get_estimator(), "submit_batch"):
+        print("❌ Mode batch disponible avec GPT uniquement (ESTIMATOR_ENGINE=gpt)")
+        return summary
+    config = get_config()
+    notion = get_notion()
+    engine_name = "Gemini" if config.estimator_engine == "gemini" else "GPT"
     print(f"\n🤖 Lancement des estimations {engine_name} (heures décimales)...")
-    if DEBUG_MODE:
+    if config.debug_mode:
         print("⚠️  MODE DEBUG ACTIVÉ - Pas d'écriture dans Notion")
     
-    tasks_to_estimate = query_notion_tasks_to_estimate()
+    # --- PRÉ-REQUIS : Vérifier l'existence de la colonne HASH ---
+    try:
+        schema = notion.get_database_schema(config.db_taches)
+        if schema and PROP_HASH not in schema:
+            print(f"   🏗️  Création de la colonne '{PROP_HASH}'...")
+            notion.add_property_to_database(config.db_taches, PROP_HASH, {"rich_text": {}})
+    except Exception as e:
+        print(f"   ⚠️ Impossible de vérifier le schéma: {e}")
+    
+    if deadline is None:
+        deadline = Deadline.from_env()
+    # Fichiers locaux propres au shard (plusieurs workers sur la même machine)
+    suffix = shard.suffix if shard else ""
+    manifest = Manifest.load("taches_sources" + suffix, config.db_taches)
+    
+    # Journal de reprise : estimations payées mais pas encore écrites
+    journal = RunJournal.load("taches" + suffix, config.db_taches)
+    if resume:
+        replay_journal(journal, manifest, run_log)
+    elif journal.pending():
+        print(f"\n📒 {len(journal.pending())} estimations du run précédent en attente "
+              "(réutilisées si la tâche n'a pas changé, --resume pour les écrire d'abord)")
+    
+    # Snapshot unique de la base : graphe (feuilles, parents) + historique
+    try:
+        with metrics.phase("query"):
+            all_tasks = notion.query_database(config.db_taches)
+    except Exception as e:
+        print(f"❌ Erreur lecture base Tâches: {e}")
+        summary["error"] = str(e)
+        return summary
+    profiling.mark("query")
+    graph = TaskGraph.build(all_tasks)
+    
+    candidates = query_notion_tasks_to_estimate(manifest, graph, shard, run_log)
+    profiling.mark("contenu et hash")
+    
+    # Tâches déjà estimées sans hash : on enregistre seulement le hash (pas d'appel IA)
+    hash_only = [t for t in candidates if t.get("action") == "HASH_ONLY"]
+    if hash_only:
+        print(f"\n🔁 Initialisation du hash de {len(hash_only)} tâches déjà estimées...")
+        for task in hash_only:
+            if deadline.revoked():
+                break
+            write_estimate(run_log, task["id"], task["nom"], None, new_hash=task["new_hash"], manifest=manifest,
+                           action="HASH_ONLY")
+    
+    tasks_to_estimate = [t for t in candidates if t.get("action") != "HASH_ONLY"]
+    summary["hash_only"] = len(hash_only)
+    summary["candidates"] = len(tasks_to_estimate)
+    journal.retain({t["id"]: t.get("new_hash") for t in tasks_to_estimate})
+    
+    # Mode batch : résultats des jobs terminés → journal (écrits plus bas comme des reprises)
+    if batch:
+        jobs = BatchJobStore.load("taches" + suffix, config.db_taches)
+        if jobs.jobs:
+            print(f"\n📦 Relève de {len(jobs.jobs)} job(s) batch...")
+            batch_stats = collect_jobs(jobs, get_estimator(), journal)
+            summary.update(batch_ingested=batch_stats["ingested"], batch_pending=batch_stats["pending"])
     if not tasks_to_estimate:
+        manifest.save()
+        journal.compact()
         print("✅ Toutes les tâches sont déjà estimées ou ce sont des parents")
-        return
+        # Les totaux des parents couvrent toute la base : pas en exécution répartie
+        if config.write_parent_totals and shard is None:
+            write_parent_totals(graph)
+        return summary
+    
+    # Ordonnancement : les estimations les plus utiles d'abord
+    scheduled = schedule_work(tasks_to_estimate, max_items_from_env())
+    if len(scheduled) < len(tasks_to_estimate):
+        kept = {task["id"] for task in scheduled}
+        for task in tasks_to_estimate:
+            if task["id"] not in kept:
+                run_log.emit("skip", id=task["id"], name=task["nom"], reason="max_items")
+    tasks_to_estimate = scheduled
+    
+    # Déduplication : une seule estimation par groupe de tâches identiques
+    groups = group_tasks(tasks_to_estimate, near_threshold_from_env())
+    representatives = [group[0] for group in groups]
+    if len(representatives) < len(tasks_to_estimate):
+        print(f"\n🧬 Dédoublonnage: {len(tasks_to_estimate)} tâches → {len(representatives)} estimations")
+        run_log.emit("dedup", groups=groups_log(groups))
+    
+    # Estimations déjà payées pour les mêmes données (run précédent interrompu)
+    rep_estimates = {}
+    to_call = []
+    for task in representatives:
+        minutes = journal.estimated(task["id"], task.get("new_hash"))
+        if minutes:
+            rep_estimates[task["id"]] = minutes
+            run_log.emit("estimate", id=task["id"], name=task["nom"], minutes=minutes,
+                         hours=minutes_to_hours(minutes), source="journal")
+        else:
+            to_call.append(task)
+    reused = len(rep_estimates)
+    if reused:
+        print(f"\n📒 {reused} estimations reprises du journal (sans appel IA)")
     
-    historical_tasks = get_historical_tasks()
+    with metrics.phase("history"):
+        historical_tasks = get_historical_tasks(all_tasks)
+    profiling.mark("historique")
     
-    # Batch estimation
-    estimates = estimator.batch_estimate(
-        tasks_to_estimate=tasks_to_estimate,
-        all_tasks_history=historical_tasks,
-        project_name="EISF Alternance"
-    )
+    if batch:
+        # Une tâche déjà soumise (même hash) attend son job : pas de nouvelle soumission
+        submitted = jobs.pending_hashes()
+        call_ids = {task["id"] for task in to_call}
+        to_submit = [group for group in groups
+                     if group[0]["id"] in call_ids and submitted.get(group[0]["id"]) != group[0].get("new_hash")]
+        if to_submit:
+            batch_id = submit_job(jobs, get_estimator(), to_submit, historical_tasks, "EISF Alternance")
+            if batch_id:
+                print(f"\n📦 Job batch {batch_id} soumis: {len(to_submit)} estimations "
+                      "(résultats relevés par un prochain run --batch)")
+                for group in to_submit:
+                    run_log.emit("batch_submit", id=group[0]["id"], name=group[0]["nom"], batch_id=batch_id)
+                summary["batch_submitted"] = len(to_submit)
+        to_call = []
+    
+    # Chaque estimation est journalisée dès son retour (pour tout son groupe)
+    members_by_rep = {group[0]["id"]: group for group in groups}
+    
+    def on_estimate(task, minutes):
+        rep_estimates[task["id"]] = minutes
+        for member in members_by_rep.get(task["id"], [task]):
+            journal.record_estimate(member["id"], member.get("new_hash"), minutes)
+            run_log.emit("estimate", id=member["id"], name=member["nom"], minutes=minutes,
+                         hours=minutes_to_hours(minutes),
+                         **({"source": "llm"} if member is task else {"source": "dedup", "of": task["id"]}))
+    
+    # Batch estimation (s'arrête proprement à l'échéance ; Ctrl+C garde les estimations obtenues)
+    interrupted = False
+    try:
+        with metrics.phase("llm"):
+            returned = get_estimator().batch_estimate(
+                tasks_to_estimate=to_call,
+                all_tasks_history=historical_tasks,
+                project_name="EISF Alternance",
+                deadline=deadline,
+                on_estimate=on_estimate
+            )
+        # Estimateur qui ne signale pas ses estimations au fil de l'eau
+        for task in to_call:
+            if task["id"] in returned and task["id"] not in rep_estimates:
+                on_estimate(task, returned[task["id"]])
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n🛑 Interruption: écriture des estimations déjà obtenues...")
+    estimates = fan_out(groups, rep_estimates)
+    profiling.mark("llm")
     
     # Mettre à jour Notion
     print("\n💾 Mise à jour Notion...")
@@ -313,82 +714,76 @@ def run_estimations():
         task_id = task.get("id")
         task_name = task.get("nom", "Sans nom")
         
+        # Bail du shard perdu : le nouveau propriétaire écrit ses propres estimations
+        if deadline.revoked():
+            print("   ⚠️ Bail perdu: écritures arrêtées (shard repris par un autre worker)")
+            break
+        
         if task_id in estimates:
             estimated_minutes = estimates[task_id]
+            rounded_hours = minutes_to_hours(estimated_minutes)
             
-            # Conversion en heures décimales
-            raw_hours = estimated_minutes / 60
-            
-            # Arrondi au quart d'heure le plus proche (ex: 1.15 -> 1.25, 1.05 -> 1.0)
-            # On multiplie par 4, on arrondit à l'entier, puis on divise par 4
-            rounded_hours = round(raw_hours * 4) / 4
-            
-            # Sécurité: minimum 0.25h si GPT a estimé quelque chose
-            if rounded_hours == 0 and estimated_minutes > 0:
-                rounded_hours = 0.25
-                
-            success = update_notion_estimate(task_id, rounded_hours)
+            success = write_estimate(run_log, task_id, task_name, rounded_hours, new_hash=task.get("new_hash"),
+                                     manifest=manifest, minutes=estimated_minutes)
             
             if success:
                 print(f"   WRITE {task_name}: {rounded_hours}h ({estimated_minutes} min)")
+                if not config.debug_mode:
+                    journal.record_write(task_id, task.get("new_hash"))
+                graph.set_estimate(task_id, rounded_hours)
                 updated += 1
             else:
                 print(f"   ❌ FAILED {task_name}")
                 failed += 1
+        else:
+            # Échéance, budget, échec de l'IA ou interruption : repris au prochain passage
+            run_log.emit("skip", id=task_id, name=task_name, reason="not_estimated")
     
     print(f"\n✅ Résultat: {updated} estimations enregistrées, {failed} échecs")
+    manifest.save()
+    journal.compact()
+    summary.update(estimated=len(estimates), llm_calls=len(rep_estimates) - reused,
+                   reused_from_journal=reused, written=updated, failed=failed,
+                   postponed=summary["candidates"] - len(estimates))
+    if interrupted:
+        print("🛑 Run interrompu: les tâches restantes seront traitées au prochain passage")
+        return summary
     
-    # Sauvegarder log (non critique - on continue même si ça échoue)
-    try:
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
-        # Si "logs" existe en tant que fichier, le supprimer pour créer un dossier
-        if os.path.exists(log_dir) and not os.path.isdir(log_dir):
-            os.remove(log_dir)
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-        log_path = os.path.join(log_dir, f"estimations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-        
-        log_data = {
-            "timestamp": datetime.now().isoformat(),
-            "database_id": DB_TACHES_IA,
-            "estimates": {
-                task_id: {
-                    "task_name": next((t["nom"] for t in tasks_to_estimate if t["id"] == task_id), "Unknown"),
-                    "estimated_minutes": estimates[task_id],
-                    "written_hours": round((estimates[task_id] / 60) * 4) / 4 if estimates[task_id] / 60 >= 0.125 else 0.25
-                }
-                for task_id in estimates
-            },
-            "summary": {
-                "total_estimated": len(estimates),
-                "successfully_written": updated,
-                "failed": failed
-            }
-        }
-        
-        with open(log_path, "w", encoding="utf-8") as f:
-            json.dump(log_data, f, indent=2, ensure_ascii=False)
-        print(f"📝 Log sauvegardé: {log_path}")
-    except Exception as e:
-        print(f"⚠️ Log non sauvegardé (non critique): {e}")
+    if config.write_parent_totals and shard is None:
+        write_parent_totals(graph)
+    return summary
 
 
-def main():
+def main(argv=None):
     """Fonction principale"""
-    engine_name = "Gemini" if ESTIMATOR_ENGINE == "gemini" else "GPT"
+    import argparse
+    parser = argparse.ArgumentParser(description="Martine IA - estimation des tâches")
+    parser.add_argument("--resume", action="store_true",
+                        help="rejoue d'abord les écritures en attente du journal (run interrompu)")
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    # Forcer l'encodage UTF-8 pour Windows (pour les émojis)
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    
+    load_env(required=True)
+    config = get_config()
+    engine_name = "Gemini" if config.estimator_engine == "gemini" else "GPT"
     print("=" * 60)
     print("🧠 MARTINE IA - Estimation automatique des temps (Tâches)")
     print(f"   Base: Tâches IA")
     print(f"   Moteur: {engine_name}")
     print("   Mode: Heures décimales (arrondi au quart d'heure)")
     print("   Cible: Feuilles uniquement (pas de parents)")
-    if DEBUG_MODE:
+    if config.debug_mode:
         print("   ⚠️  MODE DEBUG ACTIVÉ (pas d'écriture)")
     print("=" * 60)
     
     try:
         # Estimer via IA et mettre à jour Notion
-        run_estimations()
+        with profiling.session("taches", args.profile, args.profile_sample):
+            run_estimations(resume=args.resume)
         
         print("\n" + "=" * 60)
         print("✅ TRAITEMENT TERMINÉ")
@@ -0,0 +1,149 @@
+"""
+Manifeste local de détection de changements pour Martine IA
+Mémorise, par page, le last_edited_time et le hash source connus lors du
+dernier passage, pour éviter de relire les pages qui n'ont pas bougé
+"""
+import os
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "cache"
+
+# Notion arrondit last_edited_time à la minute : on garde une marge
+SYNC_MARGIN = timedelta(minutes=2)
+
+
+def notion_timestamp(moment: datetime) -> str:
+    """Horodatage au format des filtres Notion (UTC, à la seconde)"""
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Horodatage ISO (Notion ou manifeste) en datetime UTC, None si absent ou illisible"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def settled(last_edited_time: Optional[str], observed_at: Optional[datetime]) -> bool:
+    """
+    True si last_edited_time est antérieur de plus de SYNC_MARGIN au moment où il a été
+    observé : arrondi à la minute, il ne peut alors plus masquer une modification
+    (une modification dans la même minute garderait le même last_edited_time)
+    """
+    edited = parse_timestamp(last_edited_time)
+    return edited is not None and observed_at is not None and edited < observed_at - SYNC_MARGIN
+
+
+class Manifest:
+    """
+    Manifeste JSON {page_id -> {last_edited_time, hash}} d'une database
+    (thread-safe : partagé par les workers du pipeline des projets)
+    """
+
+    def __init__(self, path: Path, database_id: str):
+        self.path = Path(path)
+        self.database_id = database_id
+        self.pages: Dict[str, Dict] = {}
+        self.synced_at: Optional[str] = None
+        self.run_started_at = datetime.now(timezone.utc)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, name: str, database_id: str) -> "Manifest":
+        """Charge le manifeste cache/<name>.json (vide si absent, illisible ou autre DB)"""
+        manifest = cls(CACHE_DIR / f"{name}.json", database_id)
+        if not manifest.path.exists():
+            return manifest
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Manifeste illisible, reconstruction complète: {e}")
+            return manifest
+
+        if data.get("database_id") != database_id:
+            print("ℹ️ Manifeste d'une autre database, reconstruction complète")
+            return manifest
+
+        manifest.pages = data.get("pages", {})
+        manifest.synced_at = data.get("synced_at")
+        return manifest
+
+    def get(self, page_id: str) -> Optional[Dict]:
+        """Enregistrement connu pour une page (ou None)"""
+        with self.lock:
+            return self.pages.get(page_id)
+
+    def record(self, page_id: str, last_edited_time: Optional[str], source_hash: Optional[str], **extra):
+        """Mémorise l'état vérifié d'une page"""
+        if not last_edited_time or not source_hash:
+            self.forget(page_id)
+            return
+        entry = {"last_edited_time": last_edited_time, "hash": source_hash,
+                 "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        entry.update(extra)
+        with self.lock:
+            self.pages[page_id] = entry
+
+    def forget(self, page_id: str):
+        """Invalide une page : elle repassera par la vérification complète"""
+        with self.lock:
+            self.pages.pop(page_id, None)
+
+    @staticmethod
+    def is_settled(entry: Optional[Dict]) -> bool:
+        """
+        Entrée fiable : son last_edited_time précède de plus de SYNC_MARGIN son
+        enregistrement. Sinon (ex: horodatage renvoyé par notre propre écriture), une
+        modification dans la même minute le conserverait : repasser par le hash complet.
+        """
+        return bool(entry) and settled(entry.get("last_edited_time"), parse_timestamp(entry.get("recorded_at")))
+
+    def is_unchanged(self, page: Dict, stored_hash: Optional[str]) -> bool:
+        """
+        Vérification rapide (niveau 1) : même last_edited_time et même hash
+        que lors du dernier passage vérifié, entrée fiable (voir is_settled).
+        """
+        entry = self.get(page.get("id"))
+        if not entry or not stored_hash:
+            return False
+        return (
+            entry.get("last_edited_time") == page.get("last_edited_time")
+            and entry.get("hash") == stored_hash
+            and self.is_settled(entry)
+        )
+
+    def changed_since_filter(self) -> Optional[Dict]:
+        """Filtre Notion des pages modifiées depuis la dernière synchro (None = premier passage)"""
+        if not self.synced_at:
+            return None
+        return {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": self.synced_at}
+        }
+
+    def save(self):
+        """Écrit le manifeste (écriture atomique), synchro datée du début du run"""
+        self.synced_at = notion_timestamp(self.run_started_at - SYNC_MARGIN)
+        with self.lock:
+            data = {
+                "database_id": self.database_id,
+                "synced_at": self.synced_at,
+                "pages": dict(self.pages)
+            }
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Manifeste non sauvegardé (non critique): {e}")
@@ -0,0 +1,428 @@
+"""
+MARTINE IA - Point d'entrée unique
+Lance les moteurs Tâches (heures) et/ou Projets (semaines) dans un seul processus,
+avec un client Notion, un snapshot des bases et des estimateurs partagés.
+Les tâches passent d'abord : les résumés des projets voient leurs nouvelles estimations.
+
+Usage:
+    python src/martine.py tasks      # Estimation des tâches (src/main.py)
+    python src/martine.py projects   # Estimation des projets (src/estimate_projects.py)
+    python src/martine.py all        # Les deux (défaut)
+    python src/martine.py --watch    # Surveillance continue (daemon)
+    python src/martine.py --webhook  # Estimation à la réception des webhooks Notion
+    python src/martine.py --resume   # Reprise d'un run interrompu (journal)
+    python src/martine.py tasks --shards 8 --run-id lot1   # Worker d'un run réparti
+    python src/martine.py --status --run-id lot1           # Avancement du run réparti
+    python src/martine.py sync          # Miroir local à jour + envoi des écritures différées
+    python src/martine.py all --offline # Estimation sur le miroir local, sans appel Notion
+    python src/martine.py tasks --batch # Rattrapage : job batch GPT, relevé au run suivant
+    python src/martine.py all --targets       # Toutes les cibles de targets.json en parallèle
+    python src/martine.py all --target equipe-a   # Une seule cible
+    python src/martine.py all --profile --profile-sample 10   # Profil CPU/mémoire dans logs/profile_*
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import profiling
+
+COMMANDS = ["tasks", "projects", "all", "sync"]
+
+
+class SharedResources:
+    """Ressources partagées entre les moteurs d'un même processus"""
+
+    def __init__(self, config=None, offline: bool = False):
+        self._config = config
+        self._notion = None
+        self.offline = offline
+        self.estimators = {}
+        self.deadline = None
+
+    def config(self):
+        """Configuration commune (lue depuis le .env au premier appel)"""
+        if self._config is None:
+            from config import MartineConfig
+            self._config = MartineConfig.from_env()
+        return self._config
+
+    def notion(self):
+        """Client Notion unique (snapshot des bases partagé, ou miroir local hors ligne)"""
+        if self._notion is None and self.offline:
+            from mirror import LocalMirror, MirrorNotionClient
+            self._notion = MirrorNotionClient(LocalMirror.load(), self.config().notion_token or "")
+        if self._notion is None:
+            from snapshot import SnapshotNotionClient
+            from config import create_notion_limiter
+            config = self.config()
+            config.require(notion_token="NOTION_TOKEN")
+            self._notion = SnapshotNotionClient(
+                config.notion_token, create_notion_limiter(config), config.notion_base_url
+            )
+        return self._notion
+
+    def estimator(self, engine: str):
+        """Estimateur unique par moteur ("gemini" ou "gpt")"""
+        if engine not in self.estimators:
+            from config import create_estimator
+            self.estimators[engine] = create_estimator(self.config(), engine)
+        return self.estimators[engine]
+
+
+def run_tasks(shared: SharedResources, resume: bool = False, shard=None, batch: bool = False) -> dict:
+    """Moteur Tâches avec les ressources partagées ; retourne le résumé du run"""
+    import main as task_engine
+    config = shared.config()
+    task_engine.configure(
+        config=config,
+        notion=shared.notion(),
+        estimator=shared.estimator(config.estimator_engine)
+    )
+
+    print("\n" + "=" * 60)
+    print("🧠 MARTINE IA - Tâches")
+    print("=" * 60)
+    return task_engine.run_estimations(deadline=shared.deadline, resume=resume, shard=shard, batch=batch)
+
+
+def run_projects(shared: SharedResources, shard=None) -> dict:
+    """Moteur Projets avec les ressources partagées ; retourne le résumé du run"""
+    import estimate_projects as project_engine
+    project_engine.configure(
+        config=shared.config(),
+        notion=shared.notion(),
+        estimator=shared.estimator("gpt")
+    )
+
+    print("\n" + "=" * 60)
+    print("🧠 MARTINE IA - Projets (Senior PM)")
+    print("=" * 60)
+    return project_engine.run_estimations(deadline=shared.deadline, shard=shard)
+
+
+def run(command: str, config=None, resume: bool = False, summary_path=None, offline: bool = False,
+        batch: bool = False) -> int:
+    """
+    Exécute une commande ; retourne le code de sortie
+    config: MartineConfig à utiliser (sinon lue depuis le .env)
+    resume: rejoue d'abord les écritures en attente du journal des tâches
+    summary_path: fichier JSON où déposer le résumé des moteurs (exécution multi-cibles)
+    offline: lit le miroir local, écritures différées jusqu'au prochain `sync`
+    batch: tâches estimées par jobs batch du fournisseur (relevés au run suivant)
+    """
+    from scheduler import Deadline
+    shared = SharedResources(config, offline)
+    # Le budget temps couvre l'ensemble de la commande
+    shared.deadline = Deadline.from_env()
+
+    summary = {}
+    code = 0
+    try:
+        if command in ("tasks", "all"):
+            summary["tasks"] = run_tasks(shared, resume=resume, batch=batch)
+        if command in ("projects", "all"):
+            summary["projects"] = run_projects(shared)
+    except Exception as e:
+        print(f"\n❌ ERREUR CRITIQUE: {e}")
+        import traceback
+        traceback.print_exc()
+        summary["error"] = str(e)
+        code = 1
+
+    if offline and shared._notion is not None:
+        pending = len(shared.notion().mirror.outbox())
+        summary["outbox"] = {"queued": shared.notion().queued, "pending_pages": pending}
+        print(f"\n📮 {shared.notion().queued} écriture(s) différée(s), {pending} page(s) à envoyer "
+              f"(python src/martine.py sync)")
+    if summary_path is not None:
+        write_summary(summary_path, summary)
+    if code:
+        return code
+
+    print("\n" + "=" * 60)
+    print("✅ TRAITEMENT TERMINÉ")
+    print("=" * 60)
+    return 0
+
+
+def run_sync(config=None, full: bool = False) -> int:
+    """
+    Synchro du miroir local : relit les pages modifiées (tout avec full=True) puis
+    pousse les écritures faites hors ligne, sauf conflit (page modifiée entre-temps)
+    """
+    from mirror import sync
+    shared = SharedResources(config)
+    config = shared.config()
+
+    print("\n" + "=" * 60)
+    print("🔄 MARTINE IA - Synchro du miroir local")
+    print("=" * 60)
+    try:
+        stats = sync(shared.notion(), [config.db_taches, config.db_projets], full=full)
+    except Exception as e:
+        print(f"\n❌ ERREUR CRITIQUE: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    print(f"\n✅ Miroir: {stats['pages']} page(s) relue(s), {stats['contents']} contenu(s), "
+          f"{stats['removed']} supprimée(s)")
+    print(f"📮 Envoi: {stats['pushed']} écriture(s), {stats['conflicts']} conflit(s), {stats['failed']} échec(s)")
+    return 1 if stats["failed"] else 0
+
+
+def write_summary(path, summary: dict):
+    """Dépose le résumé d'une commande (lu par le lanceur multi-cibles)"""
+    import json
+    from pathlib import Path
+    try:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"⚠️ Erreur sauvegarde résumé (non critique): {e}")
+
+
+def engine_cycle(shared: SharedResources, command: str):
+    """Cycle d'estimation réutilisable (modes surveillance et webhooks)"""
+    from scheduler import Deadline
+
+    def run_cycle():
+        # Budget temps par cycle
+        shared.deadline = Deadline.from_env()
+        if command in ("tasks", "all"):
+            run_tasks(shared)
+        if command in ("projects", "all"):
+            run_projects(shared)
+
+    return run_cycle
+
+
+def run_watch(command: str, config=None, max_cycles=None) -> int:
+    """
+    Mode surveillance : les moteurs restent chargés et sont relancés à chaque
+    modification détectée dans les bases concernées
+    """
+    from watch import watch
+    shared = SharedResources(config)
+    config = shared.config()
+
+    # Les hashs des projets dépendent des tâches : les deux bases sont scrutées
+    database_ids = [config.db_taches]
+    if command in ("projects", "all"):
+        database_ids.append(config.db_projets)
+
+    try:
+        watch(shared.notion(), database_ids, engine_cycle(shared, command), max_cycles=max_cycles)
+    except Exception as e:
+        print(f"\n❌ ERREUR CRITIQUE: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def run_webhook(command: str, config=None, max_cycles=None) -> int:
+    """
+    Mode webhooks : les moteurs restent chargés et sont relancés quand Notion
+    notifie une modification de page (seules les pages notifiées sont relues)
+    """
+    from webhook import receiver_from_env, serve
+    shared = SharedResources(config)
+
+    try:
+        receiver = receiver_from_env()
+        serve(shared.notion(), receiver, engine_cycle(shared, command), max_cycles=max_cycles)
+    except Exception as e:
+        print(f"\n❌ ERREUR CRITIQUE: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def run_sharded(command: str, shards: int, run_id: str, config=None) -> int:
+    """
+    Worker d'une exécution répartie : réserve les shards libres du run un par un
+    (bail renouvelé pendant le traitement) jusqu'à ce qu'il n'en reste plus
+    """
+    from scheduler import Deadline
+    from leases import (LeaseStore, LeaseHeartbeat, LeaseDeadline, Shard, worker_id, lease_seconds_from_env,
+                        retry_policy_from_env)
+    shared = SharedResources(config)
+    store = LeaseStore.from_env()
+    owner = worker_id()
+    ttl = lease_seconds_from_env()
+    max_attempts, retry_after = retry_policy_from_env()
+    # Le budget temps couvre l'ensemble des shards traités par ce worker
+    deadline = Deadline.from_env()
+    completed = 0
+    # Shards rendus par ce worker : laissés aux autres workers (ou au prochain lancement)
+    released = set()
+
+    print(f"🧩 Worker {owner} - run {run_id} ({shards} shards)")
+    while not deadline.expired():
+        index = store.claim(run_id, owner, shards, ttl, exclude=released)
+        if index is None:
+            break
+        shard = Shard(index, shards)
+        print("\n" + "=" * 60)
+        print(f"🧩 Shard {shard}")
+        print("=" * 60)
+
+        heartbeat = LeaseHeartbeat(store, run_id, index, owner, ttl)
+        heartbeat.start()
+        shared.deadline = LeaseDeadline(deadline, heartbeat)
+        summary = {}
+        try:
+            if command in ("tasks", "all"):
+                summary["tasks"] = run_tasks(shared, shard=shard)
+            if command in ("projects", "all"):
+                summary["projects"] = run_projects(shared, shard=shard)
+        except Exception as e:
+            summary = {"error": str(e)}
+        finally:
+            heartbeat.stop()
+
+        if heartbeat.lost:
+            print(f"⚠️ Shard {shard} non validé (bail perdu, écritures arrêtées)")
+            continue
+        error = summary.get("error") or next(
+            (result["error"] for result in summary.values() if isinstance(result, dict) and result.get("error")), None)
+        if error:
+            released.add(index)
+            if store.fail(run_id, index, owner, error, max_attempts, retry_after):
+                print(f"\n❌ ERREUR shard {shard}: {error} (abandonné après {max_attempts} tentatives)")
+            else:
+                print(f"\n❌ ERREUR shard {shard}: {error} (repris par un worker dans {retry_after:.0f}s)")
+            continue
+        if deadline.expired() or shard_postponed(summary):
+            # Travail reporté : le shard reste à faire pour un autre worker
+            print(f"⏰ Shard {shard} inachevé: rendu pour un autre worker")
+            released.add(index)
+            store.release(run_id, index, owner)
+            continue
+        # Les pages en échec sont comptées dans le résumé et retentées au prochain run (hash inchangé)
+        if not store.complete(run_id, index, owner, summary):
+            print(f"⚠️ Shard {shard} non validé (bail perdu)")
+            continue
+        completed += 1
+
+    print(f"\n🧩 {completed} shard(s) traité(s) par ce worker")
+    print_shard_status(run_id, store)
+    return 0
+
+
+def shard_postponed(summary: dict) -> bool:
+    """True si un moteur a reporté du travail (échéance ou budget d'estimations atteint)"""
+    return any(result.get("postponed") for result in summary.values())
+
+
+def print_shard_status(run_id: str, store=None) -> int:
+    """Coordinateur : avancement d'un run réparti et résumé consolidé des shards terminés"""
+    from leases import LeaseStore
+    store = store or LeaseStore.from_env()
+    merged = store.merged_summary(run_id)
+    print(f"\n📊 Run {run_id}: {merged['done']}/{merged['shards']} shards terminés, {merged['leased']} en cours"
+          + (f", {len(merged['failed'])} en échec" if merged["failed"] else ""))
+    for index, error in merged["failed"].items():
+        print(f"   ❌ shard {index + 1}: {error}")
+    for engine, totals in merged["engines"].items():
+        counters = ", ".join(f"{key}={value}" for key, value in totals.items())
+        print(f"   {engine}: {counters}")
+    return 0
+
+
+def main(argv=None) -> int:
+    # Forcer l'encodage UTF-8 pour Windows (pour les émojis)
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    parser = argparse.ArgumentParser(description="Martine IA - estimation automatique des temps dans Notion")
+    parser.add_argument("command", nargs="?", default="all", choices=COMMANDS,
+                        help="moteur(s) à lancer (défaut: all)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--watch", action="store_true",
+                      help="reste actif et estime les pages dès qu'elles changent")
+    mode.add_argument("--webhook", action="store_true",
+                      help="reste actif et estime les pages notifiées par les webhooks Notion")
+    parser.add_argument("--resume", action="store_true",
+                        help="rejoue d'abord les écritures en attente du journal (run interrompu)")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="exécution répartie : nombre de shards (même valeur pour tous les workers)")
+    parser.add_argument("--run-id", default=datetime.now().strftime("%Y%m%d"),
+                        help="identifiant partagé par les workers d'un run réparti (défaut: date du jour)")
+    parser.add_argument("--status", action="store_true",
+                        help="affiche l'avancement et le résumé consolidé du run réparti --run-id")
+    parser.add_argument("--offline", action="store_true",
+                        help="lit le miroir local (voir `sync`) et diffère les écritures Notion")
+    parser.add_argument("--full", action="store_true",
+                        help="sync : recopie complète du miroir (pages supprimées comprises)")
+    parser.add_argument("--batch", action="store_true",
+                        help="tâches : soumet un job batch (GPT) et relève les jobs précédents")
+    parser.add_argument("--targets", nargs="?", const="", default=None, metavar="FICHIER",
+                        help="exécute toutes les cibles du fichier en parallèle (défaut: targets.json)")
+    parser.add_argument("--target", metavar="NOM",
+                        help="exécute une seule cible du fichier des cibles")
+    profiling.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # Options sans effet dans ces modes : refusées plutôt qu'ignorées
+    if args.offline and (args.watch or args.webhook or args.shards > 0):
+        print("❌ --offline ne s'utilise pas avec --watch, --webhook ou --shards "
+              "(miroir local pour une exécution ponctuelle seulement)")
+        return 1
+    if args.targets is not None and not args.target and (args.watch or args.webhook or args.shards > 0 or args.status):
+        print("❌ --targets ne s'utilise pas avec --watch, --webhook, --shards ou --status "
+              "(exécution ponctuelle de chaque cible seulement)")
+        return 1
+    if args.shards > 0 and args.command not in ("tasks", "projects", "all"):
+        print(f"❌ --shards ne s'utilise qu'avec tasks, projects ou all (pas {args.command})")
+        return 1
+    if args.resume and args.shards > 0:
+        print("❌ --resume ne s'utilise pas avec --shards (les journaux sont propres à chaque shard)")
+        return 1
+    if args.batch and (args.command not in ("tasks", "all") or args.shards > 0):
+        print("❌ --batch ne concerne que le moteur des tâches, hors exécution répartie (--shards)")
+        return 1
+
+    from config import load_env
+    load_env(required=True)
+    config = None
+    summary_path = None
+    try:
+        if args.target:
+            import manifest
+            from targets import prepare_target
+            config = prepare_target(args.target, args.targets or None)
+            summary_path = manifest.CACHE_DIR / "summary.json"
+        elif args.targets is not None:
+            from targets import run_targets
+            # Les options d'une exécution ponctuelle s'appliquent à chaque cible
+            options = [flag for flag, enabled in (("--resume", args.resume), ("--offline", args.offline),
+                                                  ("--batch", args.batch), ("--full", args.full)) if enabled]
+            return run_targets(args.command, args.targets or None, options=options)
+    except (ValueError, FileNotFoundError) as e:
+        print(e)
+        return 1
+
+    with profiling.session(args.command, args.profile, args.profile_sample):
+        if args.watch:
+            return run_watch(args.command, config)
+        if args.webhook:
+            return run_webhook(args.command, config)
+        if args.status:
+            return print_shard_status(args.run_id)
+        if args.shards > 0:
+            return run_sharded(args.command, args.shards, args.run_id, config)
+        if args.command == "sync":
+            return run_sync(config, full=args.full)
+        return run(args.command, config, resume=args.resume, summary_path=summary_path, offline=args.offline,
+                   batch=args.batch)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
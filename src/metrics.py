@@ -0,0 +1,242 @@
+"""
+Métriques d'exécution de Martine IA
+Chronomètres par phase (lecture, contenu, hash, historique, appels IA, écritures),
+compteurs de requêtes par service, route et code HTTP, histogrammes de latence,
+tokens consommés par fournisseur IA.
+Un registre par processus, remis à zéro au début de chaque run de moteur : son
+instantané est écrit en fin de run dans le journal des runs (logs/runs_*.jsonl) et,
+si METRICS_TEXTFILE_DIR est défini, exporté au format texte Prometheus (collecteur
+textfile de node_exporter).
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value) -> str:
+    """Valeur de libellé Prometheus (antislash, guillemets et retours à la ligne échappés)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Distribution de durées (comptes cumulés par borne, somme, maximum)"""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile approché (borne du premier seau qui l'atteint, sinon le maximum)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, cumulated in zip(LATENCY_BUCKETS, self.buckets):
+            if cumulated >= rank:
+                return round(min(bound, self.max), 4)
+        return round(self.max, 4)
+
+    def summary(self) -> Dict:
+        return {"count": self.count, "seconds": round(self.sum, 3), "max_seconds": round(self.max, 3),
+                "p50_seconds": self.quantile(0.5), "p95_seconds": self.quantile(0.95)}
+
+
+class RequestCall:
+    """Appel HTTP en cours de mesure (le code est renseigné par l'appelant)"""
+
+    def __init__(self):
+        self.status = "error"
+
+
+class Metrics:
+    """Registre des métriques d'un processus (utilisable depuis plusieurs threads)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters: Dict[Tuple[str, Labels], float] = {}
+            self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+            self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Chronomètre une phase du run (cumulé si la phase se répète)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("phase_seconds", time.perf_counter() - started, phase=name)
+
+    @contextmanager
+    def request(self, service: str, endpoint: str):
+        """Mesure un appel HTTP : durée et code (call.status, "error" si exception)"""
+        call = RequestCall()
+        started = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.observe("request_seconds", time.perf_counter() - started, service=service, endpoint=endpoint)
+            self.inc("requests_total", service=service, endpoint=endpoint, status=call.status)
+
+    def snapshot(self) -> Dict:
+        """Instantané lisible (pour le journal des runs)"""
+        with self.lock:
+            phases = {}
+            requests_by_service: Dict[str, Dict] = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                values = dict(labels)
+                if name == "phase_seconds":
+                    phases[values["phase"]] = histogram.summary()
+                elif name == "request_seconds":
+                    endpoints = requests_by_service.setdefault(values["service"], {})
+                    endpoints[values["endpoint"]] = dict(histogram.summary(), status={})
+            for (name, labels), value in sorted(self.counters.items()):
+                values = dict(labels)
+                if name == "requests_total":
+                    entry = requests_by_service.get(values["service"], {}).get(values["endpoint"])
+                    if entry is not None:
+                        entry["status"][values["status"]] = int(value)
+            tokens: Dict[str, Dict] = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                values = dict(labels)
+                if name == "tokens_total":
+                    tokens.setdefault(values["service"], {})[values["kind"]] = int(value)
+            return {"duration_seconds": round(time.time() - self.started_at, 3),
+                    "phases": phases, "requests": requests_by_service, "tokens": tokens}
+
+    def prometheus(self, **extra_labels) -> str:
+        """Format texte Prometheus (histogrammes et compteurs, libellés communs ajoutés)"""
+
+        def render(labels: Labels, **more) -> str:
+            pairs = list(extra_labels.items()) + list(labels) + list(more.items())
+            inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+            return "{" + inner + "}" if inner else ""
+
+        lines = []
+        with self.lock:
+            for name, help_text in (("phase_seconds", "Durée des phases du run"),
+                                    ("request_seconds", "Latence des requêtes HTTP")):
+                series = [(labels, h) for (n, labels), h in sorted(self.histograms.items()) if n == name]
+                if not series:
+                    continue
+                lines += [f"# HELP martine_{name} {help_text}", f"# TYPE martine_{name} histogram"]
+                for labels, histogram in series:
+                    for bound, cumulated in zip(LATENCY_BUCKETS, histogram.buckets):
+                        lines.append(f"martine_{name}_bucket{render(labels, le=bound)} {cumulated}")
+                    lines.append(f"martine_{name}_bucket{render(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"martine_{name}_sum{render(labels)} {histogram.sum:.6f}")
+                    lines.append(f"martine_{name}_count{render(labels)} {histogram.count}")
+            for name, help_text in (("requests_total", "Requêtes HTTP par service, route et code"),
+                                    ("tokens_total", "Tokens consommés par fournisseur IA (prompt, completion)")):
+                counters = sorted((key, value) for key, value in self.counters.items() if key[0] == name)
+                if not counters:
+                    continue
+                lines += [f"# HELP martine_{name} {help_text}", f"# TYPE martine_{name} counter"]
+                lines += [f"martine_{name}{render(labels)} {int(value)}" for (_, labels), value in counters]
+        lines += ["# HELP martine_last_run_timestamp_seconds Fin du dernier run",
+                  "# TYPE martine_last_run_timestamp_seconds gauge",
+                  f"martine_last_run_timestamp_seconds{render(())} {time.time():.0f}"]
+        return "\n".join(lines) + "\n"
+
+
+# Registre du processus
+_metrics = Metrics()
+# Tokens des appels du thread courant (bloc usage())
+_local = threading.local()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def reset():
+    _metrics.reset()
+
+
+def phase(name: str):
+    return _metrics.phase(name)
+
+
+def request(service: str, endpoint: str):
+    return _metrics.request(service, endpoint)
+
+
+def snapshot() -> Dict:
+    return _metrics.snapshot()
+
+
+def record_tokens(service: str, prompt: int, completion: int):
+    """Tokens d'une réponse du fournisseur IA (registre, et bloc usage() en cours)"""
+    _metrics.inc("tokens_total", prompt, service=service, kind="prompt")
+    _metrics.inc("tokens_total", completion, service=service, kind="completion")
+    current = getattr(_local, "usage", None)
+    if current is not None:
+        current["prompt"] += prompt
+        current["completion"] += completion
+
+
+@contextmanager
+def usage():
+    """Tokens consommés par les appels faits dans le bloc, sur le thread courant"""
+    previous = getattr(_local, "usage", None)
+    _local.usage = {"prompt": 0, "completion": 0}
+    try:
+        yield _local.usage
+    finally:
+        _local.usage = previous
+
+
+def export_textfile(name: str, target: Optional[str] = None) -> Optional[Path]:
+    """
+    Écrit les métriques du run dans METRICS_TEXTFILE_DIR/martine_<name>.prom
+    (écriture atomique, libellés engine et target). Returns: chemin, ou None si non configuré
+    """
+    directory = os.getenv("METRICS_TEXTFILE_DIR", "").strip()
+    if not directory:
+        return None
+    labels = {"engine": name}
+    if target:
+        labels["target"] = target
+    path = Path(directory) / f"martine_{f'{target}_' if target else ''}{name}.prom"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(_metrics.prometheus(**labels), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"⚠️ Métriques non exportées (non critique): {e}")
+        return None
@@ -0,0 +1,330 @@
+"""
+Miroir local des bases Notion pour Martine IA (mode hors ligne)
+`sync` recopie les bases Tâches/Projets et le contenu des pages dans cache/mirror/.
+Avec --offline, les moteurs lisent uniquement ce miroir et leurs écritures partent
+dans une boîte d'envoi locale (outbox.jsonl) ; le `sync` suivant les pousse dans
+Notion, sauf si la page a été modifiée entre-temps (last_edited_time différent)
+"""
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import manifest
+from config import env_number
+from manifest import SYNC_MARGIN, notion_timestamp, settled
+from notion_client import NotionClient
+
+DEFAULT_FETCH_WORKERS = 4
+
+
+def applied_property(value: Dict, previous: Optional[Dict] = None) -> Dict:
+    """
+    Propriété au format lu (query) après une écriture au format envoyé :
+    {"number": 2} -> {"type": "number", "number": 2}
+    """
+    prop_type = next(iter(value))
+    data = value[prop_type]
+    if prop_type in ("rich_text", "title"):
+        data = [dict(item, plain_text=item.get("text", {}).get("content", "")) for item in data]
+    prop = {"type": prop_type, prop_type: data}
+    if previous and previous.get("id"):
+        prop["id"] = previous["id"]
+    return prop
+
+
+class LocalMirror:
+    """Bases (pages + schéma), contenus des pages et boîte d'envoi sur disque"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.databases: Dict[str, Dict] = {}  # database_id -> {"synced_at", "schema", "pages": {id: page}}
+        self.contents: Dict[str, str] = {}
+        self.page_database: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "LocalMirror":
+        """Charge cache/mirror/ (vide si jamais synchronisé)"""
+        mirror = cls(path or manifest.CACHE_DIR / "mirror")
+        for db_path in sorted(mirror.path.glob("db_*.json")):
+            try:
+                with open(db_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Miroir illisible ({db_path.name}), à resynchroniser: {e}")
+                continue
+            mirror.databases[data["database_id"]] = data
+            for page_id in data.get("pages", {}):
+                mirror.page_database[page_id] = data["database_id"]
+        contents_path = mirror.path / "contents.json"
+        if contents_path.exists():
+            try:
+                with open(contents_path, "r", encoding="utf-8") as f:
+                    mirror.contents = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Contenus du miroir illisibles, à resynchroniser: {e}")
+        # Les écritures pas encore poussées restent visibles des runs hors ligne suivants
+        for page_id, known in mirror.outbox().items():
+            mirror.apply_write(page_id, known["properties"])
+        return mirror
+
+    @property
+    def outbox_path(self) -> Path:
+        return self.path / "outbox.jsonl"
+
+    def pages(self, database_id: str) -> Optional[List[Dict]]:
+        """Pages d'une base (None si la base n'a jamais été synchronisée)"""
+        data = self.databases.get(database_id)
+        return list(data["pages"].values()) if data is not None else None
+
+    def page(self, page_id: str) -> Optional[Dict]:
+        database_id = self.page_database.get(page_id)
+        if database_id is None:
+            return None
+        return self.databases[database_id]["pages"].get(page_id)
+
+    def put_page(self, database_id: str, page: Dict):
+        """Ajoute ou remplace une page du miroir"""
+        with self.lock:
+            self.databases[database_id]["pages"][page["id"]] = page
+            self.page_database[page["id"]] = database_id
+
+    def apply_write(self, page_id: str, properties: Dict) -> Optional[Dict]:
+        """Applique une écriture à la page du miroir ; retourne la page modifiée"""
+        with self.lock:
+            page = self.page(page_id)
+            if page is None:
+                return None
+            page = dict(page, properties=dict(page.get("properties", {})))
+            for name, value in properties.items():
+                page["properties"][name] = applied_property(value, page["properties"].get(name))
+            self.databases[self.page_database[page_id]]["pages"][page_id] = page
+            return page
+
+    # --- Boîte d'envoi -------------------------------------------------------
+
+    def queue_write(self, page_id: str, properties: Dict, base_edited_time: Optional[str]):
+        """Consigne une écriture à pousser (ajout seul, forcé sur disque)"""
+        entry = {
+            "id": page_id,
+            "properties": properties,
+            "base": base_edited_time,
+            "at": datetime.now(timezone.utc).isoformat()
+        }
+        with self.lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.outbox_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def outbox(self) -> Dict[str, Dict]:
+        """
+        Écritures en attente regroupées par page (ordre conservé) :
+        {page_id: {"properties": fusion des écritures, "base": version de la 1re écriture}}
+        """
+        pending: Dict[str, Dict] = {}
+        if not self.outbox_path.exists():
+            return pending
+        with open(self.outbox_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # ligne tronquée par un arrêt brutal
+                known = pending.setdefault(entry["id"], {"properties": {}, "base": entry.get("base")})
+                known["properties"].update(entry.get("properties", {}))
+        return pending
+
+    def rewrite_outbox(self, pending: Dict[str, Dict]):
+        """Remplace la boîte d'envoi par les écritures restantes (supprimée si vide)"""
+        with self.lock:
+            if not pending:
+                if self.outbox_path.exists():
+                    self.outbox_path.unlink()
+                return
+            tmp_path = self.outbox_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for page_id, known in pending.items():
+                    entry = {"id": page_id, "properties": known["properties"], "base": known["base"]}
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.outbox_path)
+
+    def save(self):
+        """Écrit le miroir (écritures atomiques)"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        files = {f"db_{database_id.replace('-', '')}.json": data for database_id, data in self.databases.items()}
+        files["contents.json"] = self.contents
+        for name, data in files.items():
+            tmp_path = self.path / f"{name}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path / name)
+
+
+class MirrorNotionClient(NotionClient):
+    """
+    Même interface que NotionClient, sans aucun appel réseau : lectures depuis le
+    miroir local, écritures dans la boîte d'envoi
+    """
+
+    def __init__(self, mirror: LocalMirror, token: str = ""):
+        super().__init__(token)
+        self.mirror = mirror
+        self.queued = 0
+
+    def query_database(self, database_id: str, filter_obj: Optional[Dict] = None, strict: bool = False) -> List[Dict]:
+        """Pages du miroir ; seuls les filtres last_edited_time et relation vide sont servis"""
+        pages = self.mirror.pages(database_id)
+        if pages is None:
+            raise RuntimeError(f"Base {database_id} absente du miroir (lancez: python src/martine.py sync)")
+        if filter_obj is None:
+            return pages
+        if filter_obj.get("timestamp") == "last_edited_time":
+            since = filter_obj.get("last_edited_time", {}).get("on_or_after") or ""
+            return [p for p in pages if (p.get("last_edited_time") or "") >= since]
+        if filter_obj.get("relation", {}).get("is_empty"):
+            prop_name = filter_obj.get("property")
+            return [p for p in pages if not p.get("properties", {}).get(prop_name, {}).get("relation")]
+        raise RuntimeError(f"Filtre non disponible hors ligne: {filter_obj}")
+
+    def get_relation_ids(self, page: Dict, prop_name: str) -> List[str]:
+        """Relations complètes (résolues pendant la synchro)"""
+        prop = page.get("properties", {}).get(prop_name, {})
+        return [rel.get("id") for rel in prop.get("relation", [])]
+
+    def get_page(self, page_id: str) -> Optional[Dict]:
+        return self.mirror.page(page_id)
+
+    def get_page_content(self, page_id: str) -> str:
+        return self.mirror.contents.get(page_id, "")
+
+    def get_database_schema(self, database_id: str) -> Dict:
+        data = self.mirror.databases.get(database_id)
+        return data.get("schema", {}) if data else {}
+
+    def add_property_to_database(self, database_id: str, prop_name: str, prop_config: Dict) -> bool:
+        print(f"⚠️ Hors ligne : colonne '{prop_name}' à créer dans Notion puis `sync`")
+        return False
+
+    def patch_page(self, page_id: str, properties: Dict) -> Optional[Dict]:
+        """Écriture différée : boîte d'envoi + miroir mis à jour (version Notion inchangée)"""
+        base = (self.mirror.page(page_id) or {}).get("last_edited_time")
+        page = self.mirror.apply_write(page_id, properties)
+        if page is None:
+            print(f"❌ Page {page_id} absente du miroir")
+            return None
+        self.mirror.queue_write(page_id, properties, base)
+        self.queued += 1
+        return page
+
+    def create_page(self, database_id: str, properties: Dict) -> Optional[str]:
+        raise RuntimeError("Création de page impossible hors ligne")
+
+    def create_database(self, parent_page_id: str, title: str, properties: Dict) -> Optional[str]:
+        raise RuntimeError("Création de base impossible hors ligne")
+
+
+def _resolve_relations(notion: NotionClient, page: Dict):
+    """Remplace les relations tronquées (> 25 éléments) par la liste complète"""
+    for name, prop in page.get("properties", {}).items():
+        if prop.get("type") == "relation" and prop.get("has_more"):
+            ids = notion.get_relation_ids(page, name)
+            prop["relation"] = [{"id": page_id} for page_id in ids]
+            prop["has_more"] = False
+
+
+def pull(notion: NotionClient, mirror: LocalMirror, database_ids: List[str], full: bool = False) -> Dict:
+    """
+    Met le miroir à jour : base complète la première fois (ou full=True), puis
+    seulement les pages modifiées depuis la synchro précédente (+ leur contenu).
+    Returns: {"pages": pages relues, "contents": contenus relus, "removed": pages supprimées}
+    """
+    stats = {"pages": 0, "contents": 0, "removed": 0}
+    to_fetch: List[str] = []
+    for database_id in database_ids:
+        started = datetime.now(timezone.utc)
+        data = mirror.databases.get(database_id)
+        previous = dict(data["pages"]) if data else {}
+        if data is None or full:
+            print(f"   📥 Copie complète de la base {database_id}...")
+            pages = notion.query_database(database_id, strict=True)
+            data = {"database_id": database_id, "pages": {}}
+            mirror.databases[database_id] = data
+            for page_id in set(previous) - {page.get("id") for page in pages}:
+                mirror.page_database.pop(page_id, None)
+                mirror.contents.pop(page_id, None)
+                stats["removed"] += 1
+        else:
+            filter_obj = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": data["synced_at"]}}
+            pages = notion.query_database(database_id, filter_obj, strict=True)
+            print(f"   📥 Base {database_id}: {len(pages)} page(s) modifiée(s)")
+        data["schema"] = notion.get_database_schema(database_id) or data.get("schema", {})
+
+        for page in pages:
+            known = previous.get(page.get("id"))
+            _resolve_relations(notion, page)
+            mirror.put_page(database_id, page)
+            stats["pages"] += 1
+            # Même last_edited_time mais récent (arrondi à la minute) : le contenu a pu changer
+            if known is None or known.get("last_edited_time") != page.get("last_edited_time") \
+                    or not settled(page.get("last_edited_time"), started) \
+                    or page.get("id") not in mirror.contents:
+                to_fetch.append(page.get("id"))
+        data["synced_at"] = notion_timestamp(started - SYNC_MARGIN)
+
+    workers = int(env_number("MIRROR_FETCH_WORKERS", DEFAULT_FETCH_WORKERS))
+    if to_fetch:
+        print(f"   📄 Lecture du contenu de {len(to_fetch)} page(s)...")
+
+    def fetch(page_id: str):
+        content = notion.get_page_content(page_id)
+        with mirror.lock:
+            mirror.contents[page_id] = content
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(fetch, to_fetch))
+    stats["contents"] = len(to_fetch)
+    return stats
+
+
+def push(notion: NotionClient, mirror: LocalMirror) -> Dict:
+    """
+    Pousse la boîte d'envoi (après pull : le miroir connaît la version Notion).
+    Une page modifiée dans Notion depuis l'écriture locale est un conflit : l'écriture
+    est abandonnée et la page sera réestimée au prochain run (hash source différent).
+    Returns: {"pushed", "conflicts", "failed"}
+    """
+    pending = mirror.outbox()
+    stats = {"pushed": 0, "conflicts": 0, "failed": 0}
+    remaining: Dict[str, Dict] = {}
+    for page_id, known in pending.items():
+        current = mirror.page(page_id)
+        if current is None or current.get("last_edited_time") != known["base"]:
+            stats["conflicts"] += 1
+            print(f"   ⚠️ Conflit: {page_id} modifiée dans Notion depuis l'estimation, écriture abandonnée")
+            continue
+        page = notion.patch_page(page_id, known["properties"])
+        if page is None:
+            stats["failed"] += 1
+            remaining[page_id] = known
+            continue
+        mirror.put_page(mirror.page_database[page_id], page)
+        stats["pushed"] += 1
+    mirror.rewrite_outbox(remaining)
+    return stats
+
+
+def sync(notion: NotionClient, database_ids: List[str], full: bool = False,
+         mirror: Optional[LocalMirror] = None) -> Dict:
+    """Synchro complète : miroir à jour puis boîte d'envoi poussée"""
+    mirror = mirror or LocalMirror.load()
+    database_ids = [db for db in database_ids if db]
+    stats = pull(notion, mirror, database_ids, full)
+    stats.update(push(notion, mirror))
+    mirror.save()
+    return stats
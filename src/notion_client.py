@@ -4,21 +4,67 @@ Gère toutes les interactions avec l'API Notion
 """
 import requests
 import os
+import time
 from typing import Dict, List, Optional
 from datetime import datetime
 
+import metrics
+
+DEFAULT_BASE_URL = "https://api.notion.com/v1"
+MAX_RATE_LIMIT_RETRIES = 3
+
+
 class NotionClient:
-    def __init__(self, token: str):
+    def __init__(self, token: str, limiter=None, base_url: Optional[str] = None):
+        """
+        limiter: seau à jetons optionnel (acquire() avant chaque requête), partagé par
+        les clients d'un même jeton Notion
+        base_url: API compatible Notion (ex: serveur de benchmark local)
+        """
         self.token = token
+        self.limiter = limiter
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
             "Notion-Version": "2022-06-28"
         }
-        self.base_url = "https://api.notion.com/v1"
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Requête HTTP vers l'API (attend un jeton du limiteur s'il y en a un).
+        Une réponse 429 (limite de débit) est rejouée après le délai Retry-After.
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            with metrics.request("notion", self.endpoint_name(method, url)) as call:
+                response = requests.request(method, url, headers=self.headers, **kwargs)
+                call.status = response.status_code
+            if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+            try:
+                wait = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                wait = 2.0 ** attempt
+            time.sleep(wait)
+        return response
+    
+    def endpoint_name(self, method: str, url: str) -> str:
+        """Route de l'API pour les métriques (ex: "databases.query", "pages.update")"""
+        parts = url[len(self.base_url):].split("?")[0].strip("/").split("/")
+        resource = parts[0]
+        if len(parts) == 1:
+            return f"{resource}.create"
+        if len(parts) >= 3:
+            return f"{resource}.{parts[2]}"
+        return f"{resource}.update" if method == "PATCH" else f"{resource}.retrieve"
     
-    def query_database(self, database_id: str, filter_obj: Optional[Dict] = None) -> List[Dict]:
-        """Récupère toutes les pages d'une database"""
+    def query_database(self, database_id: str, filter_obj: Optional[Dict] = None, strict: bool = False) -> List[Dict]:
+        """
+        Récupère toutes les pages d'une database
+        strict: lève RuntimeError en cas d'erreur au lieu de renvoyer un résultat partiel
+        """
         url = f"{self.base_url}/databases/{database_id}/query"
         all_results = []
         has_more = True
@@ -31,10 +77,12 @@ class NotionClient:
             if start_cursor:
                 payload["start_cursor"] = start_cursor
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self._request("POST", url, json=payload)
             
             if response.status_code != 200:
                 print(f"❌ Erreur query DB {database_id}: {response.text}")
+                if strict:
+                    raise RuntimeError(f"Query DB {database_id} incomplète ({response.status_code})")
                 break
             
             data = response.json()
@@ -102,18 +150,66 @@ class NotionClient:
         
         return None
     
+    def get_relation_ids(self, page: Dict, prop_name: str) -> List[str]:
+        """
+        Ids complets d'une relation : les résultats de query sont tronqués à 25 éléments
+        ("has_more"), on lit alors la propriété paginée de la page.
+        """
+        prop = page.get("properties", {}).get(prop_name, {})
+        ids = [rel.get("id") for rel in prop.get("relation", [])]
+        if not prop.get("has_more"):
+            return ids
+        
+        url = f"{self.base_url}/pages/{page.get('id')}/properties/{prop.get('id')}"
+        all_ids = []
+        has_more = True
+        start_cursor = None
+        
+        while has_more:
+            params = {"page_size": 100}
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            
+            response = self._request("GET", url, params=params)
+            
+            if response.status_code != 200:
+                print(f"❌ Erreur get relation '{prop_name}': {response.text}")
+                return ids
+            
+            data = response.json()
+            all_ids.extend(item.get("relation", {}).get("id") for item in data.get("results", []))
+            has_more = data.get("has_more", False)
+            start_cursor = data.get("next_cursor")
+        
+        return all_ids
+    
+    def get_page(self, page_id: str) -> Optional[Dict]:
+        """Récupère une page (propriétés) par son id"""
+        url = f"{self.base_url}/pages/{page_id}"
+        response = self._request("GET", url)
+        
+        if response.status_code != 200:
+            print(f"❌ Erreur get page {page_id}: {response.text}")
+            return None
+        
+        return response.json()
+    
     def update_page(self, page_id: str, properties: Dict) -> bool:
         """Met à jour les propriétés d'une page"""
+        return self.patch_page(page_id, properties) is not None
+    
+    def patch_page(self, page_id: str, properties: Dict) -> Optional[Dict]:
+        """Met à jour les propriétés d'une page et renvoie la page modifiée (ou None)"""
         url = f"{self.base_url}/pages/{page_id}"
         payload = {"properties": properties}
         
-        response = requests.patch(url, headers=self.headers, json=payload)
+        response = self._request("PATCH", url, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur update page {page_id}: {response.text}")
-            return False
+            return None
         
-        return True
+        return response.json()
     
     def create_page(self, database_id: str, properties: Dict) -> Optional[str]:
         """Crée une nouvelle page dans une database"""
@@ -123,7 +219,7 @@ class NotionClient:
             "properties": properties
         }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self._request("POST", url, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur create page: {response.text}")
@@ -141,7 +237,7 @@ class NotionClient:
             "properties": properties
         }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = self._request("POST", url, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur create DB: {response.text}")
@@ -153,7 +249,7 @@ class NotionClient:
     def get_database_schema(self, database_id: str) -> Dict:
         """Récupère le schéma d'une database (colonnes existantes)"""
         url = f"{self.base_url}/databases/{database_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self._request("GET", url)
         
         if response.status_code != 200:
             print(f"❌ Erreur get schema: {response.text}")
@@ -170,7 +266,7 @@ class NotionClient:
             }
         }
         
-        response = requests.patch(url, headers=self.headers, json=payload)
+        response = self._request("PATCH", url, json=payload)
         
         if response.status_code != 200:
             print(f"❌ Erreur add property '{prop_name}': {response.text}")
@@ -191,7 +287,7 @@ class NotionClient:
             if start_cursor:
                 params["start_cursor"] = start_cursor
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._request("GET", url, params=params)
             
             if response.status_code != 200:
                 print(f"❌ Erreur get blocks {page_id}: {response.text}")
@@ -206,7 +302,11 @@ class NotionClient:
 
     def get_page_content(self, page_id: str) -> str:
         """Récupère tout le texte lisible d'une page"""
-        blocks = self.get_page_blocks(page_id)
+        return self.blocks_to_text(self.get_page_blocks(page_id))
+
+    @staticmethod
+    def blocks_to_text(blocks: List[Dict]) -> str:
+        """Texte lisible de blocs (titres et listes préfixés pour garder la structure)"""
         content_lines = []
         
         for block in blocks:
@@ -0,0 +1,147 @@
+"""
+Pipeline par étapes pour Martine IA
+Chaque étape a ses propres workers et une file d'entrée bornée : une étape lente
+freine les précédentes (contre-pression) au lieu d'accumuler du travail en mémoire,
+et les attentes réseau des différentes étapes se recouvrent
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_QUEUE_SIZE = 8
+
+# Marqueur de fin de flux
+_DONE = object()
+
+
+class Tally:
+    """Compteurs thread-safe (statistiques partagées entre workers)"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def add(self, key: str, count: int = 1):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def get(self, key: str) -> int:
+        with self.lock:
+            return self.counts.get(key, 0)
+
+
+class Stage:
+    """
+    Étape du pipeline : func(item) -> item suivant, ou None pour l'écarter.
+    workers: nombre de traitements simultanés de l'étape
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def stats(self) -> Dict:
+        """Statistiques de l'étape (pour le log)"""
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 2)
+        }
+
+
+class Pipeline:
+    """
+    Enchaîne des étapes reliées par des files bornées.
+    Usage:
+        pipeline = Pipeline([Stage("fetch", fetch, 4), Stage("write", write, 2)])
+        results = pipeline.run(items)
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.elapsed = 0.0
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: List[int]):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                # Les autres workers de l'étape doivent aussi voir la fin du flux
+                inbox.put(_DONE)
+                with stage.lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    outbox.put(_DONE)
+                return
+
+            started = time.monotonic()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"   ⚠️ Étape {stage.name}: {e}")
+                result = None
+                with stage.lock:
+                    stage.errors += 1
+            with stage.lock:
+                stage.busy_seconds += time.monotonic() - started
+                stage.processed += 1
+                if result is None:
+                    stage.dropped += 1
+            if result is not None:
+                outbox.put(result)
+
+    def _feed(self, items: Iterable, inbox: queue.Queue):
+        for item in items:
+            inbox.put(item)
+        inbox.put(_DONE)
+
+    def run(self, items: Iterable, on_result: Optional[Callable] = None) -> List:
+        """
+        Fait passer les items dans toutes les étapes.
+        on_result: appelé (dans le thread appelant) pour chaque sortie de la dernière étape
+        Returns: sorties de la dernière étape (ordre d'arrivée)
+        """
+        started = time.monotonic()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[index], queues[index + 1], remaining),
+                    daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            result = queues[-1].get()
+            if result is _DONE:
+                break
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.monotonic() - started
+        return results
+
+    def stats(self) -> Dict:
+        """Statistiques par étape et durée totale"""
+        return {
+            "elapsed_seconds": round(self.elapsed, 2),
+            "stages": {stage.name: stage.stats() for stage in self.stages}
+        }
@@ -0,0 +1,192 @@
+"""
+Profilage d'un run de Martine IA (option --profile)
+  - cProfile du thread principal : rapports triés par temps cumulé et par temps propre,
+    plus le profil brut (profile.prof, lisible par pstats ou snakeviz)
+  - tracemalloc : instantané à chaque frontière de phase (mark), mémoire courante et pic,
+    principaux sites d'allocation et écart avec la frontière précédente (les instantanés
+    sont gardés jusqu'à la fin du run, où les rapports sont calculés)
+  - échantillonnage optionnel de tous les threads (--profile-sample MS) : piles
+    relevées à intervalle fixe, utile quand le travail est fait par des workers
+    (pipeline des projets, modes concurrents) que cProfile ne voit pas
+Les rapports sont écrits dans logs/profile_<nom>_<horodatage>/.
+"""
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
+# Lignes des rapports
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 15
+TOP_SAMPLES = 30
+# Profondeur des piles mémorisées par tracemalloc
+TRACEMALLOC_FRAMES = 1
+
+# Session active (les moteurs y marquent leurs frontières de phase)
+_active = None
+
+
+def mark(label: str):
+    """Frontière de phase : instantané mémoire si un profilage est en cours (sinon rien)"""
+    if _active is not None:
+        _active.mark(label)
+
+
+def top_sites(stats: list) -> list:
+    """Principaux sites d'allocation, hors mesure elle-même (tracemalloc, profilage, imports)"""
+    ignored = (tracemalloc.__file__, __file__, "<frozen importlib")
+    return [stat for stat in stats
+            if not stat.traceback[0].filename.startswith(ignored)][:TOP_ALLOCATIONS]
+
+
+class ThreadSampler:
+    """Relève périodiquement la pile de chaque thread (échantillonnage en temps réel)"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.leaves: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                thread = names.get(ident, str(ident))
+                self.leaves[(thread, stack[0])] += 1
+                self.stacks[";".join([thread] + [entry.split(" (")[0] for entry in reversed(stack)])] += 1
+            self.samples += 1
+
+    def write(self, directory: Path):
+        """samples.txt (fonctions en cours par thread) et samples.folded (format flamegraph)"""
+        lines = [f"{self.samples} relevés toutes les {self.interval * 1000:.0f} ms", ""]
+        per_thread = Counter()
+        for (thread, _), count in self.leaves.items():
+            per_thread[thread] += count
+        lines.append("Relevés par thread :")
+        lines += [f"  {count:>7}  {thread}" for thread, count in per_thread.most_common()]
+        lines += ["", f"Fonctions en cours d'exécution (top {TOP_SAMPLES}) :"]
+        lines += [f"  {count:>7}  [{thread}] {leaf}" for (thread, leaf), count in self.leaves.most_common(TOP_SAMPLES)]
+        (directory / "samples.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        (directory / "samples.folded").write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()), encoding="utf-8")
+
+
+class RunProfiler:
+    """Session de profilage : cProfile + tracemalloc (+ échantillonnage des threads)"""
+
+    def __init__(self, name: str, sample_ms: float = 0):
+        self.name = name
+        self.directory = LOG_DIR / f"profile_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.profile = cProfile.Profile()
+        self.sampler = ThreadSampler(sample_ms / 1000) if sample_ms and sample_ms > 0 else None
+        self.marks: List[Tuple] = []
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.sampler is not None:
+            self.sampler.start()
+        self.profile.enable()
+
+    def mark(self, label: str):
+        """
+        Instantané mémoire à une frontière de phase. Seule la capture a lieu ici : le
+        rapport est calculé à la fin du run, pour ne pas fausser le profil CPU
+        """
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        elapsed = time.perf_counter() - self._started
+        self.marks.append((label, elapsed, current, peak, tracemalloc.take_snapshot()))
+
+    def memory_report(self) -> str:
+        """Mémoire courante et pic à chaque frontière, principaux sites d'allocation et écarts"""
+        lines = []
+        previous = None
+        for label, elapsed, current, peak, snapshot in self.marks:
+            lines.append(f"=== {label} (t={elapsed:.1f}s) : courant {current / 1e6:.1f} Mo, pic {peak / 1e6:.1f} Mo")
+            lines += [f"  {stat}" for stat in top_sites(snapshot.statistics("lineno"))]
+            if previous is not None:
+                lines.append("  --- écart avec la frontière précédente :")
+                lines += [f"  {stat}" for stat in top_sites(snapshot.compare_to(previous, "lineno"))]
+            lines.append("")
+            previous = snapshot
+        return "\n".join(lines)
+
+    def stop(self) -> Path:
+        """Arrête les mesures et écrit les rapports ; retourne le dossier"""
+        self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.mark("fin")
+        tracemalloc.stop()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(str(self.directory / "profile.prof"))
+        for sort_key, filename in (("cumulative", "cprofile_cumulative.txt"), ("tottime", "cprofile_tottime.txt")):
+            with open(self.directory / filename, "w", encoding="utf-8") as f:
+                pstats.Stats(self.profile, stream=f).sort_stats(sort_key).print_stats(TOP_FUNCTIONS)
+        (self.directory / "memory.txt").write_text(self.memory_report(), encoding="utf-8")
+        if self.sampler is not None:
+            self.sampler.write(self.directory)
+        return self.directory
+
+
+@contextmanager
+def session(name: str, enabled: bool = True, sample_ms: float = 0):
+    """
+    Profile le bloc si enabled (sinon ne fait rien).
+    sample_ms: intervalle d'échantillonnage des threads, 0 = désactivé
+    """
+    global _active
+    if not enabled:
+        yield None
+        return
+    profiler = RunProfiler(name, sample_ms)
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _active = None
+        try:
+            directory = profiler.stop()
+            print(f"📈 Profil écrit: {directory}")
+        except Exception as e:
+            print(f"⚠️ Profil non écrit (non critique): {e}")
+
+
+def add_arguments(parser):
+    """Options --profile et --profile-sample d'un point d'entrée"""
+    parser.add_argument("--profile", action="store_true",
+                        help="profile le run (cProfile, tracemalloc) ; rapports dans logs/profile_*")
+    parser.add_argument("--profile-sample", type=float, default=0, metavar="MS",
+                        help="avec --profile : échantillonne aussi les piles de tous les threads toutes les MS ms")
@@ -0,0 +1,173 @@
+"""
+Journal d'événements des runs de Martine IA
+Fichier JSONL en ajout seul (logs/runs_<moteur>[_<cible>].jsonl) : une ligne par
+décision, écrite au moment où elle est prise. Événements :
+  - run_start : moteur, base, cible, shard, mode debug
+  - skip : page écartée et son motif (parent, type, inchangée, budget, non estimée...)
+  - estimate : estimation obtenue (minutes, heures écrites, origine : IA, journal, doublon)
+  - write : résultat de l'écriture Notion et sa durée
+  - run_end : résumé, métriques du run (ou erreur), écrit même si le run échoue
+Chaque ligne porte l'identifiant du run et le temps écoulé depuis son début. Le coût
+est constant par décision (aucun log reconstruit en fin de run) et rien n'est perdu
+en cas d'arrêt brutal. Au-delà de RUN_LOG_MAX_MB, le fichier est archivé en .1, .2...
+(RUN_LOG_BACKUPS archives gardées) et un nouveau commence.
+tools/runs.py résume les runs passés et retrouve les décisions d'une page.
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config import env_number
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
+DEFAULT_MAX_MB = 50
+DEFAULT_BACKUPS = 5
+
+
+def log_path(engine: str, target: Optional[str] = None, suffix: str = "") -> Path:
+    """Fichier du journal d'un moteur (une cible ou un shard a le sien)"""
+    return LOG_DIR / f"runs_{f'{target}_' if target else ''}{engine}{suffix}.jsonl"
+
+
+class RunLog:
+    """Journal d'un run : une ligne JSON par événement, ajoutée et vidée immédiatement"""
+
+    def __init__(self, path: Path, run_id: Optional[str] = None, max_bytes: Optional[int] = None,
+                 backups: Optional[int] = None):
+        self.path = Path(path)
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}_{os.getpid()}"
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(env_number("RUN_LOG_MAX_MB", DEFAULT_MAX_MB) * 1024 * 1024)
+        self.backups = backups if backups is not None else int(env_number("RUN_LOG_BACKUPS", DEFAULT_BACKUPS))
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self._file = None
+        self._size = 0
+        self._broken = False
+
+    @classmethod
+    def open(cls, engine: str, target: Optional[str] = None, suffix: str = "") -> "RunLog":
+        return cls(log_path(engine, target, suffix))
+
+    def emit(self, event: str, **fields):
+        """Ajoute un événement (non critique : un échec d'écriture n'interrompt pas le run)"""
+        entry = {"run": self.run_id, "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                 "elapsed": round(time.perf_counter() - self.started, 3), "event": event}
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            if self._broken:
+                return
+            try:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                    self._size = self._file.tell()
+                size = len(line.encode("utf-8"))
+                if self._size and self._size + size > self.max_bytes:
+                    self._rotate()
+                self._file.write(line)
+                self._file.flush()
+                self._size += size
+            except Exception as e:
+                self._broken = True
+                print(f"⚠️ Journal des runs désactivé (non critique): {e}")
+
+    def _rotate(self):
+        """Archive le fichier courant (.1 le plus récent) et en ouvre un nouveau"""
+        self._file.close()
+        self._file = None
+        if self.backups > 0:
+            for index in range(self.backups, 0, -1):
+                source = self.path.with_name(f"{self.path.name}.{index - 1}") if index > 1 else self.path
+                if source.exists():
+                    os.replace(source, self.path.with_name(f"{self.path.name}.{index}"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+
+class NullRunLog:
+    """Journal qui n'écrit rien (fonctions appelées hors d'un run)"""
+
+    run_id = None
+
+    def emit(self, event: str, **fields):
+        pass
+
+    def close(self):
+        pass
+
+
+# --- Lecture des runs passés ---------------------------------------------------
+
+def log_files(pattern: str = "runs_*.jsonl") -> List[Path]:
+    """Journaux et leurs archives, du plus ancien au plus récent pour chaque journal"""
+    files = []
+    for path in sorted(LOG_DIR.glob(pattern)):
+        archives = sorted(LOG_DIR.glob(f"{path.name}.*"),
+                          key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0, reverse=True)
+        files += [archive for archive in archives if archive.suffix[1:].isdigit()] + [path]
+    return files
+
+
+def read_events(paths: List[Path]) -> Iterator[Dict]:
+    """Événements des fichiers donnés (lignes illisibles ou tronquées ignorées)"""
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+
+
+def summarize_runs(events: Iterator[Dict]) -> List[Dict]:
+    """
+    Un résumé par run (ordre de début) : bornes, décompte des événements,
+    motifs d'écart, écritures réussies/échouées, résumé et erreur de fin de run.
+    Un run sans run_end s'est arrêté brutalement (complete=False).
+    """
+    runs: Dict[str, Dict] = {}
+    for entry in events:
+        run_id = entry.get("run")
+        run = runs.get(run_id)
+        if run is None:
+            run = runs[run_id] = {"run": run_id, "engine": None, "target": None, "started": entry.get("at"),
+                                  "ended": None, "elapsed": 0.0, "complete": False, "events": {},
+                                  "skips": {}, "writes_ok": 0, "writes_failed": 0, "summary": None, "error": None}
+        event = entry.get("event")
+        run["events"][event] = run["events"].get(event, 0) + 1
+        run["elapsed"] = max(run["elapsed"], entry.get("elapsed") or 0.0)
+        if event == "run_start":
+            run["engine"] = entry.get("engine")
+            run["target"] = entry.get("target")
+            run["started"] = entry.get("at")
+        elif event == "skip":
+            reason = entry.get("reason")
+            run["skips"][reason] = run["skips"].get(reason, 0) + 1
+        elif event == "write":
+            run["writes_ok" if entry.get("ok") else "writes_failed"] += 1
+        elif event == "run_end":
+            run["complete"] = True
+            run["ended"] = entry.get("at")
+            run["summary"] = entry.get("summary")
+            run["error"] = entry.get("error")
+    return sorted(runs.values(), key=lambda run: run["started"] or "")
@@ -0,0 +1,187 @@
+"""
+Ordonnanceur de travail pour Martine IA
+Trie les candidats par valeur (Priorité, Statut, première estimation, ancienneté)
+et arrête proprement le traitement à une échéance (budget temps / nombre d'appels)
+"""
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Poids des critères de score (plus le score est haut, plus l'item passe tôt)
+WEIGHT_PRIORITE = 10.0
+WEIGHT_STATUT = 8.0
+WEIGHT_INITIAL = 6.0
+WEIGHT_FORCAGE = 4.0
+WEIGHT_STALENESS = 3.0
+
+# Ancienneté maximale prise en compte (au-delà, bonus plafonné)
+STALENESS_CAP_DAYS = 30
+
+# Mots-clés reconnus dans la propriété "Priorité" (comparaison en minuscules)
+PRIORITE_KEYWORDS = [
+    (("urgent", "critique", "p0"), 1.0),
+    (("haute", "high", "p1", "🔴"), 0.75),
+    (("moyenne", "normale", "medium", "p2", "🟠", "🟡"), 0.5),
+    (("basse", "faible", "low", "p3", "🟢"), 0.25),
+]
+
+# Statuts reconnus (comparaison en minuscules), "En cours" en premier
+STATUT_SCORES = {
+    "en cours": 1.0,
+    "à faire": 0.5,
+    "a faire": 0.5,
+    "pas commencé": 0.5,
+    "en attente": 0.25,
+    "terminé": 0.0,
+    "fait": 0.0,
+}
+
+
+def _normalize_select(value) -> str:
+    """Ramène une valeur select / multi-select / texte à une chaîne minuscule"""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        value = " ".join(str(v) for v in value if v)
+    return str(value).strip().lower()
+
+
+def read_choice(page: Dict, prop_name: str):
+    """
+    Lit une propriété de choix (select, status ou multi-select) d'une page.
+    Le type "status" n'est pas géré par NotionClient.get_property_value.
+    """
+    prop = page.get("properties", {}).get(prop_name, {})
+    prop_type = prop.get("type")
+    if prop_type in ("select", "status"):
+        choice = prop.get(prop_type)
+        return choice.get("name") if choice else None
+    if prop_type == "multi_select":
+        return [item.get("name") for item in prop.get("multi_select", [])]
+    if prop_type == "rich_text":
+        texts = prop.get("rich_text", [])
+        return texts[0].get("plain_text", "") if texts else None
+    if prop_type == "number":
+        return prop.get("number")
+    return None
+
+
+def priorite_score(value) -> float:
+    """Score 0..1 d'une valeur de la propriété Priorité"""
+    text = _normalize_select(value)
+    if not text:
+        return 0.0
+    for keywords, score in PRIORITE_KEYWORDS:
+        if any(k in text for k in keywords):
+            return score
+    # Priorité numérique (1 = la plus haute)
+    try:
+        rank = float(text)
+        return max(0.0, 1.0 - (rank - 1) * 0.25)
+    except ValueError:
+        return 0.0
+
+
+def statut_score(value) -> float:
+    """Score 0..1 d'une valeur de la propriété Statut"""
+    text = _normalize_select(value)
+    return STATUT_SCORES.get(text, 0.0)
+
+
+def staleness_days(last_edited_time: Optional[str], now: Optional[datetime] = None) -> float:
+    """Nombre de jours écoulés depuis la dernière modification de la page"""
+    if not last_edited_time:
+        return 0.0
+    try:
+        edited = datetime.fromisoformat(last_edited_time.replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (now - edited).total_seconds() / 86400)
+
+
+def score_item(item: Dict, now: Optional[datetime] = None) -> float:
+    """
+    Calcule le score de valeur d'un candidat (tâche ou projet).
+    Champs lus: priorite, statut, is_initial, reason, action, last_edited_time
+    """
+    # Les actions sans appel IA (ex: CLEAR) sont gratuites : on les passe en tête
+    if item.get("action", "ESTIMATE") != "ESTIMATE":
+        return float("inf")
+
+    score = WEIGHT_PRIORITE * priorite_score(item.get("priorite"))
+    score += WEIGHT_STATUT * statut_score(item.get("statut"))
+
+    if item.get("is_initial", True):
+        score += WEIGHT_INITIAL
+    elif "forçage" in (item.get("reason") or "").lower():
+        score += WEIGHT_FORCAGE
+
+    days = min(staleness_days(item.get("last_edited_time"), now), STALENESS_CAP_DAYS)
+    score += WEIGHT_STALENESS * days / STALENESS_CAP_DAYS
+    return score
+
+
+def schedule_work(items: List[Dict], max_items: Optional[int] = None) -> List[Dict]:
+    """
+    Ordonne les candidats par score décroissant (tri stable : à score égal,
+    l'ordre de la requête Notion est conservé) et applique le budget d'appels.
+    """
+    now = datetime.now(timezone.utc)
+    ordered = sorted(items, key=lambda item: score_item(item, now), reverse=True)
+
+    if max_items is not None and max_items >= 0:
+        free = [i for i in ordered if i.get("action", "ESTIMATE") != "ESTIMATE"]
+        paid = [i for i in ordered if i.get("action", "ESTIMATE") == "ESTIMATE"]
+        if len(paid) > max_items:
+            print(f"   ✂️  Budget: {max_items} estimations max, {len(paid) - max_items} reportées")
+        ordered = free + paid[:max_items]
+
+    return ordered
+
+
+class Deadline:
+    """Échéance d'exécution (horloge murale) ; None = pas de limite"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> "Deadline":
+        """Construit l'échéance depuis RUN_BUDGET_MINUTES (.env)"""
+        raw = os.getenv("RUN_BUDGET_MINUTES", "").strip()
+        try:
+            minutes = float(raw) if raw else None
+        except ValueError:
+            print(f"⚠️ RUN_BUDGET_MINUTES invalide ({raw}), pas de limite de temps")
+            minutes = None
+        return cls(minutes * 60 if minutes else None)
+
+    def remaining(self) -> Optional[float]:
+        """Secondes restantes avant l'échéance (None si pas de limite)"""
+        if self.seconds is None:
+            return None
+        return self.seconds - (time.monotonic() - self.started_at)
+
+    def expired(self) -> bool:
+        """True si l'échéance est atteinte"""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def revoked(self) -> bool:
+        """True si le travail n'appartient plus à ce worker (plus aucune écriture)"""
+        return False
+
+
+def max_items_from_env() -> Optional[int]:
+    """Budget d'appels IA par exécution depuis RUN_MAX_ESTIMATES (.env)"""
+    raw = os.getenv("RUN_MAX_ESTIMATES", "").strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        print(f"⚠️ RUN_MAX_ESTIMATES invalide ({raw}), pas de limite d'appels")
+        return None
@@ -0,0 +1,156 @@
+"""
+Client Notion avec snapshot partagé pour Martine IA
+Même interface que NotionClient, mais chaque base n'est lue qu'une fois par
+processus : les requêtes suivantes, les lectures de pages et les écritures
+passent par le snapshot en mémoire, partagé entre les moteurs
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from manifest import settled
+from notion_client import NotionClient
+
+
+class SnapshotNotionClient(NotionClient):
+    """NotionClient dont les lectures de bases/pages sont mises en cache"""
+
+    def __init__(self, token: str, limiter=None, base_url: Optional[str] = None):
+        super().__init__(token, limiter, base_url)
+        self._databases: Dict[str, List[Dict]] = {}
+        self._pages: Dict[str, Dict] = {}
+        self._page_database: Dict[str, str] = {}
+        self._contents: Dict[str, str] = {}
+
+    def _store(self, database_id: str, pages: List[Dict]):
+        """Enregistre le snapshot d'une base"""
+        self._databases[database_id] = pages
+        for page in pages:
+            self._pages[page.get("id")] = page
+            self._page_database[page.get("id")] = database_id
+
+    def _database_key(self, database_id: Optional[str]) -> Optional[str]:
+        """Id de base tel que chargé (Notion renvoie les ids avec tirets, le .env souvent sans)"""
+        if not database_id or database_id in self._databases:
+            return database_id
+        compact = database_id.replace("-", "")
+        return next((db for db in self._databases if db.replace("-", "") == compact), database_id)
+
+    @staticmethod
+    def _edited_since(filter_obj: Optional[Dict]) -> Optional[str]:
+        """Date d'un filtre 'last_edited_time on_or_after' (seul filtre servi localement)"""
+        if not filter_obj or filter_obj.get("timestamp") != "last_edited_time":
+            return None
+        return filter_obj.get("last_edited_time", {}).get("on_or_after")
+
+    def query_database(self, database_id: str, filter_obj: Optional[Dict] = None, strict: bool = False) -> List[Dict]:
+        """Base complète depuis le snapshot (chargée au premier appel)"""
+        if filter_obj is None:
+            if database_id not in self._databases:
+                self._store(database_id, super().query_database(database_id, None, strict))
+            return list(self._databases[database_id])
+
+        since = self._edited_since(filter_obj)
+        if since and database_id in self._databases:
+            # Les horodatages ISO de Notion se comparent comme des chaînes
+            return [p for p in self._databases[database_id] if (p.get("last_edited_time") or "") >= since]
+
+        return super().query_database(database_id, filter_obj, strict)
+
+    def pull_changes(self, database_id: str, since: str) -> List[Dict]:
+        """
+        Relit dans Notion les pages modifiées depuis `since` et les applique au snapshot.
+        Les pages dont le snapshot connaît déjà la version (ex: nos propres écritures)
+        sont ignorées. Returns: pages réellement modifiées
+        """
+        if database_id not in self._databases:
+            return self.query_database(database_id, strict=True)
+
+        filter_obj = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+        fetched_at = datetime.now(timezone.utc)
+        changed = []
+        for page in super().query_database(database_id, filter_obj, strict=True):
+            page_id = page.get("id")
+            known = self._pages.get(page_id)
+            if known is not None and known.get("last_edited_time") == page.get("last_edited_time") \
+                    and (settled(page.get("last_edited_time"), fetched_at) or self._same_version(known, page)):
+                continue
+            self._contents.pop(page_id, None)
+            self._page_database[page_id] = database_id
+            self.refresh_page(page)
+            changed.append(page)
+        return changed
+
+    def _same_version(self, known: Dict, page: Dict) -> bool:
+        """
+        Même last_edited_time récent (arrondi à la minute) : la page n'est inchangée que si
+        ses propriétés et son contenu sont identiques à ceux du snapshot
+        """
+        page_id = page.get("id")
+        if known.get("properties") != page.get("properties") or page_id not in self._contents:
+            return False
+        return super().get_page_content(page_id) == self._contents[page_id]
+
+    def get_page(self, page_id: str) -> Optional[Dict]:
+        """Page depuis le snapshot si connue"""
+        if page_id in self._pages:
+            return self._pages[page_id]
+        page = super().get_page(page_id)
+        if page is not None:
+            self._pages[page_id] = page
+        return page
+
+    def patch_page(self, page_id: str, properties: Dict) -> Optional[Dict]:
+        """Écrit dans Notion et remplace la page du snapshot par la version renvoyée"""
+        page = super().patch_page(page_id, properties)
+        if page is not None:
+            self.refresh_page(page)
+        return page
+
+    def refresh_page(self, page: Dict):
+        """Remplace une page dans le snapshot (ex: après écriture ou notification)"""
+        page_id = page.get("id")
+        self._pages[page_id] = page
+        database_id = self._page_database.get(page_id)
+        if database_id is None:
+            database_id = self._database_key(page.get("parent", {}).get("database_id"))
+        rows = self._databases.get(database_id)
+        if rows is None:
+            return
+        self._page_database[page_id] = database_id
+        for index, row in enumerate(rows):
+            if row.get("id") == page_id:
+                rows[index] = page
+                return
+        rows.append(page)
+
+    def reload_page(self, page_id: str) -> Optional[Dict]:
+        """Relit une page dans Notion (ex: sur notification) et l'applique au snapshot"""
+        self._contents.pop(page_id, None)
+        page = super().get_page(page_id)
+        if page is not None:
+            self.refresh_page(page)
+        return page
+
+    def remove_page(self, page_id: str):
+        """Retire une page supprimée du snapshot"""
+        self.invalidate(page_id=page_id)
+        database_id = self._page_database.pop(page_id, None)
+        rows = self._databases.get(database_id)
+        if rows is not None:
+            rows[:] = [row for row in rows if row.get("id") != page_id]
+
+    def get_page_content(self, page_id: str) -> str:
+        """Contenu texte d'une page, lu une seule fois par processus"""
+        if page_id not in self._contents:
+            self._contents[page_id] = super().get_page_content(page_id)
+        return self._contents[page_id]
+
+    def invalidate(self, page_id: Optional[str] = None, database_id: Optional[str] = None):
+        """Oublie une page (et son contenu) ou une base entière du snapshot"""
+        if page_id:
+            self._pages.pop(page_id, None)
+            self._contents.pop(page_id, None)
+        if database_id:
+            for page in self._databases.pop(database_id, []):
+                self._pages.pop(page.get("id"), None)
+                self._contents.pop(page.get("id"), None)
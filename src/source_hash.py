@@ -0,0 +1,188 @@
+"""
+Hash source hiérarchique (type Merkle) pour Martine IA
+Un projet = racine calculée à partir de sous-hashs indépendants :
+  - content    : texte de la page projet
+  - properties : nom, description et contexte des propriétés
+  - tasks      : racine des hashs feuilles de TOUTES les tâches liées
+On sait ainsi quel composant a changé et on ne relit que celui-là.
+
+Le sous-hash des propriétés suit une spécification canonique versionnée :
+toute modification de la spécification impose un nouveau HASH_VERSION, et les
+anciennes versions restent calculables pour migrer sans ré-estimation.
+"""
+import re
+import hashlib
+from typing import Dict, List, Optional, Set, Tuple
+
+# Préfixe de version stocké dans la propriété Hash (hash historique = sans préfixe)
+#   v2 : contexte brut (toutes les propriétés, dont formules et rollups)
+#   v3 : spécification canonique (types saisis uniquement, valeurs normalisées)
+HASH_VERSION = "v3"
+
+# v3 : types de propriétés pris en compte (valeurs saisies par un humain).
+# Exclus de fait : formula, rollup, created_time, last_edited_time, created_by,
+# last_edited_by, unique_id... recalculés par Notion (ex: jours restants, temps agrégé).
+HASHED_PROPERTY_TYPES = {
+    "title", "rich_text", "number", "select", "multi_select", "status", "date",
+    "checkbox", "url", "email", "phone_number", "people", "relation", "files"
+}
+
+# v3 : propriétés exclues par nom, en plus de celles passées par l'appelant
+# (toute modification de cette liste impose une nouvelle version)
+EXCLUDED_PROPERTY_NAMES: Set[str] = set()
+
+# Ordre fixe des composants dans la racine
+PROJECT_COMPONENTS = ["content", "properties", "tasks"]
+TASK_COMPONENTS = ["content", "properties"]
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 hexadécimal d'un texte"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def combine_hashes(hashes: List[str]) -> str:
+    """Nœud interne : hash de la liste ordonnée des hashs enfants"""
+    return hash_text("\n".join(hashes))
+
+
+def task_leaf_hash(nom: str, estimation) -> str:
+    """Hash feuille d'une tâche (les champs repris dans le résumé des tâches)"""
+    return hash_text(f"{nom or ''}|{estimation if estimation is not None else ''}")
+
+
+def tasks_root_hash(leaves: Dict[str, str]) -> str:
+    """Racine des tâches liées (triée par id : l'ordre de la relation ne compte pas)"""
+    return combine_hashes([f"{task_id}:{leaves[task_id]}" for task_id in sorted(leaves)])
+
+
+def legacy_hash(nom: str, description: str, content: str, tasks_summary: str, full_context: str) -> str:
+    """Hash historique (valeur stockée sans préfixe) : données sources concaténées"""
+    return hash_text(f"{nom}|{description}|{content}|{tasks_summary}|{full_context}")
+
+
+def properties_hash(nom: str, description: str, full_context: str) -> str:
+    """Sous-hash des propriétés du projet (lisibles sans requête supplémentaire)"""
+    return hash_text(f"{nom}|{description}|{full_context}")
+
+
+def normalize_number(value) -> str:
+    """Nombre canonique : 2.0 -> '2', 0.1 + 0.2 -> '0.3'"""
+    number = round(float(value), 6)
+    return str(int(number)) if number == int(number) else repr(number)
+
+
+def _normalize_string(text: str) -> str:
+    """Texte canonique : espaces fusionnés et rognés"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def canonical_property_value(prop: Dict) -> Optional[str]:
+    """
+    Valeur canonique d'une propriété Notion brute (v3).
+    Retourne None pour un type non haché ou une valeur vide : une colonne vide
+    et une colonne absente donnent le même hash.
+    """
+    prop_type = prop.get("type")
+    if prop_type not in HASHED_PROPERTY_TYPES:
+        return None
+    raw = prop.get(prop_type)
+
+    if prop_type in ("title", "rich_text"):
+        text = _normalize_string("".join(t.get("plain_text", "") for t in raw or []))
+        return text or None
+    if prop_type == "number":
+        return normalize_number(raw) if raw is not None else None
+    if prop_type in ("select", "status"):
+        return raw.get("name") if raw else None
+    if prop_type == "multi_select":
+        names = sorted(item.get("name", "") for item in raw or [])
+        return ",".join(names) or None
+    if prop_type == "date":
+        if not raw or not raw.get("start"):
+            return None
+        return f"{raw['start']}/{raw['end']}" if raw.get("end") else raw["start"]
+    if prop_type == "checkbox":
+        return "true" if raw else None
+    if prop_type in ("people", "relation"):
+        ids = sorted(item.get("id", "") for item in raw or [])
+        return ",".join(ids) or None
+    if prop_type == "files":
+        names = sorted(item.get("name", "") for item in raw or [])
+        return ",".join(names) or None
+    # url, email, phone_number
+    return (_normalize_string(raw) or None) if isinstance(raw, str) else None
+
+
+def canonical_properties(page: Dict, excluded: Set[str], included: Optional[Set[str]] = None) -> str:
+    """
+    Texte canonique des propriétés d'une page (triées par nom)
+    included: si fourni, seules ces propriétés sont prises en compte
+    """
+    lines = []
+    for name in sorted(page.get("properties", {})):
+        if name in excluded or name in EXCLUDED_PROPERTY_NAMES:
+            continue
+        if included is not None and name not in included:
+            continue
+        value = canonical_property_value(page["properties"][name])
+        if value is not None:
+            lines.append(f"{_normalize_string(name)}={value}")
+    return "\n".join(lines)
+
+
+def _properties_v2(context: Dict) -> str:
+    """v2 : nom, description et contexte brut"""
+    return properties_hash(context["nom"], context["description"], context["full_context"])
+
+
+def _properties_v3(context: Dict) -> str:
+    """v3 : propriétés canoniques de la page"""
+    return hash_text(canonical_properties(context["page"], context["excluded"]))
+
+
+# Spécifications connues du sous-hash des propriétés, par version
+PROPERTIES_CANONICALIZERS = {
+    "v2": _properties_v2,
+    "v3": _properties_v3,
+}
+
+
+def properties_component(version: str, context: Dict) -> str:
+    """
+    Sous-hash des propriétés selon une version de spécification.
+    context: {"page", "excluded", "nom", "description", "full_context"}
+    """
+    return PROPERTIES_CANONICALIZERS[version](context)
+
+
+def project_root_hash(components: Dict[str, str]) -> str:
+    """Racine du projet, combinaison ordonnée des sous-hashs"""
+    return combine_hashes([f"{name}:{components.get(name, '')}" for name in PROJECT_COMPONENTS])
+
+
+def task_root_hash(components: Dict[str, str]) -> str:
+    """Racine d'une tâche feuille (contenu + propriétés qui alimentent le prompt)"""
+    return combine_hashes([f"{name}:{components.get(name, '')}" for name in TASK_COMPONENTS])
+
+
+def format_hash(root: str, version: str = HASH_VERSION) -> str:
+    """Valeur stockée dans Notion : '<version>:<racine>'"""
+    return f"{version}:{root}"
+
+
+def parse_hash(stored: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Décompose une valeur stockée en (version, hash) ; version None = hash historique"""
+    if not stored:
+        return None, None
+    if ":" in stored:
+        version, digest = stored.split(":", 1)
+        return version, digest
+    return None, stored
+
+
+def changed_components(old: Optional[Dict[str, str]], new: Dict[str, str]) -> List[str]:
+    """Liste des composants qui diffèrent (tous si l'ancien état est inconnu)"""
+    if not old:
+        return list(PROJECT_COMPONENTS)
+    return [name for name in PROJECT_COMPONENTS if old.get(name) != new.get(name)]
@@ -0,0 +1,220 @@
+"""
+Exécution multi-cibles de Martine IA
+Un fichier JSON (targets.json à la racine, ou MARTINE_TARGETS) liste plusieurs
+cibles : jeton Notion, bases Tâches/Projets et options. Chaque cible tourne dans
+son propre processus (un échec n'affecte pas les autres) et toutes en même temps :
+la durée totale est celle de la cible la plus lente. Le débit Notion d'un jeton
+(NOTION_TOKEN_RATE, ~3 requêtes/s) est réparti entre les cibles qui le partagent.
+
+Format:
+    {"targets": [
+        {"name": "equipe-a", "token_env": "NOTION_TOKEN_A",
+         "db_taches": "...", "db_projets": "...",
+         "options": {"estimator_engine": "gpt", "write_parent_totals": true}}
+    ]}
+"""
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import manifest
+from config import MartineConfig, env_number
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_TARGETS_FILE = ROOT_DIR / "targets.json"
+DEFAULT_TOKEN_RATE = 3.0  # limite moyenne de l'API Notion par jeton
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class Target:
+    """Une cible : jeton Notion, bases et options propres"""
+
+    def __init__(self, name: str, token: Optional[str] = None, token_env: Optional[str] = None,
+                 db_taches: Optional[str] = None, db_projets: Optional[str] = None,
+                 options: Optional[Dict] = None):
+        self.name = name
+        self.token = token
+        self.token_env = token_env
+        self.db_taches = db_taches
+        self.db_projets = db_projets
+        self.options = options or {}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Target":
+        name = str(data.get("name") or "")
+        if not _NAME_PATTERN.match(name):
+            raise ValueError(f"❌ Nom de cible invalide: '{name}' (lettres, chiffres, . _ -)")
+        return cls(
+            name,
+            token=data.get("token"),
+            token_env=data.get("token_env"),
+            db_taches=data.get("db_taches"),
+            db_projets=data.get("db_projets"),
+            options=data.get("options")
+        )
+
+    def notion_token(self, base: MartineConfig) -> Optional[str]:
+        """Jeton de la cible (en clair, via une variable du .env, sinon NOTION_TOKEN)"""
+        if self.token:
+            return self.token
+        if self.token_env:
+            return os.getenv(self.token_env)
+        return base.notion_token
+
+    def config(self, base: MartineConfig, notion_rate: Optional[float] = None) -> MartineConfig:
+        """Configuration de la cible : celle du .env, surchargée par la cible"""
+        fields = dict(self.options)
+        fields.update(notion_token=self.notion_token(base), target=self.name, notion_rate=notion_rate)
+        if self.db_taches:
+            fields["db_taches"] = self.db_taches
+        if self.db_projets:
+            fields["db_projets"] = self.db_projets
+        return base.replace(**fields)
+
+
+def targets_file(path: Optional[str] = None) -> Path:
+    """Fichier des cibles (argument, MARTINE_TARGETS, sinon targets.json)"""
+    return Path(path or os.getenv("MARTINE_TARGETS") or DEFAULT_TARGETS_FILE)
+
+
+def load_targets(path: Optional[str] = None) -> List[Target]:
+    """Lit les cibles (ValueError si le fichier est invalide ou les noms dupliqués)"""
+    path = targets_file(path)
+    if not path.exists():
+        raise FileNotFoundError(f"❌ Fichier des cibles introuvable: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    targets = [Target.from_dict(item) for item in data.get("targets", [])]
+    names = [target.name for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"❌ Cibles en double: {', '.join(duplicates)}")
+    return targets
+
+
+def token_rates(targets: List[Target], base: MartineConfig, token_rate: float) -> Dict[str, float]:
+    """
+    Débit Notion de chaque cible : le seau d'un jeton est réparti à parts égales
+    entre les cibles qui l'utilisent. Returns: {nom: requêtes/s}
+    """
+    shares: Dict[Optional[str], int] = {}
+    for target in targets:
+        token = target.notion_token(base)
+        shares[token] = shares.get(token, 0) + 1
+    return {target.name: token_rate / shares[target.notion_token(base)] for target in targets}
+
+
+def target_cache_dir(name: str) -> Path:
+    """Dossier des fichiers locaux d'une cible (manifestes, journal, résumé)"""
+    return manifest.CACHE_DIR / "targets" / name
+
+
+def prepare_target(name: str, path: Optional[str] = None, base: Optional[MartineConfig] = None) -> MartineConfig:
+    """
+    Côté processus de la cible : configuration de la cible et fichiers locaux
+    isolés dans cache/targets/<nom>/
+    """
+    base = base or MartineConfig.from_env()
+    targets = load_targets(path)
+    target = next((t for t in targets if t.name == name), None)
+    if target is None:
+        raise ValueError(f"❌ Cible inconnue: {name}")
+    rate = token_rates(targets, base, env_number("NOTION_TOKEN_RATE", DEFAULT_TOKEN_RATE))[name]
+    manifest.CACHE_DIR = target_cache_dir(name)
+    manifest.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return target.config(base, rate)
+
+
+def _run_target(command: str, target: Target, path: Path, log_dir: Path, options: List[str]) -> Dict:
+    """Lance une cible dans un processus (avec les options de la commande) ; retourne son compte rendu"""
+    summary_path = target_cache_dir(target.name) / "summary.json"
+    if summary_path.exists():
+        summary_path.unlink()
+    log_path = log_dir / f"{target.name}.log"
+    args = [sys.executable, str(Path(__file__).resolve().parent / "martine.py"), command,
+            "--target", target.name, "--targets", str(path), *options]
+    env = dict(os.environ, PYTHONIOENCODING="utf-8")
+
+    started = time.monotonic()
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            code = subprocess.run(args, stdout=log, stderr=subprocess.STDOUT, env=env).returncode
+    except Exception as e:
+        code = -1
+        print(f"   ❌ {target.name}: lancement impossible ({e})")
+    result = {
+        "target": target.name,
+        "exit_code": code,
+        "seconds": round(time.monotonic() - started, 1),
+        "log": str(log_path),
+        "summary": {}
+    }
+    try:
+        with open(summary_path, "r", encoding="utf-8") as f:
+            result["summary"] = json.load(f)
+    except Exception:
+        pass
+    status = "✅" if code == 0 else "❌"
+    print(f"   {status} {target.name} terminée en {result['seconds']}s (code {code})")
+    return result
+
+
+def run_targets(command: str, path: Optional[str] = None, parallel: Optional[int] = None,
+                options: Optional[List[str]] = None) -> int:
+    """
+    Exécute toutes les cibles en parallèle ; retourne 1 si au moins une a échoué.
+    parallel: nombre de cibles simultanées (défaut: TARGETS_MAX_PARALLEL, sinon toutes)
+    options: options transmises à chaque cible (--resume, --offline, --batch, --full)
+    """
+    options = list(options or [])
+    path = targets_file(path).resolve()
+    targets = load_targets(str(path))
+    if not targets:
+        print("⚠️ Aucune cible dans le fichier")
+        return 0
+    parallel = parallel or int(env_number("TARGETS_MAX_PARALLEL", len(targets)))
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_dir = ROOT_DIR / "logs" / f"targets_{stamp}"
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"🎯 {len(targets)} cible(s), {parallel} en parallèle (logs: {log_dir})"
+          + (f" - options: {' '.join(options)}" if options else ""))
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        results = list(executor.map(lambda target: _run_target(command, target, path, log_dir, options), targets))
+    elapsed = time.monotonic() - started
+
+    print("\n" + "=" * 60)
+    print(f"📊 Résumé par cible ({elapsed:.1f}s au total)")
+    print("=" * 60)
+    for result in results:
+        status = "✅" if result["exit_code"] == 0 else "❌"
+        print(f"{status} {result['target']} ({result['seconds']}s)")
+        for engine, counters in result["summary"].items():
+            if isinstance(counters, dict):
+                print(f"   {engine}: " + ", ".join(f"{key}={value}" for key, value in counters.items()))
+            else:
+                print(f"   {engine}: {counters}")
+        if result["exit_code"] != 0:
+            print(f"   → voir {result['log']}")
+
+    try:
+        with open(log_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump({"command": command, "options": options, "elapsed_seconds": round(elapsed, 1), "targets": results},
+                      f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"⚠️ Erreur sauvegarde résumé (non critique): {e}")
+
+    failed = [result["target"] for result in results if result["exit_code"] != 0]
+    if failed:
+        print(f"\n❌ {len(failed)} cible(s) en échec: {', '.join(failed)}")
+        return 1
+    return 0
@@ -0,0 +1,147 @@
+"""
+Index en mémoire de la hiérarchie des tâches pour Martine IA
+Construit une seule fois depuis les pages déjà chargées (aucun appel API) :
+adjacence parent/enfants, appartenance aux projets, feuilles et totaux agrégés
+"""
+from typing import Dict, Iterable, List, Optional, Set
+
+# Noms des propriétés Notion (EXACTS)
+PROP_SOUS_ELEMENT = "Sous-élément"  # Relation tâche -> enfants
+PROP_ELEMENT_PARENT = "Élément parent"  # Relation tâche -> parent (si présente)
+PROP_ESTIMATION_ENFANT = "🤖⏱️Temps est IA (h) ENFANT"  # Number
+PROP_PROJET_TACHE = "Projet/Tlt"  # Relation tâche -> projet
+PROP_TACHES_PROJET = "Tâches IA"  # Relation projet -> tâches
+
+
+def _relation_ids(page: Dict, prop_name: str) -> List[str]:
+    """Ids d'une propriété relation (liste vide si absente ou d'un autre type)"""
+    prop = page.get("properties", {}).get(prop_name, {})
+    if prop.get("type") != "relation":
+        return []
+    return [rel.get("id") for rel in prop.get("relation", []) if rel.get("id")]
+
+
+def _number(page: Dict, prop_name: str) -> float:
+    """Valeur numérique d'une propriété (0.0 si vide)"""
+    prop = page.get("properties", {}).get(prop_name, {})
+    if prop.get("type") == "number":
+        return float(prop.get("number") or 0.0)
+    if prop.get("type") == "formula":
+        value = prop.get("formula", {}).get("number")
+        return float(value or 0.0)
+    return 0.0
+
+
+class TaskGraph:
+    """Graphe des tâches : O(1) pour les feuilles, O(sous-arbre) pour les agrégats"""
+
+    def __init__(self):
+        self.pages: Dict[str, Dict] = {}
+        self.children: Dict[str, Set[str]] = {}
+        self.parents: Dict[str, Set[str]] = {}
+        self.project_tasks: Dict[str, Set[str]] = {}
+        self.task_projects: Dict[str, Set[str]] = {}
+        self.estimates: Dict[str, float] = {}
+        self._totals: Dict[str, float] = {}
+
+    @classmethod
+    def build(cls, task_pages: Iterable[Dict], project_pages: Iterable[Dict] = ()) -> "TaskGraph":
+        """Construit l'index depuis les snapshots des bases Tâches (et Projets)"""
+        graph = cls()
+        for page in task_pages:
+            task_id = page.get("id")
+            graph.pages[task_id] = page
+            graph.children.setdefault(task_id, set())
+            graph.parents.setdefault(task_id, set())
+            graph.estimates[task_id] = _number(page, PROP_ESTIMATION_ENFANT)
+
+        for task_id, page in graph.pages.items():
+            for child_id in _relation_ids(page, PROP_SOUS_ELEMENT):
+                graph._link(task_id, child_id)
+            for parent_id in _relation_ids(page, PROP_ELEMENT_PARENT):
+                graph._link(parent_id, task_id)
+            for project_id in _relation_ids(page, PROP_PROJET_TACHE):
+                graph._add_membership(project_id, task_id)
+
+        for project in project_pages:
+            for task_id in _relation_ids(project, PROP_TACHES_PROJET):
+                graph._add_membership(project.get("id"), task_id)
+
+        return graph
+
+    def _link(self, parent_id: str, child_id: str):
+        """Ajoute une arête parent -> enfant"""
+        self.children.setdefault(parent_id, set()).add(child_id)
+        self.parents.setdefault(child_id, set()).add(parent_id)
+        self.children.setdefault(child_id, set())
+        self.parents.setdefault(parent_id, set())
+
+    def _add_membership(self, project_id: str, task_id: str):
+        """Ajoute une tâche à un projet"""
+        self.project_tasks.setdefault(project_id, set()).add(task_id)
+        self.task_projects.setdefault(task_id, set()).add(project_id)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.pages
+
+    def is_leaf(self, task_id: str) -> bool:
+        """Feuille = aucune sous-tâche (O(1))"""
+        return not self.children.get(task_id)
+
+    def leaves(self) -> List[Dict]:
+        """Pages feuilles, dans l'ordre du snapshot"""
+        return [page for task_id, page in self.pages.items() if self.is_leaf(task_id)]
+
+    def subtree(self, task_id: str) -> List[str]:
+        """Ids du sous-arbre (tâche incluse), parcours itératif protégé contre les cycles"""
+        seen = set()
+        stack = [task_id]
+        order = []
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            order.append(current)
+            stack.extend(self.children.get(current, ()))
+        return order
+
+    def subtree_total(self, task_id: str) -> float:
+        """Somme des estimations des feuilles du sous-arbre (mémoïsée)"""
+        if task_id not in self._totals:
+            self._totals[task_id] = sum(
+                self.estimates.get(node, 0.0) for node in self.subtree(task_id) if self.is_leaf(node)
+            )
+        return self._totals[task_id]
+
+    def leaves_total(self, task_ids: Iterable[str]) -> float:
+        """Somme des estimations des feuilles couvertes par des tâches (sous-arbres inclus, sans doublon)"""
+        leaves = set()
+        for task_id in task_ids:
+            leaves.update(node for node in self.subtree(task_id) if self.is_leaf(node))
+        return sum(self.estimates.get(node, 0.0) for node in leaves)
+
+    def project_total(self, project_id: str) -> float:
+        """Somme des estimations des feuilles rattachées à un projet (sous-arbres inclus)"""
+        return self.leaves_total(self.project_tasks.get(project_id, ()))
+
+    def set_estimate(self, task_id: str, hours: Optional[float]):
+        """Met à jour l'estimation d'une feuille et invalide les totaux des ancêtres"""
+        self.estimates[task_id] = float(hours or 0.0)
+        stack = [task_id]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            self._totals.pop(current, None)
+            stack.extend(self.parents.get(current, ()))
+
+    def parent_totals(self) -> Dict[str, float]:
+        """Totaux agrégés de chaque tâche parente présente dans le snapshot"""
+        return {
+            task_id: self.subtree_total(task_id)
+            for task_id in self.pages
+            if not self.is_leaf(task_id)
+        }
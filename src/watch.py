@@ -0,0 +1,102 @@
+"""
+Mode surveillance (daemon) de Martine IA
+Garde le client Notion, le snapshot et les estimateurs en mémoire, interroge les
+bases avec un filtre last_edited_time et relance les moteurs dès qu'une page change.
+L'intervalle s'allonge quand rien ne bouge et se resserre à la première modification.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from config import env_number
+from manifest import SYNC_MARGIN, notion_timestamp
+
+DEFAULT_MIN_SECONDS = 10.0
+DEFAULT_MAX_SECONDS = 300.0
+DEFAULT_RESYNC_MINUTES = 60.0
+BACKOFF_FACTOR = 2.0
+
+
+class AdaptiveInterval:
+    """Intervalle de scrutation : minimum après un changement, doublé à chaque tour calme"""
+
+    def __init__(self, minimum: float, maximum: float, factor: float = BACKOFF_FACTOR):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.factor = factor
+        self.current = minimum
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveInterval":
+        """Bornes depuis WATCH_MIN_SECONDS / WATCH_MAX_SECONDS (.env)"""
+        return cls(
+            env_number("WATCH_MIN_SECONDS", DEFAULT_MIN_SECONDS),
+            env_number("WATCH_MAX_SECONDS", DEFAULT_MAX_SECONDS)
+        )
+
+    def update(self, changed: bool) -> float:
+        """Ajuste l'intervalle après un tour ; retourne le prochain délai"""
+        if changed:
+            self.current = self.minimum
+        else:
+            self.current = min(self.maximum, self.current * self.factor)
+        return self.current
+
+
+def watch(notion, database_ids: List[str], run_cycle: Callable[[], None],
+          interval: Optional[AdaptiveInterval] = None, max_cycles: Optional[int] = None,
+          sleep: Callable[[float], None] = time.sleep):
+    """
+    Boucle de surveillance.
+    notion: SnapshotNotionClient partagé avec les moteurs
+    database_ids: bases à scruter
+    run_cycle: relance les moteurs (qui ne retraitent que les pages modifiées)
+    max_cycles: nombre de tours de scrutation (None = jusqu'à Ctrl+C)
+    """
+    interval = interval or AdaptiveInterval.from_env()
+    resync_seconds = env_number("WATCH_RESYNC_MINUTES", DEFAULT_RESYNC_MINUTES) * 60
+    database_ids = [db for db in database_ids if db]
+
+    print(f"👀 Surveillance de {len(database_ids)} base(s) "
+          f"(intervalle {interval.minimum:g}s → {interval.maximum:g}s, Ctrl+C pour arrêter)")
+
+    # Passage initial complet : charge le snapshot et traite l'existant
+    since = notion_timestamp(datetime.now(timezone.utc) - SYNC_MARGIN)
+    run_cycle()
+    last_resync = time.monotonic()
+
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            sleep(interval.current)
+            cycles += 1
+            polled_at = datetime.now(timezone.utc)
+
+            # Relecture complète périodique (pages archivées/supprimées, relations inverses)
+            if time.monotonic() - last_resync >= resync_seconds:
+                print("\n🔄 Resynchronisation complète du snapshot")
+                for database_id in database_ids:
+                    notion.invalidate(database_id=database_id)
+                last_resync = time.monotonic()
+                since = notion_timestamp(polled_at - SYNC_MARGIN)
+                run_cycle()
+                interval.update(True)
+                continue
+
+            changed = 0
+            try:
+                for database_id in database_ids:
+                    changed += len(notion.pull_changes(database_id, since))
+                since = notion_timestamp(polled_at - SYNC_MARGIN)
+            except Exception as e:
+                print(f"⚠️ Scrutation impossible, nouvel essai plus tard: {e}")
+
+            if changed:
+                print(f"\n✨ {changed} page(s) modifiée(s), relance des estimations")
+                try:
+                    run_cycle()
+                except Exception as e:
+                    print(f"❌ Erreur pendant le cycle (la surveillance continue): {e}")
+            interval.update(changed > 0)
+    except KeyboardInterrupt:
+        print("\n🛑 Surveillance arrêtée")
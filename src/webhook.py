@@ -0,0 +1,200 @@
+"""
+Récepteur de webhooks Notion pour Martine IA
+Serveur HTTP local qui reçoit les événements de pages, vérifie leur signature
+(HMAC-SHA256 du corps avec le jeton de vérification), regroupe les rafales
+d'édition d'une même page et ne transmet aux moteurs que les pages concernées
+"""
+import os
+import hmac
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Set
+
+from config import env_number
+
+DEFAULT_PORT = 8765
+DEFAULT_DEBOUNCE_SECONDS = 5.0
+SIGNATURE_HEADER = "X-Notion-Signature"
+
+# Événements qui déclenchent une (ré)estimation
+PAGE_EVENTS = {"page.created", "page.properties_updated", "page.content_updated", "page.undeleted", "page.moved"}
+DELETED_EVENTS = {"page.deleted"}
+
+
+def sign(body: bytes, secret: str) -> str:
+    """Signature Notion d'un corps de requête ("sha256=<hex>")"""
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: Optional[str]) -> bool:
+    """Vérifie l'en-tête X-Notion-Signature (comparaison à temps constant)"""
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(body, secret), signature)
+
+
+class Debouncer:
+    """Regroupe les événements d'une page : prête après `delay` secondes sans nouvel événement"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.pending: Dict[str, float] = {}
+        self.deleted: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def add(self, page_id: str, deleted: bool = False):
+        """Enregistre un événement (repousse l'échéance de la page)"""
+        with self.lock:
+            self.pending[page_id] = time.monotonic()
+            if deleted:
+                self.deleted.add(page_id)
+            else:
+                self.deleted.discard(page_id)
+
+    def ready(self) -> tuple:
+        """Retire les pages calmes depuis `delay`. Returns: (modifiées, supprimées)"""
+        now = time.monotonic()
+        with self.lock:
+            ids = [page_id for page_id, at in self.pending.items() if now - at >= self.delay]
+            for page_id in ids:
+                del self.pending[page_id]
+            deleted = [page_id for page_id in ids if page_id in self.deleted]
+            self.deleted.difference_update(deleted)
+        return [page_id for page_id in ids if page_id not in deleted], deleted
+
+
+def page_event(payload: Dict) -> Optional[tuple]:
+    """(page_id, supprimée) d'un événement de page, None pour les autres événements"""
+    event_type = payload.get("type", "")
+    entity = payload.get("entity") or {}
+    if entity.get("type") != "page" or not entity.get("id"):
+        return None
+    if event_type in DELETED_EVENTS:
+        return entity["id"], True
+    if event_type in PAGE_EVENTS:
+        return entity["id"], False
+    return None
+
+
+class WebhookReceiver:
+    """
+    Serveur de webhooks.
+    Usage:
+        receiver = WebhookReceiver(secret, port=8765)
+        receiver.start()
+        changed, deleted = receiver.debouncer.ready()
+        receiver.stop()
+    """
+
+    def __init__(self, secret: Optional[str], host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 debounce: float = DEFAULT_DEBOUNCE_SECONDS):
+        self.secret = secret
+        self.debouncer = Debouncer(debounce)
+        self.rejected = 0
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                status = receiver.handle(body, self.headers.get(SIGNATURE_HEADER))
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def handle(self, body: bytes, signature: Optional[str]) -> int:
+        """Traite une requête ; retourne le code HTTP"""
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return 400
+
+        # Création de l'abonnement : Notion envoie le jeton à recopier dans NOTION_WEBHOOK_SECRET
+        if "verification_token" in payload:
+            print(f"🔑 Jeton de vérification Notion reçu: {payload['verification_token']}")
+            if not self.secret:
+                print("   → renseignez NOTION_WEBHOOK_SECRET avec ce jeton puis relancez")
+            return 200
+
+        if not verify_signature(body, signature, self.secret):
+            self.rejected += 1
+            print("⚠️ Webhook rejeté (signature invalide)")
+            return 401
+
+        event = page_event(payload)
+        if event is not None:
+            page_id, deleted = event
+            self.debouncer.add(page_id, deleted)
+        return 200
+
+    def start(self):
+        """Démarre le serveur dans un thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Arrête le serveur"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def receiver_from_env() -> WebhookReceiver:
+    """Récepteur configuré par NOTION_WEBHOOK_SECRET / WEBHOOK_HOST / WEBHOOK_PORT / WEBHOOK_DEBOUNCE_SECONDS"""
+    return WebhookReceiver(
+        os.getenv("NOTION_WEBHOOK_SECRET"),
+        host=os.getenv("WEBHOOK_HOST", "127.0.0.1"),
+        port=int(env_number("WEBHOOK_PORT", DEFAULT_PORT)),
+        debounce=env_number("WEBHOOK_DEBOUNCE_SECONDS", DEFAULT_DEBOUNCE_SECONDS)
+    )
+
+
+def serve(notion, receiver: WebhookReceiver, run_cycle: Callable[[], None],
+          poll: float = 1.0, max_cycles: Optional[int] = None,
+          sleep: Callable[[float], None] = time.sleep):
+    """
+    Boucle de traitement des webhooks.
+    notion: SnapshotNotionClient partagé avec les moteurs
+    run_cycle: relance les moteurs (qui ne retraitent que les pages rechargées)
+    max_cycles: nombre de cycles d'estimation (None = jusqu'à Ctrl+C)
+    """
+    print(f"📡 Webhooks Notion sur le port {receiver.port} (Ctrl+C pour arrêter)")
+    if not receiver.secret:
+        print("⚠️ NOTION_WEBHOOK_SECRET absent : seuls les messages de vérification sont acceptés")
+
+    # Passage initial complet : charge le snapshot et traite l'existant
+    run_cycle()
+    receiver.start()
+
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            sleep(poll)
+            changed, deleted = receiver.debouncer.ready()
+            if not changed and not deleted:
+                continue
+            cycles += 1
+
+            for page_id in deleted:
+                notion.remove_page(page_id)
+            reloaded: List[str] = [page_id for page_id in changed if notion.reload_page(page_id) is not None]
+            print(f"\n📨 {len(reloaded)} page(s) modifiée(s), {len(deleted)} supprimée(s)")
+            try:
+                run_cycle()
+            except Exception as e:
+                print(f"❌ Erreur pendant le cycle (le récepteur continue): {e}")
+    except KeyboardInterrupt:
+        print("\n🛑 Récepteur arrêté")
+    finally:
+        receiver.stop()
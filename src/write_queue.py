@@ -0,0 +1,96 @@
+"""
+File d'écritures Notion concurrente et limitée en débit pour Martine IA
+Plusieurs workers envoient les mises à jour en parallèle, sous un seau à jetons
+qui respecte la limite de l'API Notion (~3 requêtes/s en moyenne)
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Optional, Tuple
+
+from config import env_number
+
+DEFAULT_RATE = 3.0  # requêtes par seconde
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 2
+
+
+class RateLimiter:
+    """Seau à jetons thread-safe : `rate` jetons/s, rafale max `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloque jusqu'à disposer d'un jeton"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class WriteQueue:
+    """
+    File de mises à jour de pages Notion.
+    Usage:
+        queue = WriteQueue(notion)
+        queue.submit(page_id, {"Prop": {"number": 3}}, label="Phase A")
+        ok, failed = queue.drain()
+        queue.close()
+    """
+
+    def __init__(self, notion, rate: Optional[float] = None, workers: Optional[int] = None,
+                 retries: int = DEFAULT_RETRIES, limiter: Optional[RateLimiter] = None):
+        self.notion = notion
+        rate = rate if rate is not None else env_number("NOTION_WRITE_RATE", DEFAULT_RATE)
+        workers = workers if workers is not None else int(env_number("NOTION_WRITE_WORKERS", DEFAULT_WORKERS))
+        self.limiter = limiter or RateLimiter(rate)
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.futures: List[Tuple[str, str, Future]] = []
+
+    def _write(self, page_id: str, properties: Dict) -> bool:
+        """Écrit une page, avec nouvelles tentatives espacées en cas d'échec"""
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                if self.notion.update_page(page_id, properties):
+                    return True
+            except Exception as e:
+                print(f"   ⚠️ Exception écriture {page_id}: {e}")
+            if attempt < self.retries:
+                time.sleep(2 ** attempt)
+        return False
+
+    def submit(self, page_id: str, properties: Dict, label: str = "") -> Future:
+        """Ajoute une écriture à la file (non bloquant)"""
+        future = self.executor.submit(self._write, page_id, properties)
+        self.futures.append((page_id, label or page_id, future))
+        return future
+
+    def drain(self) -> Tuple[int, int]:
+        """Attend la fin de toutes les écritures. Returns: (succès, échecs)"""
+        ok = 0
+        failed = 0
+        for page_id, label, future in self.futures:
+            if future.result():
+                ok += 1
+            else:
+                print(f"   ❌ Échec écriture: {label}")
+                failed += 1
+        self.futures = []
+        return ok, failed
+
+    def close(self):
+        """Libère les workers (après le dernier drain)"""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,244 @@
+"""
+MARTINE IA - Benchmark de bout en bout
+Lance les moteurs contre le serveur Notion factice (tools/fake_notion_server.py) et
+le LLM factice (tools/fake_llm_server.py), pour plusieurs tailles de bases, à froid
+(cache vide) puis à chaud (2e run, hash inchangés). Chaque run tourne dans un processus
+séparé : durée, pages/s, pic mémoire (RSS) et nombre de requêtes par route Notion.
+Les résultats sont écrits dans logs/benchmarks/bench_<horodatage>.json ; --compare
+affiche l'écart avec un fichier de référence.
+
+Usage:
+    python tools/benchmark.py                               # 1 000 et 10 000 tâches
+    python tools/benchmark.py --sizes 1000,10000,100000 --latency-ms 80 --rate-429 0.01
+    python tools/benchmark.py --flows tasks --compare logs/benchmarks/reference.json
+    python tools/benchmark.py --replay cache/mirror         # bases rejouées depuis le miroir
+"""
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "tools"))
+
+DEFAULT_SIZES = "1000,10000"
+FLOWS = ("tasks", "projects")
+SCENARIOS = ("cold", "warm")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus (None si indisponible, ex. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kio sous Linux, octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_flow(flow: str, notion_url: str, llm_url: str, cache_dir: str, db_taches: str, db_projets: str) -> Dict:
+    """Exécute un moteur (processus enfant) ; retourne durée, pic mémoire et résumé"""
+    import manifest
+    import run_log
+    from config import MartineConfig
+
+    # Caches et journal des runs du benchmark hors des dossiers réels
+    manifest.CACHE_DIR = Path(cache_dir)
+    run_log.LOG_DIR = Path(cache_dir) / "logs"
+    config = MartineConfig(
+        notion_token="bench", db_taches=db_taches, db_projets=db_projets,
+        estimator_engine="gpt", gpt_key="bench", gpt_model="bench", gpt_base_url=llm_url,
+        notion_base_url=notion_url, target="bench"
+    )
+    if flow == "tasks":
+        import main as engine
+    else:
+        import estimate_projects as engine
+    engine.configure(config=config)
+
+    started = time.perf_counter()
+    summary = engine.run_estimations()
+    return {"wall_seconds": round(time.perf_counter() - started, 3),
+            "peak_rss_mb": peak_rss_mb(), "summary": summary}
+
+
+def start_servers(args, size: int):
+    """Serveurs factices dans des threads (ports libres)"""
+    from fake_notion_server import FakeNotion, make_server as make_notion_server
+    from fake_llm_server import FakeLLM, make_server as make_llm_server
+
+    options = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_429=args.rate_429,
+                   retry_after=args.retry_after)
+    if args.replay:
+        fake = FakeNotion.replay(args.replay, **options)
+    else:
+        fake = FakeNotion.synthetic(size, seed=args.seed, **options)
+    servers = [make_notion_server(fake, port=0), make_llm_server(FakeLLM(), port=0)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    notion_url = f"http://127.0.0.1:{servers[0].server_address[1]}/v1"
+    llm_url = f"http://127.0.0.1:{servers[1].server_address[1]}/v1"
+    return fake, servers, notion_url, llm_url
+
+
+def git_version() -> Optional[str]:
+    """Commit courant (repère de comparaison)"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(args) -> Dict:
+    """Toutes les combinaisons taille × moteur × scénario"""
+    from fake_notion_server import DB_TACHES, DB_PROJETS
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()] if not args.replay else [0]
+    flows = [flow.strip() for flow in args.flows.split(",") if flow.strip()]
+    for flow in flows:
+        if flow not in FLOWS:
+            raise ValueError(f"moteur inconnu: {flow} (attendu: {', '.join(FLOWS)})")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="martine_bench_"))
+    results: List[Dict] = []
+    try:
+        for size in sizes:
+            fake, servers, notion_url, llm_url = start_servers(args, size)
+            db_taches = args.db_taches or DB_TACHES
+            db_projets = args.db_projets or DB_PROJETS
+            pages = {"tasks": len(fake.databases.get(db_taches, [])),
+                     "projects": len(fake.databases.get(db_projets, []))}
+            print(f"\n📏 {pages['tasks']} tâches, {pages['projects']} projets")
+            try:
+                for flow in flows:
+                    cache_dir = work_dir / f"cache_{size}_{flow}"
+                    for scenario in SCENARIOS:
+                        fake.handle("POST", "/_reset", {}, {})
+                        result_path = work_dir / "result.json"
+                        log_path = work_dir / f"{size}_{flow}_{scenario}.log"
+                        command = [sys.executable, str(Path(__file__).resolve()), "--run-flow", flow,
+                                   "--notion-url", notion_url, "--llm-url", llm_url,
+                                   "--cache-dir", str(cache_dir), "--db-taches", db_taches,
+                                   "--db-projets", db_projets, "--result", str(result_path)]
+                        with open(log_path, "w", encoding="utf-8") as log:
+                            code = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT,
+                                                  cwd=ROOT).returncode
+                        if code != 0 or not result_path.exists():
+                            print(f"   ❌ {flow}/{scenario}: échec (code {code}), voir {log_path}")
+                            continue
+                        run = json.loads(result_path.read_text(encoding="utf-8"))
+                        result_path.unlink()
+                        requests_by_route = fake.handle("GET", "/_stats", {}, {})[1]
+                        wall = run["wall_seconds"]
+                        entry = {
+                            "size": size, "flow": flow, "scenario": scenario,
+                            "pages": pages[flow], "wall_seconds": wall,
+                            "pages_per_second": round(pages[flow] / wall, 1) if wall else None,
+                            "peak_rss_mb": run["peak_rss_mb"],
+                            "requests": requests_by_route,
+                            "requests_total": sum(n for route, n in requests_by_route.items() if route != "429"),
+                            "summary": run["summary"]
+                        }
+                        results.append(entry)
+                        print(f"   ⏱️  {flow:<8} {scenario:<4} {wall:>8.2f}s  "
+                              f"{entry['pages_per_second'] or 0:>8.1f} pages/s  "
+                              f"{entry['requests_total']:>6} requêtes  "
+                              f"RSS {entry['peak_rss_mb'] if entry['peak_rss_mb'] is not None else '?'} Mo")
+            finally:
+                for server in servers:
+                    server.shutdown()
+                    server.server_close()
+    finally:
+        if args.keep:
+            print(f"\n📁 Caches et logs conservés dans {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"sizes": sizes, "flows": flows, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                   "rate_429": args.rate_429, "replay": args.replay, "seed": args.seed},
+        "results": results
+    }
+
+
+def compare(report: Dict, baseline: Dict):
+    """Écart de durée et de requêtes avec un benchmark de référence"""
+    print(f"\n📊 Comparaison avec {baseline.get('version') or '?'} ({baseline.get('timestamp', '?')})")
+    reference = {(r["size"], r["flow"], r["scenario"]): r for r in baseline.get("results", [])}
+    for entry in report["results"]:
+        before = reference.get((entry["size"], entry["flow"], entry["scenario"]))
+        label = f"{entry['size']:>7} {entry['flow']:<8} {entry['scenario']:<4}"
+        if before is None:
+            print(f"   {label}  (absent de la référence)")
+            continue
+        delta = (entry["wall_seconds"] - before["wall_seconds"]) / before["wall_seconds"] * 100 \
+            if before["wall_seconds"] else 0.0
+        marker = "🔺" if delta > 10 else "🔻" if delta < -10 else "  "
+        print(f"   {marker} {label}  {before['wall_seconds']:>8.2f}s → {entry['wall_seconds']:>8.2f}s "
+              f"({delta:+.1f} %)  requêtes {before['requests_total']} → {entry['requests_total']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout de Martine IA")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="nombres de tâches, séparés par des virgules")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="moteurs: tasks,projects")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latence Notion injectée")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="proportion de réponses 429 (0-1)")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After des 429 (s)")
+    parser.add_argument("--replay", help="miroir (cache/mirror) ou fichier JSON à servir au lieu des bases synthétiques")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="fichier de résultats (défaut: logs/benchmarks/bench_<horodatage>.json)")
+    parser.add_argument("--compare", metavar="FICHIER", help="benchmark de référence à comparer")
+    parser.add_argument("--keep", action="store_true", help="conserve les caches et logs des runs")
+    # Processus enfant (un run de moteur)
+    parser.add_argument("--run-flow", choices=FLOWS, help=argparse.SUPPRESS)
+    parser.add_argument("--notion-url", help=argparse.SUPPRESS)
+    parser.add_argument("--llm-url", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--db-taches", help=argparse.SUPPRESS)
+    parser.add_argument("--db-projets", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_flow:
+        result = run_flow(args.run_flow, args.notion_url, args.llm_url, args.cache_dir,
+                          args.db_taches, args.db_projets)
+        Path(args.result).write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+        return 0
+
+    try:
+        report = run_benchmarks(args)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    output = Path(args.output) if args.output else \
+        ROOT / "logs" / "benchmarks" / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 Résultats: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+MARTINE IA - Évaluation des estimateurs
+Rejoue les tâches dont le temps réel est connu (historique de get_historical_tasks) et
+les projets dont la durée réelle est connue à travers les moteurs choisis, en parallèle,
+puis compare les estimations à la réalité : erreur absolue moyenne (MAE), biais, erreur
+relative médiane, part des projets estimés dans le bon palier de VALID_DURATIONS, à côté
+de la latence (p50/p95) et des tokens par estimation (coût si --price est donné).
+
+Chaque élément est estimé sans lui-même dans l'historique (leave-one-out), et le
+contexte d'un projet exclut ses durées (réelle, INIT, ACTU).
+Les réponses sont gardées dans cache/eval_responses.jsonl (clé : moteur, modèle et
+entrées exactes du prompt) : une nouvelle évaluation ne paie que les cas nouveaux ;
+la latence et les tokens de l'appel d'origine sont conservés dans le cache.
+Résultats détaillés dans logs/evaluations/eval_<horodatage>.json.
+
+Usage:
+    python tools/evaluate.py --engines gpt,gemini --limit 100
+    python tools/evaluate.py --engines gpt --kinds tasks --history 5 --workers 8
+    python tools/evaluate.py --offline --price gpt=2.5:10 --price gemini=0.1:0.4   # € par million de tokens (entrée:sortie)
+"""
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+ENGINES = ("gpt", "gemini")
+KINDS = ("tasks", "projects")
+# Contexte projet transmis par le moteur
+PROJECT_CONTEXT = "Projet: EISF Alternance"
+# Propriétés exclues du contexte d'un projet évalué (réponse attendue)
+REAL_DURATION_PROPS = ["Durée réelle (sem)", "⏱️ Durée réelle", "Durée"]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Quantile par rang (None si aucune valeur)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class ResponseCache:
+    """Réponses des estimateurs {clé: valeur, secondes, tokens}, fichier JSONL en ajout seul"""
+
+    def __init__(self, path: Path, enabled: bool = True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.entries: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        if enabled and self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(engine: str, model: str, kind: str, inputs: Dict) -> str:
+        from source_hash import hash_text
+        return hash_text(json.dumps([engine, model, kind, inputs], sort_keys=True, ensure_ascii=False))
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key) if self.enabled else None
+
+    def put(self, key: str, value: float, seconds: float, tokens: Dict):
+        if not self.enabled:
+            return
+        entry = {"key": key, "value": value, "seconds": seconds, "tokens": tokens}
+        with self.lock:
+            self.entries[key] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def project_context(page: Dict) -> str:
+    """Propriétés d'un projet transmises au prompt (comme prepare_project), sans ses durées"""
+    import estimate_projects as engine
+    excluded = {engine.PROP_NOM, engine.PROP_DESCRIPTION, engine.PROP_DUREE_INIT, engine.PROP_DUREE_ACTU,
+                engine.PROP_TACHES, engine.PROP_HASH, *REAL_DURATION_PROPS}
+    lines = []
+    for name in page.get("properties", {}):
+        if name in excluded:
+            continue
+        value = engine.get_property_value(page, name)
+        if value:
+            lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+def task_cases(notion, limit: int, rng: random.Random, history_size: Optional[int], with_content: bool) -> List[Dict]:
+    """Tâches de l'historique (temps réel connu), chacune avec l'historique privé d'elle-même"""
+    import main as task_engine
+    from gpt_estimator import GPTEstimator
+    history = task_engine.get_historical_tasks()
+    sample = rng.sample(history, limit) if limit and limit < len(history) else history
+    cases = []
+    for task in sample:
+        others = [t for t in history if t["id"] != task["id"]]
+        similar = GPTEstimator._similar_tasks(task, others)
+        cases.append({
+            "kind": "tasks", "id": task["id"], "nom": task["nom"], "actual": float(task["temps_reel"]),
+            "inputs": {
+                "task_name": task["nom"],
+                "task_description": task["description"],
+                "project_context": PROJECT_CONTEXT,
+                "historical_tasks": similar[:history_size] if history_size is not None else similar,
+                "task_content": notion.get_page_content(task["id"]) if with_content else ""
+            }
+        })
+    return cases
+
+
+def project_cases(notion, limit: int, rng: random.Random, history_size: Optional[int], with_content: bool) -> List[Dict]:
+    """Projets à durée réelle connue (pas la durée IA ACTU), historique privé du projet évalué"""
+    import estimate_projects as engine
+    from manifest import Manifest
+    config = engine.get_config()
+    pages = {page["id"]: page for page in notion.query_database(config.db_projets)}
+    history = engine.get_historical_projects(list(pages.values()))
+    known = [project for project in history if project.get("duree_source") == "reelle"]
+    sample = rng.sample(known, limit) if limit and limit < len(known) else known
+    task_store = Manifest.load("taches", config.db_taches)
+    cases = []
+    for project in sample:
+        page = pages[project["id"]]
+        others = [p for p in history if p["id"] != project["id"]]
+        task_ids = notion.get_relation_ids(page, engine.PROP_TACHES)
+        cases.append({
+            "kind": "projects", "id": project["id"], "nom": project["nom"], "actual": float(project["duree_reelle"]),
+            "inputs": {
+                "project_name": project["nom"],
+                "project_description": project["description"] + "\n\nCONTEXTE: " + project_context(page),
+                "project_content": notion.get_page_content(project["id"]) if with_content else "",
+                "tasks_summary": engine.get_tasks_summary(task_ids, task_store),
+                "historical_projects": others[:history_size] if history_size is not None else others
+            }
+        })
+    return cases
+
+
+def run_case(estimator, engine: str, case: Dict, cache: ResponseCache) -> Dict:
+    """Une estimation (depuis le cache si la même requête a déjà été faite)"""
+    import metrics
+    from main import minutes_to_hours
+    key = cache.key(engine, estimator.model, case["kind"], case["inputs"])
+    cached = cache.get(key)
+    if cached is not None:
+        value, seconds, tokens = cached["value"], cached["seconds"], cached["tokens"]
+    else:
+        started = time.perf_counter()
+        with metrics.usage() as tokens:
+            if case["kind"] == "tasks":
+                value = estimator.estimate_task_time(**case["inputs"])
+            else:
+                value = estimator.estimate_project_duration(**case["inputs"])
+        seconds = round(time.perf_counter() - started, 3)
+        tokens = dict(tokens)
+        if value is not None:
+            cache.put(key, value, seconds, tokens)
+    # Tâches : comparées en heures, telles qu'elles seraient écrites dans Notion
+    predicted = minutes_to_hours(value) if value is not None and case["kind"] == "tasks" else value
+    return {"engine": engine, "kind": case["kind"], "id": case["id"], "nom": case["nom"], "actual": case["actual"],
+            "predicted": predicted, "seconds": seconds, "tokens": tokens, "cached": cached is not None}
+
+
+def score(results: List[Dict], price: Optional[tuple]) -> Dict:
+    """Précision, latence, tokens et coût d'un moteur sur un type d'éléments"""
+    from estimate_projects import VALID_DURATIONS
+    answered = [r for r in results if r["predicted"] is not None]
+    errors = [r["predicted"] - r["actual"] for r in answered]
+    relative = [abs(r["predicted"] - r["actual"]) / r["actual"] for r in answered if r["actual"]]
+    seconds = [r["seconds"] for r in results]
+    prompt_tokens = sum(r["tokens"].get("prompt", 0) for r in results)
+    completion_tokens = sum(r["tokens"].get("completion", 0) for r in results)
+    report = {
+        "cases": len(results), "answered": len(answered), "cached": sum(1 for r in results if r["cached"]),
+        "mae": round(sum(abs(e) for e in errors) / len(errors), 3) if errors else None,
+        "bias": round(sum(errors) / len(errors), 3) if errors else None,
+        "median_relative_error": round(percentile(relative, 0.5), 3) if relative else None,
+        "latency_p50_seconds": percentile(seconds, 0.5),
+        "latency_p95_seconds": percentile(seconds, 0.95),
+        "tokens_per_estimate": round((prompt_tokens + completion_tokens) / len(results), 1) if results else None,
+    }
+    if answered and results[0]["kind"] == "projects":
+        def bucket(weeks):
+            return min(VALID_DURATIONS, key=lambda value: abs(value - weeks))
+        hits = sum(1 for r in answered if bucket(r["predicted"]) == bucket(r["actual"]))
+        report["bucket_hit_rate"] = round(hits / len(answered), 3)
+    if price is not None and results:
+        cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1e6
+        report["eur_per_estimate"] = round(cost / len(results), 6)
+    return report
+
+
+def parse_prices(values: List[str]) -> Dict[str, tuple]:
+    """--price moteur=entrée:sortie (€ par million de tokens)"""
+    prices = {}
+    for value in values or []:
+        engine, _, rates = value.partition("=")
+        prompt, _, completion = rates.partition(":")
+        prices[engine.strip()] = (float(prompt), float(completion or prompt))
+    return prices
+
+
+def print_report(scores: Dict[str, Dict[str, Dict]]):
+    for kind, by_engine in scores.items():
+        unit = "h" if kind == "tasks" else "sem"
+        print(f"\n📊 {'Tâches' if kind == 'tasks' else 'Projets'}")
+        for engine, report in by_engine.items():
+            line = (f"   {engine:<7} {report['answered']:>4}/{report['cases']:<4} "
+                    f"MAE {report['mae'] if report['mae'] is not None else '?'}{unit}  "
+                    f"biais {report['bias'] if report['bias'] is not None else '?'}{unit}  "
+                    f"err. rel. méd. {report['median_relative_error']}  "
+                    f"p50 {report['latency_p50_seconds']}s  p95 {report['latency_p95_seconds']}s  "
+                    f"{report['tokens_per_estimate']} tokens/est.")
+            if "bucket_hit_rate" in report:
+                line += f"  bon palier {report['bucket_hit_rate'] * 100:.0f} %"
+            if "eur_per_estimate" in report:
+                line += f"  {report['eur_per_estimate']:.5f} €/est."
+            print(line + (f"  ({report['cached']} en cache)" if report["cached"] else ""))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Évaluation des estimateurs de Martine IA sur l'historique")
+    parser.add_argument("--engines", default="gpt", help="moteurs: gpt,gemini")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="éléments: tasks,projects")
+    parser.add_argument("--limit", type=int, default=50, help="éléments tirés au hasard par type (0 = tous)")
+    parser.add_argument("--history", type=int, help="taille maximale de l'historique transmis (défaut: comme le moteur)")
+    parser.add_argument("--workers", type=int, default=4, help="estimations simultanées")
+    parser.add_argument("--no-content", action="store_true", help="n'envoie pas le contenu des pages (pas de lecture)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore le cache des réponses")
+    parser.add_argument("--price", action="append", metavar="MOTEUR=ENTRÉE:SORTIE",
+                        help="€ par million de tokens, ex: gpt=2.5:10 (répétable)")
+    parser.add_argument("--offline", action="store_true", help="lit le miroir local au lieu de Notion")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="fichier de résultats (défaut: logs/evaluations/eval_<horodatage>.json)")
+    args = parser.parse_args(argv)
+
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [name for name in engines if name not in ENGINES] + [name for name in kinds if name not in KINDS]
+    if unknown:
+        print(f"❌ Inconnu: {', '.join(unknown)} (moteurs: {', '.join(ENGINES)} ; éléments: {', '.join(KINDS)})")
+        return 1
+
+    import main as task_engine
+    import estimate_projects as project_engine
+    import manifest
+    from config import load_env
+    from martine import SharedResources
+
+    load_env()
+    shared = SharedResources(offline=args.offline)
+    try:
+        estimators = {engine: shared.estimator(engine) for engine in engines}
+        notion = shared.notion()
+    except (ValueError, FileNotFoundError) as e:
+        print(e)
+        return 1
+    task_engine.configure(config=shared.config(), notion=notion)
+    project_engine.configure(config=shared.config(), notion=notion)
+
+    rng = random.Random(args.seed)
+    cases = []
+    if "tasks" in kinds:
+        cases += task_cases(notion, args.limit, rng, args.history, not args.no_content)
+    if "projects" in kinds:
+        cases += project_cases(notion, args.limit, rng, args.history, not args.no_content)
+    if not cases:
+        print("❌ Aucun élément à durée réelle connue")
+        return 1
+
+    cache = ResponseCache(manifest.CACHE_DIR / "eval_responses.jsonl", enabled=not args.no_cache)
+    jobs = [(engine, case) for engine in engines for case in cases]
+    print(f"\n🧪 {len(cases)} éléments × {len(engines)} moteur(s), {args.workers} en parallèle...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = list(pool.map(lambda job: run_case(estimators[job[0]], job[0], job[1], cache), jobs))
+    elapsed = time.perf_counter() - started
+
+    prices = parse_prices(args.price)
+    scores = {
+        kind: {engine: score([r for r in results if r["engine"] == engine and r["kind"] == kind], prices.get(engine))
+               for engine in engines}
+        for kind in kinds if any(r["kind"] == kind for r in results)
+    }
+    print_report(scores)
+    print(f"\n⏱️ {elapsed:.1f}s")
+
+    output = Path(args.output) if args.output else \
+        ROOT / "logs" / "evaluations" / f"eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {"engines": engines, "models": {engine: estimators[engine].model for engine in engines},
+                   "kinds": kinds, "limit": args.limit, "history": args.history, "content": not args.no_content,
+                   "seed": args.seed, "offline": args.offline},
+        "scores": scores,
+        "results": results
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 Résultats: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+MARTINE IA - Serveur LLM factice (compatible OpenAI et Gemini)
+Remplace les API OpenAI et Gemini en local pour tester sans quota ni réseau :
+chat-completions, fichiers et API Batch (les jobs se terminent après --batch-delay
+secondes), generateContent. Les réponses sont déterministes (dérivées du prompt).
+Injection de pannes pour les tests de charge et de résilience : latence tirée d'une
+distribution, réponses 429 (avec Retry-After) et 500, réponses malformées, blocs
+d'usage (tokens) optionnels. Compteurs par route et par résultat : GET /_stats.
+
+Usage:
+    python tools/fake_llm_server.py --port 8766 --batch-delay 5
+    python tools/fake_llm_server.py --latency lognormal:800:0.5 --rate-429 0.05 --rate-500 0.01 --rate-malformed 0.02
+    # puis dans le .env : GPT_BASE_URL=http://127.0.0.1:8766/v1
+    #                     GEMINI_BASE_URL=http://127.0.0.1:8766/v1beta
+"""
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_PORT = 8766
+PROJECT_WEEKS = (0.5, 1, 1.5, 2, 3, 4, 6, 8, 12)
+MALFORMED_ANSWERS = ("environ deux heures", "", "{\"minutes\": ")
+
+
+def answer_minutes(prompt: str) -> int:
+    """Estimation déterministe (15 à 240 min, par quart d'heure) dérivée du prompt"""
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    return 15 * (1 + digest % 16)
+
+
+def answer_text(prompt: str) -> str:
+    """Réponse attendue par le prompt : durée en semaines (projets) ou en minutes (tâches)"""
+    minutes = answer_minutes(prompt)
+    if "EN SEMAINES" in prompt:
+        return str(PROJECT_WEEKS[minutes // 15 % len(PROJECT_WEEKS)])
+    return str(minutes)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Distribution de latence (millisecondes) -> tirage en secondes :
+    "0", "fixed:200", "uniform:50:500", "exp:300" (moyenne), "lognormal:800:0.5" (médiane, sigma)
+    """
+    kind, _, params = (spec or "0").partition(":")
+    try:
+        values = [float(v) for v in params.split(":")] if params else []
+        if kind.replace(".", "", 1).isdigit():
+            kind, values = "fixed", [float(kind)]
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0] / 1000
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1]) / 1000
+        if kind == "exp" and len(values) == 1:
+            return lambda rng: rng.expovariate(1 / values[0]) / 1000 if values[0] else 0.0
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f"latence invalide: {spec} (fixed:MS, uniform:MIN:MAX, exp:MOY, lognormal:MED:SIGMA)")
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, bytes]:
+    """Champs d'un formulaire multipart {nom: contenu}"""
+    message = BytesParser(policy=default_policy).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+    )
+    return {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+            for part in message.iter_parts()}
+
+
+class FakeLLM:
+    """État du serveur : fichiers déposés, jobs batch, pannes injectées et compteurs"""
+
+    def __init__(self, batch_delay: float = 2.0, latency: str = "0", rate_429: float = 0.0,
+                 rate_500: float = 0.0, rate_malformed: float = 0.0, retry_after: float = 1.0,
+                 usage: bool = True, seed: Optional[int] = None):
+        self.batch_delay = batch_delay
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_malformed = rate_malformed
+        self.retry_after = retry_after
+        self.usage = usage
+        self.random = random.Random(seed)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.requests = 0
+        self.counts: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def draw_fault(self) -> Optional[str]:
+        """Panne injectée pour un appel synchrone : "429", "500", "malformed" ou None"""
+        with self.lock:
+            roll = self.random.random()
+        for fault, rate in (("429", self.rate_429), ("500", self.rate_500), ("malformed", self.rate_malformed)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def simulate_call(self, route: str) -> Tuple[Optional[str], Dict]:
+        """Attente (distribution de latence) et tirage d'une panne ; compte l'appel"""
+        with self.lock:
+            delay = self.latency(self.random)
+        if delay > 0:
+            time.sleep(delay)
+        fault = self.draw_fault()
+        with self.lock:
+            self.counts[f"{route}.{fault or 'ok'}"] += 1
+        headers = {"Retry-After": str(self.retry_after)} if fault == "429" else {}
+        return fault, headers
+
+    def malformed_text(self) -> str:
+        with self.lock:
+            return self.random.choice(MALFORMED_ANSWERS)
+
+    def chat_completion(self, body: Dict, malformed: bool = False) -> Tuple[int, Dict]:
+        """Réponse chat-completions (le contenu est une durée en minutes ou en semaines)"""
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+        prompt_tokens = len(prompt) // 4
+        response = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant",
+                                                 "content": self.malformed_text() if malformed else answer_text(prompt)},
+                         "finish_reason": "stop"}],
+        }
+        if self.usage:
+            response["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": 2,
+                                 "total_tokens": prompt_tokens + 2}
+        return 200, response
+
+    def generate_content(self, body: Dict, malformed: bool = False) -> Tuple[int, Dict]:
+        """Réponse generateContent (format Gemini)"""
+        prompt = "\n".join(part.get("text", "") for content in body.get("contents", [])
+                           for part in content.get("parts", []))
+        prompt_tokens = len(prompt) // 4
+        response = {
+            "candidates": [{"content": {"role": "model", "parts": [
+                {"text": self.malformed_text() if malformed else answer_text(prompt)}]},
+                "finishReason": "STOP", "index": 0}],
+            "modelVersion": "fake"
+        }
+        if self.usage:
+            response["usageMetadata"] = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 2,
+                                         "totalTokenCount": prompt_tokens + 2}
+        return 200, response
+
+    def upload_file(self, content_type: str, body: bytes) -> Tuple[int, Dict]:
+        fields = parse_multipart(content_type, body)
+        if "file" not in fields:
+            return 400, {"error": {"message": "file manquant"}}
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.files[file_id] = fields["file"]
+        return 200, {"id": file_id, "object": "file", "purpose": (fields.get("purpose") or b"").decode(),
+                     "bytes": len(fields["file"])}
+
+    def create_batch(self, body: Dict) -> Tuple[int, Dict]:
+        input_file = self.files.get(body.get("input_file_id"))
+        if input_file is None:
+            return 400, {"error": {"message": "input_file_id inconnu"}}
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        lines = [json.loads(line) for line in input_file.decode("utf-8").splitlines() if line.strip()]
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint"),
+            "input_file_id": body.get("input_file_id"),
+            "completion_window": body.get("completion_window"),
+            "created_at": int(time.time()),
+            "_lines": lines,
+            "_ready_at": time.monotonic() + self.batch_delay
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        return 200, self.batch_view(batch)
+
+    def batch_view(self, batch: Dict) -> Dict:
+        """État public d'un job (terminé après batch_delay, fichier de sortie créé à ce moment)"""
+        total = len(batch["_lines"])
+        if time.monotonic() >= batch["_ready_at"] and "output_file_id" not in batch:
+            output = []
+            for line in batch["_lines"]:
+                status, response = self.chat_completion(line.get("body", {}))
+                output.append({"id": f"batch_req_{uuid.uuid4().hex[:8]}", "custom_id": line.get("custom_id"),
+                               "response": {"status_code": status, "body": response}, "error": None})
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            with self.lock:
+                self.files[file_id] = "\n".join(json.dumps(entry) for entry in output).encode("utf-8")
+            batch["output_file_id"] = file_id
+        done = "output_file_id" in batch
+        view = {key: value for key, value in batch.items() if not key.startswith("_")}
+        view.update(status="completed" if done else "in_progress",
+                    request_counts={"total": total, "completed": total if done else 0, "failed": 0})
+        return view
+
+    def get_batch(self, batch_id: str) -> Tuple[int, Dict]:
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return 404, {"error": {"message": "batch inconnu"}}
+        return 200, self.batch_view(batch)
+
+    def file_content(self, file_id: str) -> Optional[bytes]:
+        return self.files.get(file_id)
+
+
+def make_server(llm: FakeLLM, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Serveur HTTP du faux fournisseur (port 0 = port libre)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload, raw: bool = False, headers: Optional[Dict] = None):
+            body = payload if raw else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _generate(self, route: str, handler, payload: Dict):
+            """Appel synchrone (chat-completions, generateContent) avec pannes injectées"""
+            fault, headers = llm.simulate_call(route)
+            if fault == "429":
+                return self._reply(429, {"error": {"code": 429, "message": "Rate limit (injecté)"}}, headers=headers)
+            if fault == "500":
+                return self._reply(500, {"error": {"code": 500, "message": "Erreur interne (injectée)"}})
+            status, response = handler(payload, malformed=fault == "malformed")
+            self._reply(status, response)
+
+        def do_POST(self):
+            with llm.lock:
+                llm.requests += 1
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            if self.path == "/v1/files":
+                return self._reply(*llm.upload_file(self.headers.get("Content-Type", ""), body))
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return self._reply(400, {"error": {"message": "JSON invalide"}})
+            path = urlparse(self.path).path
+            if path == "/v1/chat/completions":
+                return self._generate("chat", llm.chat_completion, payload)
+            if path.startswith("/v1beta/models/") and path.endswith(":generateContent"):
+                return self._generate("gemini", llm.generate_content, payload)
+            if self.path == "/v1/batches":
+                return self._reply(*llm.create_batch(payload))
+            self._reply(404, {"error": {"message": f"route inconnue {self.path}"}})
+
+        def do_GET(self):
+            with llm.lock:
+                llm.requests += 1
+            if self.path == "/_stats":
+                with llm.lock:
+                    return self._reply(200, dict(llm.counts, requests=llm.requests))
+            parts = self.path.strip("/").split("/")
+            if parts[:2] == ["v1", "batches"] and len(parts) == 3:
+                return self._reply(*llm.get_batch(parts[2]))
+            if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content":
+                content = llm.file_content(parts[2])
+                if content is None:
+                    return self._reply(404, {"error": {"message": "fichier inconnu"}})
+                return self._reply(200, content, raw=True)
+            self._reply(404, {"error": {"message": f"route inconnue {self.path}"}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serveur LLM factice compatible OpenAI et Gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="secondes avant la fin d'un job batch")
+    parser.add_argument("--latency", default="0",
+                        help="latence en ms: fixed:MS, uniform:MIN:MAX, exp:MOY ou lognormal:MED:SIGMA")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="proportion de réponses 429 (0-1)")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="proportion de réponses 500 (0-1)")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="proportion de réponses non parsables (0-1)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After des 429 (s)")
+    parser.add_argument("--no-usage", action="store_true", help="réponses sans bloc d'usage (tokens)")
+    parser.add_argument("--seed", type=int, help="graine des tirages (runs reproductibles)")
+    args = parser.parse_args(argv)
+
+    try:
+        llm = FakeLLM(args.batch_delay, args.latency, args.rate_429, args.rate_500, args.rate_malformed,
+                      args.retry_after, not args.no_usage, args.seed)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    server = make_server(llm, args.host, args.port)
+    address = f"http://{args.host}:{server.server_address[1]}"
+    print(f"🧪 LLM factice sur {address}/v1 (OpenAI) et {address}/v1beta (Gemini) (Ctrl+C pour arrêter)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Serveur arrêté")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
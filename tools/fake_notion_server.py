@@ -0,0 +1,379 @@
+"""
+MARTINE IA - Serveur Notion factice (benchmarks)
+Sert en local les routes de l'API Notion utilisées par les moteurs, sur des bases
+synthétiques (tâches feuilles/parents, projets, arbres de blocs) ou rejouées depuis
+un miroir (`cache/mirror/`, voir `martine.py sync`). Reproduit la pagination
+(100 résultats), la troncature des relations à 25 éléments, une latence injectée
+et des réponses 429. Compteurs par route : GET /_stats (POST /_reset pour remettre à zéro).
+
+Usage:
+    python tools/fake_notion_server.py --tasks 10000 --latency-ms 80 --rate-429 0.02
+    python tools/fake_notion_server.py --replay cache/mirror
+    # puis dans le .env : NOTION_BASE_URL=http://127.0.0.1:8767/v1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from mirror import applied_property
+
+DEFAULT_PORT = 8767
+DB_TACHES = "bench0000-0000-4000-8000-000000000001"
+DB_PROJETS = "bench0000-0000-4000-8000-000000000002"
+PAGE_SIZE = 100
+RELATION_LIMIT = 25
+
+WORDS = ("analyse", "maquette", "API", "export", "revue", "tests", "migration", "formation",
+         "tableau", "budget", "contrat", "relance", "données", "rapport", "intégration", "atelier")
+
+
+def page_id(prefix: int, index: int) -> str:
+    """Id stable au format Notion"""
+    return f"{prefix:08x}-{index >> 32 & 0xffff:04x}-4{index >> 20 & 0xfff:03x}-8{index >> 8 & 0xfff:03x}-{index:012x}"
+
+
+def text(value: str) -> List[Dict]:
+    return [{"type": "text", "text": {"content": value}, "plain_text": value}]
+
+
+def now_notion() -> str:
+    """last_edited_time au format Notion (arrondi à la minute)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+class FakeNotion:
+    """Bases, pages et blocs en mémoire, avec injection de latence et de 429"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_429: float = 0.0,
+                 retry_after: float = 0.5, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.databases: Dict[str, List[str]] = {}
+        self.schemas: Dict[str, Dict] = {}
+        self.pages: Dict[str, Dict] = {}
+        self.blocks: Dict[str, List[Dict]] = {}
+        self.counts: Counter = Counter()
+        self.lock = threading.Lock()
+
+    # --- Données ---------------------------------------------------------------
+
+    def add_page(self, database_id: str, page: Dict):
+        page.setdefault("object", "page")
+        page.setdefault("parent", {"type": "database_id", "database_id": database_id})
+        self.databases.setdefault(database_id, []).append(page["id"])
+        self.pages[page["id"]] = page
+        schema = self.schemas.setdefault(database_id, {})
+        for name, prop in page.get("properties", {}).items():
+            prop.setdefault("id", f"p{len(schema) if name not in schema else list(schema).index(name)}")
+            schema.setdefault(name, {"id": prop["id"], "name": name, "type": prop.get("type")})
+
+    def random_blocks(self, count: int) -> List[Dict]:
+        """Arbre de blocs réaliste : titres, paragraphes, listes (quelques blocs avec enfants)"""
+        blocks = []
+        for index in range(count):
+            block_type = self.random.choice(("paragraph", "paragraph", "bulleted_list_item", "heading_2", "to_do"))
+            words = " ".join(self.random.choice(WORDS) for _ in range(self.random.randint(4, 30)))
+            block = {"object": "block", "id": f"blk-{self.random.getrandbits(64):016x}", "type": block_type,
+                     block_type: {"rich_text": text(words)}, "has_children": index % 10 == 9}
+            blocks.append(block)
+            if block["has_children"]:
+                self.blocks[block["id"]] = [
+                    {"object": "block", "id": f"blk-{self.random.getrandbits(64):016x}", "type": "paragraph",
+                     "paragraph": {"rich_text": text(self.random.choice(WORDS))}, "has_children": False}
+                ]
+        return blocks
+
+    @classmethod
+    def synthetic(cls, tasks: int, projects: Optional[int] = None, seed: int = 0, **options) -> "FakeNotion":
+        """
+        Bases synthétiques : `tasks` tâches (~1/10 parents de 3 à 8 sous-tâches, 20 % avec
+        temps réel) réparties sur `projects` projets (défaut: tasks / 50)
+        """
+        fake = cls(seed=seed, **options)
+        rng = fake.random
+        projects = projects or max(5, tasks // 50)
+        edited = "2026-01-01T00:00:00.000Z"
+        project_ids = [page_id(2, index) for index in range(projects)]
+        project_tasks: Dict[str, List[str]] = {pid: [] for pid in project_ids}
+
+        index = 0
+        while index < tasks:
+            project = rng.choice(project_ids)
+            children = rng.randint(3, 8) if rng.random() < 0.1 and index + 9 < tasks else 0
+            parent_id = page_id(1, index)
+            child_ids = [page_id(1, index + 1 + offset) for offset in range(children)]
+            for position, task_id in enumerate([parent_id] + child_ids):
+                is_parent = position == 0 and children > 0
+                name = " ".join(rng.choice(WORDS) for _ in range(3)).capitalize()
+                properties = {
+                    "Nom": {"type": "title", "title": text(f"{name} {index + position}")},
+                    "Description": {"type": "rich_text", "rich_text": text(" ".join(rng.choice(WORDS) for _ in range(12)))},
+                    "Type": {"type": "select", "select": {"name": "Tâche"}},
+                    "Sous-élément": {"type": "relation", "relation": [{"id": c} for c in child_ids] if is_parent else []},
+                    "Projet/Tlt": {"type": "relation", "relation": [{"id": project}]},
+                    "Priorité": {"type": "select", "select": {"name": rng.choice(("Haute", "Moyenne", "Basse"))}},
+                    "Statut": {"type": "status", "status": {"name": rng.choice(("En cours", "À faire", "Terminé"))}},
+                    "Temps réel (h)": {"type": "number", "number": rng.choice((1, 2, 4, 8)) if rng.random() < 0.2 else None},
+                    "🤖⏱️Temps est IA (h) ENFANT": {"type": "number", "number": None},
+                    "🤖⏱️Hash Source IA": {"type": "rich_text", "rich_text": []},
+                }
+                fake.add_page(DB_TACHES, {"id": task_id, "last_edited_time": edited, "properties": properties})
+                fake.blocks[task_id] = fake.random_blocks(rng.randint(3, 30))
+                project_tasks[project].append(task_id)
+            index += 1 + children
+
+        for position, project in enumerate(project_ids):
+            properties = {
+                "Projet": {"type": "title", "title": text(f"Projet {position}")},
+                "Description": {"type": "rich_text", "rich_text": text(" ".join(rng.choice(WORDS) for _ in range(20)))},
+                "Tâches IA": {"type": "relation", "relation": [{"id": t} for t in project_tasks[project]]},
+                "Priorité": {"type": "select", "select": {"name": rng.choice(("Haute", "Moyenne", "Basse"))}},
+                "Statut": {"type": "status", "status": {"name": rng.choice(("En cours", "À faire"))}},
+                "Durée réelle (sem)": {"type": "number", "number": rng.choice((2, 4, 8)) if rng.random() < 0.2 else None},
+                "🤖⏱️I Durée est IA INIT (sem)": {"type": "number", "number": None},
+                "🤖⏱️A Durée est IA ACTU (sem)": {"type": "number", "number": None},
+                "🤖⏱️Hash Source IA": {"type": "rich_text", "rich_text": []},
+            }
+            fake.add_page(DB_PROJETS, {"id": project, "last_edited_time": edited, "properties": properties})
+            fake.blocks[project] = fake.random_blocks(rng.randint(5, 40))
+        return fake
+
+    @classmethod
+    def replay(cls, path: str, **options) -> "FakeNotion":
+        """
+        Bases rejouées : dossier de miroir (`cache/mirror/`, contenus servis en paragraphes)
+        ou fichier JSON {"databases": {id: [pages]}, "blocks": {page_id: [blocs]}}
+        """
+        fake = cls(**options)
+        path = Path(path)
+        if path.is_dir():
+            for db_path in sorted(path.glob("db_*.json")):
+                with open(db_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for page in data.get("pages", {}).values():
+                    fake.add_page(data["database_id"], page)
+            contents_path = path / "contents.json"
+            contents = json.loads(contents_path.read_text(encoding="utf-8")) if contents_path.exists() else {}
+            for pid, content in contents.items():
+                fake.blocks[pid] = [{"object": "block", "id": f"{pid}-{n}", "type": "paragraph",
+                                     "paragraph": {"rich_text": text(line)}, "has_children": False}
+                                    for n, line in enumerate(content.splitlines())]
+            return fake
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for database_id, pages in data.get("databases", {}).items():
+            for page in pages:
+                fake.add_page(database_id, page)
+        fake.blocks.update(data.get("blocks", {}))
+        return fake
+
+    # --- Sérialisation ---------------------------------------------------------
+
+    def page_view(self, page: Dict) -> Dict:
+        """Page telle que renvoyée par l'API (relations tronquées à 25 éléments)"""
+        properties = {}
+        for name, prop in page.get("properties", {}).items():
+            if prop.get("type") == "relation" and len(prop.get("relation", [])) > RELATION_LIMIT:
+                prop = dict(prop, relation=prop["relation"][:RELATION_LIMIT], has_more=True)
+            properties[name] = prop
+        return dict(page, properties=properties)
+
+    @staticmethod
+    def paginate(items: List, cursor: Optional[str], page_size: int) -> Tuple[List, Dict]:
+        start = int(cursor or 0)
+        size = max(1, min(PAGE_SIZE, int(page_size or PAGE_SIZE)))
+        chunk = items[start:start + size]
+        more = start + size < len(items)
+        return chunk, {"has_more": more, "next_cursor": str(start + size) if more else None}
+
+    def matches(self, page: Dict, filter_obj: Optional[Dict]) -> bool:
+        if not filter_obj:
+            return True
+        if filter_obj.get("timestamp") == "last_edited_time":
+            since = filter_obj.get("last_edited_time", {}).get("on_or_after", "")
+            return (page.get("last_edited_time") or "") >= since
+        if "relation" in filter_obj:
+            relation = page.get("properties", {}).get(filter_obj.get("property"), {}).get("relation", [])
+            return not relation if filter_obj["relation"].get("is_empty") else bool(relation)
+        raise ValueError(f"filtre non supporté: {filter_obj}")
+
+    # --- Routes ----------------------------------------------------------------
+
+    def handle(self, method: str, path: str, query: Dict, body: Dict) -> Tuple[int, Dict, Dict]:
+        """Traite une requête ; retourne (code, corps, en-têtes)"""
+        parts = path.strip("/").split("/")
+        if parts[0] == "_stats":
+            with self.lock:
+                return 200, dict(self.counts), {}
+        if parts[0] == "_reset":
+            with self.lock:
+                self.counts.clear()
+            return 200, {}, {}
+        if parts[0] != "v1":
+            return 404, {"message": "route inconnue"}, {}
+        parts = parts[1:]
+        route = self.route_name(method, parts)
+
+        delay = self.latency_ms + (self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        with self.lock:
+            self.counts[route] += 1
+            limited = self.rate_429 and self.random.random() < self.rate_429
+            if limited:
+                self.counts["429"] += 1
+        if limited:
+            return 429, {"object": "error", "code": "rate_limited"}, {"Retry-After": str(self.retry_after)}
+
+        with self.lock:
+            return self.dispatch(route, parts, query, body)
+
+    @staticmethod
+    def route_name(method: str, parts: List[str]) -> str:
+        if parts[:1] == ["databases"]:
+            if len(parts) == 3 and parts[2] == "query":
+                return "databases.query"
+            return "databases.update" if method == "PATCH" else "databases.retrieve"
+        if parts[:1] == ["pages"]:
+            if len(parts) == 4 and parts[2] == "properties":
+                return "pages.properties"
+            if len(parts) == 1:
+                return "pages.create"
+            return "pages.update" if method == "PATCH" else "pages.retrieve"
+        if parts[:1] == ["blocks"]:
+            return "blocks.children"
+        return "unknown"
+
+    def dispatch(self, route: str, parts: List[str], query: Dict, body: Dict) -> Tuple[int, Dict, Dict]:
+        if route == "databases.query":
+            ids = self.databases.get(parts[1])
+            if ids is None:
+                return 404, {"object": "error", "code": "object_not_found"}, {}
+            try:
+                pages = [self.pages[pid] for pid in ids if self.matches(self.pages[pid], body.get("filter"))]
+            except ValueError as e:
+                return 400, {"object": "error", "code": "validation_error", "message": str(e)}, {}
+            chunk, more = self.paginate(pages, body.get("start_cursor"), body.get("page_size"))
+            return 200, dict({"object": "list", "results": [self.page_view(p) for p in chunk]}, **more), {}
+
+        if route in ("databases.retrieve", "databases.update"):
+            schema = self.schemas.get(parts[1])
+            if schema is None:
+                return 404, {"object": "error", "code": "object_not_found"}, {}
+            for name, config in (body.get("properties") or {}).items():
+                prop_type = next(iter(config), "rich_text")
+                schema[name] = {"id": f"p{len(schema)}", "name": name, "type": prop_type}
+            return 200, {"object": "database", "id": parts[1], "properties": schema}, {}
+
+        if route in ("pages.retrieve", "pages.update", "pages.properties"):
+            page = self.pages.get(parts[1])
+            if page is None:
+                return 404, {"object": "error", "code": "object_not_found"}, {}
+            if route == "pages.properties":
+                prop = next((p for p in page["properties"].values() if p.get("id") == parts[3]), None)
+                if prop is None:
+                    return 404, {"object": "error", "code": "object_not_found"}, {}
+                items = [{"object": "property_item", "type": "relation", "relation": rel}
+                         for rel in prop.get("relation", [])]
+                chunk, more = self.paginate(items, query.get("start_cursor"), query.get("page_size"))
+                return 200, dict({"object": "list", "results": chunk}, **more), {}
+            if route == "pages.update":
+                for name, value in (body.get("properties") or {}).items():
+                    page["properties"][name] = applied_property(value, page["properties"].get(name))
+                page["last_edited_time"] = now_notion()
+            return 200, self.page_view(page), {}
+
+        if route == "blocks.children":
+            blocks = self.blocks.get(parts[1], [])
+            chunk, more = self.paginate(blocks, query.get("start_cursor"), query.get("page_size"))
+            return 200, dict({"object": "list", "results": chunk}, **more), {}
+
+        return 404, {"object": "error", "code": "invalid_request_url"}, {}
+
+
+def make_server(fake: FakeNotion, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Serveur HTTP de l'API factice (port 0 = port libre)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _serve(self, method: str):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                body = {}
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, payload, headers = fake.handle(method, url.path, query, body)
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._serve("GET")
+
+        def do_POST(self):
+            self._serve("POST")
+
+        def do_PATCH(self):
+            self._serve("PATCH")
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serveur Notion factice pour les benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--tasks", type=int, default=1000, help="tâches synthétiques")
+    parser.add_argument("--projects", type=int, help="projets synthétiques (défaut: tâches / 50)")
+    parser.add_argument("--replay", help="miroir (cache/mirror) ou fichier JSON à servir")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="proportion de réponses 429 (0-1)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    options = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_429=args.rate_429)
+    if args.replay:
+        fake = FakeNotion.replay(args.replay, **options)
+    else:
+        fake = FakeNotion.synthetic(args.tasks, args.projects, seed=args.seed, **options)
+    server = make_server(fake, args.host, args.port)
+    print(f"🧪 Notion factice sur http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C pour arrêter)")
+    for database_id, ids in fake.databases.items():
+        print(f"   base {database_id}: {len(ids)} pages")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Serveur arrêté")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
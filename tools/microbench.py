@@ -0,0 +1,291 @@
+"""
+MARTINE IA - Micro-benchmarks CPU des chemins chauds
+Mesure, sur des données synthétiques de plusieurs tailles, le coût des fonctions
+appelées par page : lecture des propriétés (get_property_value), aplatissement du
+contenu (blocks_to_text), hash projet (composants + racine), filtre de l'historique
+(_similar_tasks) et journal du run (RunLog.emit, une ligne par estimation). Pour chaque cas : durée par
+appel (meilleure de plusieurs répétitions), pic d'allocation (tracemalloc) et exposant
+de croissance entre deux tailles (1 = linéaire, 2 = quadratique).
+
+Une référence enregistrée (--save-baseline) sert de seuil : --check échoue (code 1)
+si un cas est plus lent ou alloue plus que la référence au-delà de --threshold.
+
+Usage:
+    python tools/microbench.py                          # tailles 1 000 et 10 000
+    python tools/microbench.py --sizes 1000,10000,100000 --cases history_filter,run_log
+    python tools/microbench.py --save-baseline          # logs/benchmarks/microbench_baseline.json
+    python tools/microbench.py --check --threshold 1.3  # régression = code 1
+"""
+import sys
+import json
+import math
+import random
+import timeit
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+DEFAULT_SIZES = "1000,10000"
+DEFAULT_BASELINE = ROOT / "logs" / "benchmarks" / "microbench_baseline.json"
+DEFAULT_THRESHOLD = 1.3
+# En dessous, l'écart relève du bruit de mesure
+MIN_SECONDS = 20e-6
+MIN_ALLOC_KB = 64
+# Exposant de croissance signalé comme superlinéaire
+SUPERLINEAR = 1.5
+
+WORDS = ("analyse", "maquette", "API", "export", "revue", "tests", "migration", "formation",
+         "tableau", "budget", "contrat", "relance", "données", "rapport", "intégration", "atelier")
+
+
+def text(value: str) -> List[Dict]:
+    return [{"type": "text", "text": {"content": value}, "plain_text": value}]
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def synthetic_page(rng: random.Random, index: int, projects: int) -> Dict:
+    """Page de tâche avec les types de propriétés rencontrés dans les bases"""
+    return {
+        "id": f"page-{index:08d}",
+        "last_edited_time": "2026-01-01T00:00:00.000Z",
+        "properties": {
+            "Nom": {"id": "a", "type": "title", "title": text(f"{words(rng, 3)} {index}")},
+            "Description": {"id": "b", "type": "rich_text", "rich_text": text(words(rng, 12))},
+            "Type": {"id": "c", "type": "select", "select": {"name": "Tâche"}},
+            "Étiquettes": {"id": "d", "type": "multi_select", "multi_select": [{"name": w} for w in WORDS[:3]]},
+            "Statut": {"id": "e", "type": "status", "status": {"name": "En cours"}},
+            "Échéance": {"id": "f", "type": "date", "date": {"start": "2026-03-01"}},
+            "Projet/Tlt": {"id": "g", "type": "relation", "relation": [{"id": f"proj-{index % projects}"}]},
+            "Temps réel (h)": {"id": "h", "type": "number", "number": rng.choice((None, 1, 2, 4))},
+            "Jours restants": {"id": "i", "type": "formula", "formula": {"type": "number", "number": 12}},
+            "Temps agrégé": {"id": "j", "type": "rollup", "rollup": {"type": "number", "number": 3.5}},
+        }
+    }
+
+
+def synthetic_blocks(rng: random.Random, count: int) -> List[Dict]:
+    """Blocs d'une page (titres, paragraphes, listes, cases, blocs sans texte)"""
+    types = ("paragraph", "paragraph", "heading_2", "bulleted_list_item", "to_do", "divider")
+    blocks = []
+    for index in range(count):
+        block_type = rng.choice(types)
+        content = {} if block_type == "divider" else {"rich_text": text(words(rng, 10)) * 2}
+        blocks.append({"object": "block", "id": f"blk-{index}", "type": block_type, block_type: content})
+    return blocks
+
+
+# --- Cas mesurés : taille -> fonction sans argument ----------------------------
+
+def case_get_property_value(size: int) -> Callable:
+    """Lecture de toutes les propriétés de `size` pages"""
+    from notion_client import NotionClient
+    rng = random.Random(0)
+    client = NotionClient("bench")
+    pages = [synthetic_page(rng, i, max(1, size // 50)) for i in range(size)]
+    names = list(pages[0]["properties"])
+
+    def run():
+        for page in pages:
+            for name in names:
+                client.get_property_value(page, name)
+    return run
+
+
+def case_get_page_content(size: int) -> Callable:
+    """Aplatissement d'une page de `size` blocs"""
+    from notion_client import NotionClient
+    blocks = synthetic_blocks(random.Random(0), size)
+    return lambda: NotionClient.blocks_to_text(blocks)
+
+
+def case_project_hash(size: int) -> Callable:
+    """Hash d'un projet de `size` tâches liées (propriétés, racine des tâches, racine du projet)"""
+    from estimate_projects import PROP_DUREE_INIT, PROP_DUREE_ACTU, PROP_TACHES, PROP_HASH, calculate_project_hash
+    from source_hash import HASH_VERSION, hash_text, properties_component, tasks_root_hash
+    rng = random.Random(0)
+    project = synthetic_page(rng, 0, 1)
+    project["properties"][PROP_TACHES] = {"id": "t", "type": "relation",
+                                          "relation": [{"id": f"page-{i:08d}"} for i in range(size)]}
+    leaves = {f"page-{i:08d}": hash_text(str(i)) for i in range(size)}
+    context = {"page": project, "excluded": {PROP_DUREE_INIT, PROP_DUREE_ACTU, PROP_TACHES, PROP_HASH},
+               "nom": "Projet", "description": words(rng, 20), "full_context": words(rng, 40)}
+    content_hash = hash_text(words(rng, 500))
+
+    def run():
+        components = {"content": content_hash,
+                      "properties": properties_component(HASH_VERSION, context),
+                      "tasks": tasks_root_hash(leaves)}
+        return calculate_project_hash(components)
+    return run
+
+
+def case_history_filter(size: int) -> Callable:
+    """Filtre de l'historique (`size` tâches) pour un lot de 100 tâches à estimer"""
+    from gpt_estimator import GPTEstimator
+    rng = random.Random(0)
+    projects = [[f"proj-{i}"] for i in range(max(1, size // 50))]
+    history = [{"nom": words(rng, 3), "projet": rng.choice(projects), "temps_reel": rng.choice((0, 1, 2, 4))}
+               for _ in range(size)]
+    tasks = [{"id": f"page-{i}", "projet": rng.choice(projects)} for i in range(100)]
+
+    def run():
+        for task in tasks:
+            GPTEstimator._similar_tasks(task, history)
+    return run
+
+
+def case_run_log(size: int) -> Callable:
+    """Journal du run : `size` événements d'estimation écrits dans un fichier temporaire"""
+    import os
+    import tempfile
+    from main import minutes_to_hours
+    from run_log import RunLog
+    tasks = [{"id": f"page-{i:08d}", "nom": f"Tâche {i}", "minutes": float(15 * (1 + i % 16))} for i in range(size)]
+    path = Path(tempfile.gettempdir()) / f"martine_microbench_{os.getpid()}.jsonl"
+
+    def run():
+        run_log = RunLog(path, run_id="microbench", max_bytes=1 << 40)
+        for task in tasks:
+            run_log.emit("estimate", id=task["id"], name=task["nom"], minutes=task["minutes"],
+                         hours=minutes_to_hours(task["minutes"]), source="llm")
+        run_log.close()
+        path.unlink()
+    return run
+
+
+CASES = {
+    "get_property_value": case_get_property_value,
+    "get_page_content": case_get_page_content,
+    "project_hash": case_project_hash,
+    "history_filter": case_history_filter,
+    "run_log": case_run_log,
+}
+
+
+# --- Mesure ------------------------------------------------------------------
+
+def measure(func: Callable, repeat: int) -> Dict:
+    """Durée par appel (meilleure répétition) et pic d'allocation d'un appel"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_kb": round(peak / 1024, 1)}
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def growth(results: Dict[str, Dict]) -> Optional[float]:
+    """Exposant de croissance entre les deux plus grandes tailles mesurées"""
+    sizes = sorted(int(size) for size in results)
+    if len(sizes) < 2:
+        return None
+    small, large = results[str(sizes[-2])]["seconds"], results[str(sizes[-1])]["seconds"]
+    if small <= 0 or large <= 0:
+        return None
+    return round(math.log(large / small) / math.log(sizes[-1] / sizes[-2]), 2)
+
+
+def run_cases(cases: List[str], sizes: List[int], repeat: int) -> Dict:
+    report = {}
+    for name in cases:
+        print(f"\n🔬 {name}")
+        report[name] = {}
+        for size in sizes:
+            result = measure(CASES[name](size), repeat)
+            report[name][str(size)] = result
+            print(f"   {size:>8}  {format_seconds(result['seconds']):>10}  alloc {result['peak_kb']:>10.1f} Kio")
+        exponent = growth(report[name])
+        if exponent is not None:
+            marker = "⚠️ superlinéaire" if exponent >= SUPERLINEAR else "✅"
+            print(f"   croissance ~ n^{exponent} {marker}")
+    return report
+
+
+def check(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Régressions par rapport à la référence (durée ou allocation au-delà du seuil)"""
+    regressions = []
+    for name, sizes in report.items():
+        for size, result in sizes.items():
+            before = baseline.get("results", {}).get(name, {}).get(size)
+            if before is None:
+                continue
+            if result["seconds"] > max(before["seconds"], MIN_SECONDS) * threshold:
+                regressions.append(f"{name} [{size}] durée {format_seconds(before['seconds'])} → "
+                                   f"{format_seconds(result['seconds'])}")
+            if result["peak_kb"] > max(before["peak_kb"], MIN_ALLOC_KB) * threshold:
+                regressions.append(f"{name} [{size}] allocation {before['peak_kb']} → {result['peak_kb']} Kio")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks CPU de Martine IA")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="tailles, séparées par des virgules")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"cas: {', '.join(CASES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="répétitions (la meilleure est retenue)")
+    parser.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), metavar="FICHIER",
+                        help="enregistre les mesures comme référence")
+    parser.add_argument("--check", nargs="?", const=str(DEFAULT_BASELINE), metavar="FICHIER",
+                        help="compare à la référence (code 1 en cas de régression)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"ratio toléré par rapport à la référence (défaut: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        print(f"❌ Cas inconnus: {', '.join(unknown)} (disponibles: {', '.join(CASES)})")
+        return 1
+    sizes = sorted(int(size) for size in args.sizes.split(",") if size.strip())
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": run_cases(cases, sizes, args.repeat)
+    }
+
+    if args.save_baseline:
+        path = Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 Référence enregistrée: {path}")
+
+    if args.check:
+        path = Path(args.check)
+        if not path.exists():
+            print(f"❌ Référence introuvable: {path} (créez-la avec --save-baseline)")
+            return 1
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+        regressions = check(report["results"], baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} régression(s) au-delà de x{args.threshold}:")
+            for line in regressions:
+                print(f"   - {line}")
+            return 1
+        print(f"\n✅ Aucune régression par rapport à {path} (seuil x{args.threshold})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+MARTINE IA - Consultation du journal des runs
+Lit les journaux d'événements (logs/runs_*.jsonl et leurs archives, voir src/run_log.py)
+et résume les runs passés : durée, estimations, écritures réussies et échouées,
+motifs d'écart, runs interrompus (sans événement de fin). Retrouve aussi toutes
+les décisions prises pour une page, ou les événements bruts d'un run.
+
+Usage:
+    python tools/runs.py                          # 10 derniers runs
+    python tools/runs.py --engine taches --last 30
+    python tools/runs.py --run 20261019_101500_123_4242   # détail d'un run
+    python tools/runs.py --run 20261019_101500_123_4242 --event write --failed  # écritures échouées
+    python tools/runs.py --page <page_id>         # historique des décisions d'une page
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from run_log import log_files, read_events, summarize_runs
+
+
+def journal_pattern(engine: str = None, target: str = None) -> str:
+    """Motif des journaux à lire (tous par défaut)"""
+    if target:
+        return f"runs_{target}_{engine or ''}*.jsonl"
+    return f"runs_*{engine}*.jsonl" if engine else "runs_*.jsonl"
+
+
+def print_runs(runs: List[Dict]):
+    """Une ligne par run, du plus ancien au plus récent"""
+    if not runs:
+        print("Aucun run journalisé")
+        return
+    for run in runs:
+        status = "✅" if run["complete"] and not run["error"] else "❌" if run["error"] else "🛑"
+        engine = f"{run['target']}/" if run["target"] else ""
+        engine += run["engine"] or "?"
+        skips = ", ".join(f"{reason} {count}" for reason, count in sorted(run["skips"].items()))
+        print(f"{status} {run['run']}  {engine:<16} {run['elapsed']:>8.1f}s  "
+              f"{run['events'].get('estimate', 0):>5} estimations  "
+              f"{run['writes_ok']:>5} écrites  {run['writes_failed']:>3} échecs"
+              + (f"  | écartées: {skips}" if skips else ""))
+        if run["error"]:
+            print(f"      erreur: {run['error']}")
+
+
+def print_run(run: Dict, events: List[Dict]):
+    """Détail d'un run : résumé, motifs d'écart, phases et requêtes"""
+    print(f"Run {run['run']} ({run['engine'] or '?'}{', cible ' + run['target'] if run['target'] else ''})")
+    print(f"   Début: {run['started']}  Fin: {run['ended'] or 'aucune (run interrompu)'}  "
+          f"Durée: {run['elapsed']:.1f}s")
+    if run["error"]:
+        print(f"   Erreur: {run['error']}")
+    print(f"   Événements: {', '.join(f'{name} {count}' for name, count in sorted(run['events'].items()))}")
+    for reason, count in sorted(run["skips"].items()):
+        print(f"   - écartées ({reason}): {count}")
+    if run["summary"]:
+        print(f"   Résumé: {json.dumps(run['summary'], ensure_ascii=False)}")
+    end = next((entry for entry in events if entry.get("event") == "run_end"), None)
+    metrics = (end or {}).get("metrics") or {}
+    for name, phase in metrics.get("phases", {}).items():
+        print(f"   ⏱️  {name:<10} {phase['seconds']:>8.2f}s  ({phase['count']} fois)")
+    for service, endpoints in metrics.get("requests", {}).items():
+        for endpoint, stats in endpoints.items():
+            print(f"   🌐 {service}/{endpoint}: {stats['count']} requêtes, p50 {stats['p50_seconds']}s, "
+                  f"p95 {stats['p95_seconds']}s, codes {stats['status']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Résumé et recherche dans le journal des runs de Martine IA")
+    parser.add_argument("--engine", choices=("taches", "projets"), help="moteur")
+    parser.add_argument("--target", help="cible d'une exécution multi-cibles")
+    parser.add_argument("--last", type=int, default=10, help="nombre de runs listés")
+    parser.add_argument("--run", help="identifiant d'un run : détail, ou événements avec --event")
+    parser.add_argument("--page", help="identifiant de page : toutes ses décisions, tous runs confondus")
+    parser.add_argument("--event", help="avec --run ou --page : type d'événement (skip, estimate, write...)")
+    parser.add_argument("--failed", action="store_true", help="écritures échouées uniquement")
+    args = parser.parse_args(argv)
+
+    paths = log_files(journal_pattern(args.engine, args.target))
+    if not paths:
+        print("Aucun journal dans logs/ (runs_*.jsonl)")
+        return 1
+
+    if args.page or (args.run and (args.event or args.failed)):
+        for entry in read_events(paths):
+            if args.run and entry.get("run") != args.run:
+                continue
+            if args.page and entry.get("id") != args.page:
+                continue
+            if args.event and entry.get("event") != args.event:
+                continue
+            if args.failed and entry.get("ok") is not False:
+                continue
+            print(json.dumps(entry, ensure_ascii=False))
+        return 0
+
+    if args.run:
+        events = [entry for entry in read_events(paths) if entry.get("run") == args.run]
+        if not events:
+            print(f"❌ Run inconnu: {args.run}")
+            return 1
+        print_run(summarize_runs(events)[0], events)
+        return 0
+
+    print_runs(summarize_runs(read_events(paths))[-args.last:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+MARTINE IA - Émetteur de webhooks Notion synthétiques
+Simule Notion en local pour tester `python src/martine.py --webhook` :
+envoie des événements de page signés (NOTION_WEBHOOK_SECRET), en rafale si besoin.
+
+Usage:
+    python tools/webhook_sender.py <page_id> [<page_id> ...]
+    python tools/webhook_sender.py <page_id> --burst 5          # 5 éditions rapprochées
+    python tools/webhook_sender.py <page_id> --event page.deleted
+    python tools/webhook_sender.py --verification jeton-test    # création d'abonnement
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from config import load_env
+from webhook import DEFAULT_PORT, SIGNATURE_HEADER, sign
+
+
+def page_payload(page_id: str, event_type: str) -> dict:
+    """Événement au format des webhooks Notion"""
+    return {
+        "id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "type": event_type,
+        "entity": {"id": page_id, "type": "page"},
+        "data": {}
+    }
+
+
+def post(url: str, payload: dict, secret: str = None) -> int:
+    """Envoie un événement (signé si secret) ; retourne le code HTTP"""
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers[SIGNATURE_HEADER] = sign(body, secret)
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main(argv=None) -> int:
+    load_env()
+    parser = argparse.ArgumentParser(description="Envoie des webhooks Notion synthétiques au récepteur local")
+    parser.add_argument("page_ids", nargs="*", help="pages concernées")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{os.getenv('WEBHOOK_PORT', DEFAULT_PORT)}/")
+    parser.add_argument("--event", default="page.properties_updated", help="type d'événement")
+    parser.add_argument("--burst", type=int, default=1, help="événements par page")
+    parser.add_argument("--interval", type=float, default=0.2, help="secondes entre deux événements d'une rafale")
+    parser.add_argument("--secret", default=os.getenv("NOTION_WEBHOOK_SECRET"), help="défaut: NOTION_WEBHOOK_SECRET")
+    parser.add_argument("--verification", help="envoie un message de vérification avec ce jeton")
+    args = parser.parse_args(argv)
+
+    if args.verification:
+        status = post(args.url, {"verification_token": args.verification})
+        print(f"🔑 Vérification → {status}")
+        return 0 if status == 200 else 1
+
+    failed = 0
+    for page_id in args.page_ids:
+        for index in range(args.burst):
+            status = post(args.url, page_payload(page_id, args.event), args.secret)
+            print(f"📨 {args.event} {page_id} ({index + 1}/{args.burst}) → {status}")
+            failed += status != 200
+            if index + 1 < args.burst:
+                time.sleep(args.interval)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())